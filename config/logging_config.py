@@ -5,11 +5,32 @@ Maneja logs de usuario y errores técnicos con rotación automática
 
 import logging
 import logging.handlers
+import atexit
+import gzip
 import json
 import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+# Escritura de logs en un hilo aparte (LOG_ASYNC=0 vuelve a escribir en el hilo que loguea)
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") != "0"
+# Registros en espera como máximo; si la cola se llena se descartan y se contabilizan
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Registros que el hilo escritor procesa antes de hacer flush de los archivos
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+# Espera máxima (segundos) para encolar errores con la cola llena antes de descartarlos
+LOG_ERROR_ENQUEUE_TIMEOUT = 0.5
+
+# user_actions.log: tamaño máximo del archivo activo, días de retención y espacio total
+# en disco (archivo activo + segmentos rotados comprimidos)
+USER_ACTIONS_MAX_MB = int(os.getenv("LOG_USER_ACTIONS_MAX_MB", "50"))
+USER_ACTIONS_RETENTION_DAYS = int(os.getenv("LOG_USER_ACTIONS_RETENTION_DAYS", "30"))
+USER_ACTIONS_BUDGET_MB = int(os.getenv("LOG_USER_ACTIONS_BUDGET_MB", "500"))
 
 class JSONFormatter(logging.Formatter):
     """
@@ -33,6 +54,14 @@ class JSONFormatter(logging.Formatter):
             log_entry['action'] = record.action
         if hasattr(record, 'resource'):
             log_entry['resource'] = record.resource
+        if hasattr(record, 'resource_id'):
+            log_entry['resource_id'] = record.resource_id
+        if hasattr(record, 'success'):
+            log_entry['success'] = record.success
+        if hasattr(record, 'duration_ms'):
+            log_entry['duration_ms'] = record.duration_ms
+        if hasattr(record, 'sample_rate'):
+            log_entry['sample_rate'] = record.sample_rate
         if hasattr(record, 'ip_address'):
             log_entry['ip_address'] = record.ip_address
         if hasattr(record, 'user_agent'):
@@ -48,12 +77,298 @@ class JSONFormatter(logging.Formatter):
         
         return json.dumps(log_entry, ensure_ascii=False)
 
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    Rota el archivo a medianoche (o según `when`) y también cuando supera maxBytes.
+    
+    Los segmentos rotados se nombran con la fecha y hora de rotación
+    (user_actions.log.2025-08-08_235959) y se comprimen con gzip en un hilo aparte,
+    para no demorar al hilo que escribe. Después de cada compresión se eliminan los
+    segmentos más antiguos que retention_days y, si hace falta, los más viejos hasta
+    que el total en disco (archivo activo incluido) quede por debajo de max_total_bytes.
+    """
+    SEGMENT_SUFFIX = "%Y-%m-%d_%H%M%S"
+
+    def __init__(self, filename, when='midnight', interval=1, maxBytes: int = 0,
+                 retention_days: int = 0, max_total_bytes: int = 0, compress: bool = True,
+                 encoding=None, delay=False, utc=False):
+        super().__init__(filename, when=when, interval=interval, backupCount=0,
+                         encoding=encoding, delay=delay, utc=utc)
+        self.maxBytes = maxBytes
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self.compress = compress
+        self._maintenance_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._maintenance_thread: Optional[threading.Thread] = None
+        
+        # Segmentos que quedaron sin comprimir (corte del proceso o rotaciones anteriores)
+        for segment in self._segments():
+            if self.compress and not segment.endswith(".gz"):
+                self._schedule(segment)
+        self._schedule(None)
+
+    def _segments(self) -> List[str]:
+        """Segmentos rotados de este log, del más viejo al más nuevo"""
+        directory, base = os.path.split(self.baseFilename)
+        prefix = base + "."
+        segments = [
+            os.path.join(directory, name) for name in os.listdir(directory or ".")
+            if name.startswith(prefix) and not name.endswith(".tmp")
+        ]
+        return sorted(segments, key=lambda path: os.stat(path).st_mtime_ns if os.path.exists(path) else 0)
+
+    def shouldRollover(self, record) -> int:
+        if super().shouldRollover(record):
+            return 1
+        if self.maxBytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.maxBytes:
+                return 1
+        return 0
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        
+        now = int(time.time())
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            stamp = time.strftime(self.SEGMENT_SUFFIX, time.gmtime(now) if self.utc else time.localtime(now))
+            destination = f"{self.baseFilename}.{stamp}"
+            counter = 1
+            while os.path.exists(destination) or os.path.exists(destination + ".gz"):
+                destination = f"{self.baseFilename}.{stamp}.{counter}"
+                counter += 1
+            os.rename(self.baseFilename, destination)
+            self._schedule(destination if self.compress else None)
+        
+        self.rolloverAt = self.computeRollover(now)
+        if not self.delay:
+            self.stream = self._open()
+
+    def _schedule(self, segment: Optional[str]):
+        """Encola la compresión de un segmento (None: solo aplicar retención y presupuesto)"""
+        self._maintenance_queue.put(segment)
+        if self._maintenance_thread is None:
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_worker, name="log-compression", daemon=True
+            )
+            self._maintenance_thread.start()
+
+    def _maintenance_worker(self):
+        while True:
+            segment = self._maintenance_queue.get()
+            try:
+                if segment is not None:
+                    self._compress(segment)
+                self._enforce_retention()
+            except Exception:
+                # Un error de disco no debe interrumpir el logging
+                pass
+            finally:
+                self._maintenance_queue.task_done()
+
+    @staticmethod
+    def _compress(segment: str):
+        if not os.path.exists(segment) or segment.endswith(".gz"):
+            return
+        stat = os.stat(segment)
+        temp_path = segment + ".gz.tmp"
+        with open(segment, "rb") as source, gzip.open(temp_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        # Conservar la fecha del segmento para ordenar y aplicar la retención
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp_path, segment + ".gz")
+        os.remove(segment)
+
+    def _enforce_retention(self):
+        segments = self._segments()
+        if self.retention_days > 0:
+            limit = time.time() - self.retention_days * 86400
+            for segment in list(segments):
+                if os.path.getmtime(segment) < limit:
+                    os.remove(segment)
+                    segments.remove(segment)
+        
+        if self.max_total_bytes > 0:
+            # El archivo activo puede crecer hasta maxBytes antes de la próxima rotación
+            current = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+            current = max(current, self.maxBytes)
+            total = current + sum(os.path.getsize(segment) for segment in segments)
+            while segments and total > self.max_total_bytes:
+                oldest = segments.pop(0)
+                total -= os.path.getsize(oldest)
+                os.remove(oldest)
+
+    def wait_for_maintenance(self):
+        """Espera a que terminen las compresiones pendientes"""
+        self._maintenance_queue.join()
+
+    def close(self):
+        super().close()
+        self.wait_for_maintenance()
+
+class _BatchFlushMixin:
+    """
+    Permite al hilo escritor diferir el flush de cada registro hasta terminar el lote
+    """
+    _defer_flush = False
+
+    def flush(self):
+        if not self._defer_flush:
+            super().flush()
+
+class BatchTimedRotatingFileHandler(_BatchFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+class BatchRotatingFileHandler(_BatchFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+class BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+class BatchSizedTimedRotatingFileHandler(_BatchFlushMixin, SizedTimedRotatingFileHandler):
+    pass
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Encola los registros de un logger para el hilo escritor sin bloquear al que loguea.
+    El formateo (JSON incluido) queda a cargo del hilo escritor.
+    """
+    def __init__(self, pipeline: "LogPipeline", route: str):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.route = route
+
+    def prepare(self, record):
+        # Resolver el mensaje ahora (los args pueden cambiar después), sin formatear
+        record.msg = record.getMessage()
+        record.args = None
+        record._log_route = self.route
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record, timeout=LOG_ERROR_ENQUEUE_TIMEOUT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.record_dropped(self.route)
+
+class LogPipeline(logging.handlers.QueueListener):
+    """
+    Hilo escritor único para todos los loggers de la aplicación: toma registros de una
+    cola acotada en lotes de hasta LOG_BATCH_SIZE, los entrega a los handlers del logger
+    de origen y hace un solo flush por lote. Lleva la cuenta de registros descartados
+    por cola llena y la informa en el logger 'app'.
+    """
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.batch_size = batch_size
+        self.routes: Dict[str, List[logging.Handler]] = {}
+        self._stats_lock = threading.Lock()
+        self._dropped: Dict[str, int] = {}
+        self._dropped_reported: Dict[str, int] = {}
+        self._written = 0
+        self._batches = 0
+        self._max_batch = 0
+
+    def add_route(self, route: str, handlers: List[logging.Handler]) -> BoundedQueueHandler:
+        self.routes[route] = handlers
+        return BoundedQueueHandler(self, route)
+
+    def record_dropped(self, route: str):
+        with self._stats_lock:
+            self._dropped[route] = self._dropped.get(route, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "queue_size": self.queue.qsize(),
+                "queue_max": self.queue.maxsize,
+                "written": self._written,
+                "batches": self._batches,
+                "max_batch": self._max_batch,
+                "dropped": dict(self._dropped)
+            }
+
+    def enqueue_sentinel(self):
+        # Con la cola llena put_nowait fallaría: esperar lugar para el aviso de cierre
+        self.queue.put(self._sentinel)
+
+    def handle(self, record):
+        for handler in self.routes.get(getattr(record, "_log_route", None), ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _all_handlers(self):
+        return [h for handlers in self.routes.values() for h in handlers]
+
+    def _report_dropped(self):
+        with self._stats_lock:
+            pending = {
+                route: count - self._dropped_reported.get(route, 0)
+                for route, count in self._dropped.items()
+                if count > self._dropped_reported.get(route, 0)
+            }
+            self._dropped_reported.update({route: self._dropped[route] for route in pending})
+        for route, count in pending.items():
+            record = logging.LogRecord(
+                "app", logging.WARNING, __file__, 0,
+                f"Cola de logging llena: {count} registros de '{route}' descartados", None, None
+            )
+            record._log_route = "app"
+            self.handle(record)
+
+    def _monitor(self):
+        q = self.queue
+        handlers = self._all_handlers()
+        stop = False
+        while not stop:
+            batch = [q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            for handler in handlers:
+                handler._defer_flush = True
+            try:
+                for record in batch:
+                    if record is self._sentinel:
+                        stop = True
+                        continue
+                    try:
+                        self.handle(record)
+                    except Exception:
+                        # Un registro con problemas no debe detener al hilo escritor
+                        pass
+                self._report_dropped()
+            finally:
+                for handler in handlers:
+                    handler._defer_flush = False
+                    try:
+                        handler.flush()
+                    except Exception:
+                        pass
+                for _ in batch:
+                    q.task_done()
+
+            with self._stats_lock:
+                written = len(batch) - (1 if stop else 0)
+                self._written += written
+                self._batches += 1
+                self._max_batch = max(self._max_batch, written)
+
 class LoggingConfig:
     """
     Configurador del sistema de logging de la aplicación
     """
     
-    def __init__(self, base_dir: str = None):
+    def __init__(self, base_dir: str = None, async_logging: bool = LOG_ASYNC):
         # Detectar automáticamente si estamos en Docker o desarrollo local
         if base_dir is None:
             if os.path.exists("/app") and os.getcwd().startswith("/app"):
@@ -74,10 +389,18 @@ class LoggingConfig:
         self.technical_errors_log = self.logs_dir / "technical_errors.log"
         self.general_log = self.logs_dir / "application.log"
         
+        self.async_logging = async_logging
+        self.pipeline: Optional[LogPipeline] = None
+        self._configured_loggers: List[logging.Logger] = []
+        
     def setup_logging(self):
         """
         Configura todos los loggers de la aplicación
         """
+        # Reconfiguración: no duplicar handlers ni hilos escritores
+        if self._configured_loggers:
+            self.shutdown()
+        
         # Configuración básica
         logging.basicConfig(level=logging.INFO)
         
@@ -89,6 +412,45 @@ class LoggingConfig:
         
         # Logger general de la aplicación
         self._setup_general_logger()
+        
+        # Todos los handlers se escriben desde un único hilo
+        if self.pipeline is not None:
+            self.pipeline.start()
+    
+    def _attach_handlers(self, logger: logging.Logger, handlers: List[logging.Handler]):
+        """
+        Conecta los handlers al logger: directamente, o a través de la cola del hilo
+        escritor cuando el logging asíncrono está activo
+        """
+        if self.async_logging:
+            if self.pipeline is None:
+                self.pipeline = LogPipeline()
+            logger.addHandler(self.pipeline.add_route(logger.name, handlers))
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+        self._configured_loggers.append(logger)
+    
+    def shutdown(self):
+        """
+        Escribe los registros pendientes, detiene el hilo escritor y cierra los handlers
+        """
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            handlers = self.pipeline._all_handlers()
+        else:
+            handlers = [h for logger in self._configured_loggers for h in logger.handlers]
+        for logger in self._configured_loggers:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+        for handler in handlers:
+            handler.close()
+        self.pipeline = None
+        self._configured_loggers = []
+    
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la cola de logging (vacío si se escribe de forma sincrónica)"""
+        return self.pipeline.stats() if self.pipeline is not None else {}
     
     def _setup_user_actions_logger(self):
         """
@@ -98,23 +460,22 @@ class LoggingConfig:
         logger.setLevel(logging.INFO)
         logger.propagate = False
         
-        # Handler con rotación por tamaño y tiempo
-        handler = logging.handlers.TimedRotatingFileHandler(
+        # Handler con rotación por tiempo y tamaño, segmentos comprimidos y tope de disco
+        handler = BatchSizedTimedRotatingFileHandler(
             filename=self.user_actions_log,
-            when='midnight',  # Rotar a medianoche
-            interval=1,       # Cada día
-            backupCount=30,   # Mantener 30 días
+            when='midnight',                                        # Rotar a medianoche
+            interval=1,                                             # Cada día
+            maxBytes=USER_ACTIONS_MAX_MB * 1024 * 1024,             # También al superar 50MB
+            retention_days=USER_ACTIONS_RETENTION_DAYS,             # Mantener 30 días
+            max_total_bytes=USER_ACTIONS_BUDGET_MB * 1024 * 1024,   # Y nunca más de 500MB en total
             encoding='utf-8'
         )
         
-        # También rotar si el archivo supera 50MB
-        handler.maxBytes = 50 * 1024 * 1024  # 50MB
-        
         # Formato JSON para fácil análisis
         formatter = JSONFormatter()
         handler.setFormatter(formatter)
         
-        logger.addHandler(handler)
+        self._attach_handlers(logger, [handler])
         
     def _setup_technical_errors_logger(self):
         """
@@ -125,7 +486,7 @@ class LoggingConfig:
         logger.propagate = False
         
         # Handler con rotación por tamaño
-        handler = logging.handlers.RotatingFileHandler(
+        handler = BatchRotatingFileHandler(
             filename=self.technical_errors_log,
             maxBytes=20 * 1024 * 1024,  # 20MB por archivo
             backupCount=10,              # Mantener 10 archivos (200MB total)
@@ -136,7 +497,7 @@ class LoggingConfig:
         formatter = JSONFormatter()
         handler.setFormatter(formatter)
         
-        logger.addHandler(handler)
+        self._attach_handlers(logger, [handler])
         
     def _setup_general_logger(self):
         """
@@ -147,7 +508,7 @@ class LoggingConfig:
         logger.propagate = False
         
         # Handler con rotación diaria
-        handler = logging.handlers.TimedRotatingFileHandler(
+        handler = BatchTimedRotatingFileHandler(
             filename=self.general_log,
             when='midnight',
             interval=1,
@@ -162,11 +523,10 @@ class LoggingConfig:
         handler.setFormatter(formatter)
         
         # También log a consola en desarrollo
-        console_handler = logging.StreamHandler()
+        console_handler = BatchStreamHandler()
         console_handler.setFormatter(formatter)
         
-        logger.addHandler(handler)
-        logger.addHandler(console_handler)
+        self._attach_handlers(logger, [handler, console_handler])
 
 # Instancia global del configurador
 logging_config = LoggingConfig()
@@ -177,9 +537,18 @@ def setup_application_logging():
     Llamar al inicio de la aplicación
     """
     logging_config.setup_logging()
+    # Si el proceso termina sin el evento de apagado, escribir igual lo pendiente
+    atexit.register(logging_config.shutdown)
     
     # Log de inicio de la aplicación
     app_logger = logging.getLogger('app')
     app_logger.info("Sistema de logging inicializado correctamente")
     
     return logging_config
+
+def shutdown_application_logging():
+    """
+    Escribe los logs pendientes en la cola y detiene el hilo escritor
+    Llamar al apagar la aplicación
+    """
+    logging_config.shutdown()
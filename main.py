@@ -7,14 +7,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from database import Base, engine
 
 # Importar configuración de logging
-from config.logging_config import setup_application_logging
+from config.logging_config import setup_application_logging, shutdown_application_logging
 from middleware.logging_middleware import setup_request_logging
+from middleware.event_loop_monitor import setup_event_loop_monitor
+from middleware.compression import setup_response_compression
+from utils.json_response import FastJSONResponse
+from services.pdf_renderer import shutdown_pdf_renderer
 
 from models.deposit import Deposit, EstadoDeposito
 from models.cheque_retencion import Cheque, Retencion
 from models.daily_totals import DailyTotal
+from models.deposit_aggregate import DepositAggregate
+from models.change_tracking import ChangeSequence, DeletedRow
 from models.user import User  # Importar modelo de usuario
 
+# Registrar el mantenimiento de agregados en cada commit de depósitos/cheques/retenciones
+import services.aggregates_service
+# Registrar el mantenimiento del semáforo de documentos de cada depósito
+import services.semaforo_service
+# Versionar depósitos, cheques y retenciones en cada commit (consultas incrementales)
+import services.row_version_service
+# Publicar en el feed SSE los cambios de depósitos confirmados
+import services.deposit_events
+from services.event_broker import shutdown_event_broker
+
 from routers.deposits import router as deposits_router
 from routers.totals import router as totals_router
 from routers.pdf_reports import router as pdf_router
@@ -28,14 +44,18 @@ from routers.reparto_cierre import router as reparto_cierre_router
 from routers.debug import router as debug_router
 from routers.fix_auth import router as fix_auth_router
 from routers.admin_users import router as admin_users_router
+from routers.admin_audit import router as admin_audit_router
 from routers.production_control import router as production_control_router
 from routers.cheques_retenciones import router as cheques_retenciones_router
+from routers.semaforos import router as semaforos_router
+from routers.events import router as events_router
 
 
 app = FastAPI(
     title="Backend Cierre Repartos",
     description="Sistema para gestionar depósitos y sincronización con miniBank y API externa",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse  # JSON con orjson
 )
 
 # ========== CONFIGURACIÓN DE LOGGING ==========
@@ -45,6 +65,12 @@ setup_application_logging()
 # Configurar middleware de logging para requests HTTP
 setup_request_logging(app)
 
+# Diagnóstico de bloqueos del event loop (solo con EVENT_LOOP_DIAGNOSTICS=1)
+setup_event_loop_monitor(app)
+
+# Compresión brotli/gzip de respuestas grandes (JSON de depósitos por planta/máquina)
+setup_response_compression(app)
+
 # ========== CONFIGURACIÓN DE CORS ==========
 app.add_middleware(
     CORSMiddleware,
@@ -57,16 +83,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Freshness"],  # Decisiones de sincronización de /deposits/* y /db/deposits/by-plant
 )
 
 # ========== CONFIGURACIÓN DE BASE DE DATOS ==========
 Base.metadata.create_all(bind=engine)
 
+# Cerrar el pool de procesos de renderizado de PDFs al apagar
+app.add_event_handler("shutdown", shutdown_pdf_renderer)
+
+# Terminar los streams SSE abiertos para que el apagado no espere a los clientes
+app.add_event_handler("shutdown", shutdown_event_broker)
+
+# Escribir los logs que queden en la cola al apagar
+app.add_event_handler("shutdown", shutdown_application_logging)
+
 # ========== CONFIGURACIÓN DE ROUTERS ==========
 app.include_router(fix_auth_router, prefix="/api")  # Router de fix auth
 app.include_router(debug_router, prefix="/api")  # Router de debug PRIMERO
 app.include_router(auth_router, prefix="/api")  # Router de autenticación PRIMERO
 app.include_router(admin_users_router, prefix="/api")  # Router de gestión de usuarios
+app.include_router(admin_audit_router, prefix="/api")  # Consulta del log de auditoría
 app.include_router(production_control_router, prefix="/api")  # Control de producción
 app.include_router(deposits_router, prefix="/api")
 app.include_router(totals_router, prefix="/api")
@@ -78,6 +115,8 @@ app.include_router(movimientos_router, prefix="/api")
 app.include_router(charts_router, prefix="/api")
 app.include_router(reparto_cierre_router, prefix="/api")
 app.include_router(cheques_retenciones_router, prefix="/api")
+app.include_router(semaforos_router, prefix="/api")
+app.include_router(events_router, prefix="/api")  # Feed SSE de cambios
 
 # ========== ENDPOINT RAÍZ ==========
 @app.get("/")
@@ -0,0 +1,178 @@
+"""
+Compresión de respuestas (brotli / gzip) negociada con Accept-Encoding
+
+Se comprimen solo las respuestas de tipos de texto (JSON, HTML, CSV, XML...)
+a partir de COMPRESSION_MIN_SIZE bytes. Brotli se usa si el paquete `brotli`
+está instalado y el cliente lo acepta; si no, gzip. Quedan afuera los streams
+SSE (text/event-stream), que necesitan llegar evento por evento, los PDFs y
+cualquier respuesta que ya tenga Content-Encoding.
+"""
+import os
+import zlib
+from typing import Optional
+from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Si no está instalado, solo gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+_COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "text/",
+)
+_EXCLUDED_TYPES = ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Elige 'br', 'gzip' o None según Accept-Encoding (respetando q=0)"""
+    aceptadas = {}
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if nombre:
+            aceptadas[nombre.strip()] = q
+
+    comodin = aceptadas.get("*", 0.0)
+    if brotli is not None and aceptadas.get("br", comodin) > 0:
+        return "br"
+    if aceptadas.get("gzip", comodin) > 0:
+        return "gzip"
+    return None
+
+
+def _is_compressible(headers: MutableHeaders) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    if content_type.startswith(_EXCLUDED_TYPES):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class _Compressor:
+    """Compresor incremental con la misma interfaz para brotli y gzip"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31 = formato gzip
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime las respuestas de texto grandes"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Decide al ver el primer bloque del cuerpo si la respuesta se comprime"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Se retiene hasta ver el cuerpo: los encabezados dependen de si se comprime
+            self._start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            headers = MutableHeaders(raw=self._start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            # Las respuestas que pasan por BaseHTTPMiddleware llegan en bloques: el tamaño sale de Content-Length
+            content_length = headers.get("content-length")
+            size = int(content_length) if content_length else (None if more_body else len(body))
+            if not _is_compressible(headers) or (size is not None and size < self.middleware.minimum_size):
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+
+            self._compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                compressed = self._compressor.compress(body) + self._compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Respuesta en streaming: se comprime bloque a bloque
+            del headers["Content-Length"]
+            await self._send(self._start)
+
+        chunk = self._compressor.compress(body)
+        if not more_body:
+            chunk += self._compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+def setup_response_compression(app: FastAPI):
+    """Instala la compresión de respuestas (COMPRESSION_ENABLED=0 para desactivarla)"""
+    if os.getenv("COMPRESSION_ENABLED", "1") == "0":
+        return
+    app.add_middleware(CompressionMiddleware)
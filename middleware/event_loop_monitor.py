@@ -0,0 +1,247 @@
+"""Diagnóstico de bloqueos del event loop.
+
+Se activa con la variable de entorno EVENT_LOOP_DIAGNOSTICS=1. Mide el lag del
+event loop con un heartbeat asyncio y, desde un hilo watchdog, captura el stack
+del hilo del loop cuando un callback lo bloquea más de
+EVENT_LOOP_BLOCK_THRESHOLD_MS (por defecto 200 ms). Cada bloqueo se asocia a
+la ruta en curso cuyo endpoint aparece en el stack (o a las rutas en vuelo si
+no se puede determinar) y se agrupa por el frame de código propio que lo causó.
+Los resultados se consultan en /api/debug/event-loop.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from utils.logging_utils import log_technical_warning
+
+app_logger = logging.getLogger('app')
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def diagnostics_enabled() -> bool:
+    return os.getenv("EVENT_LOOP_DIAGNOSTICS", "0").lower() in ("1", "true", "yes", "on")
+
+
+class EventLoopMonitor:
+    def __init__(self, interval: float = 0.05, threshold_ms: float = 200.0, max_events: int = 200):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000.0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = time.monotonic()
+        self._current_block: Optional[Dict] = None
+
+        self.in_flight: Dict[int, Scope] = {}
+        self.started_at: Optional[datetime] = None
+        self.samples = deque(maxlen=2000)  # Lags recientes (segundos)
+        self.max_lag = 0.0
+        self.events = deque(maxlen=max_events)  # Bloqueos recientes
+        self.offenders: Dict[str, Dict] = {}  # Agrupados por frame culpable
+
+    # ---------- Ciclo de vida ----------
+
+    async def start(self):
+        if self._heartbeat_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self.started_at = datetime.now()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._watchdog.start()
+        app_logger.info(f"🩺 Diagnóstico de event loop activo (umbral {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._last_beat = now
+                self.samples.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+                block = self._current_block
+                self._current_block = None
+            if block is not None:
+                self._finish_block(block, lag)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                stalled = time.monotonic() - self._last_beat
+                capture = stalled > self.threshold and self._current_block is None
+            if capture:
+                block = self._capture()
+                with self._lock:
+                    if self._current_block is None:
+                        self._current_block = block
+
+    # ---------- Captura ----------
+
+    def _capture(self) -> Dict:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.extract_stack(frame) if frame is not None else []
+        codes = set()
+        f = frame
+        while f is not None:
+            codes.add(f.f_code)
+            f = f.f_back
+
+        routes = []
+        culprit_route = None
+        for scope in list(self.in_flight.values()):
+            route = scope.get("route")
+            label = f"{scope.get('method', '')} {getattr(route, 'path', None) or scope.get('path', '')}"
+            routes.append(label)
+            endpoint = scope.get("endpoint") or getattr(route, "endpoint", None)
+            code = getattr(getattr(endpoint, "__wrapped__", endpoint), "__code__", None)
+            if code is not None and code in codes:
+                culprit_route = label
+
+        return {
+            "detected_at": datetime.now().isoformat(),
+            "route": culprit_route,
+            "in_flight": routes,
+            "culprit_frame": self._culprit_frame(stack),
+            "stack": traceback.format_list(stack[-25:])
+        }
+
+    @staticmethod
+    def _culprit_frame(stack) -> str:
+        """Último frame de código del proyecto (no librerías) en el stack"""
+        for entry in reversed(stack):
+            filename = os.path.abspath(entry.filename)
+            if filename.startswith(PROJECT_ROOT) and "site-packages" not in filename and not filename.endswith("event_loop_monitor.py"):
+                return f"{os.path.relpath(filename, PROJECT_ROOT)}:{entry.lineno} in {entry.name}"
+        return f"{stack[-1].filename}:{stack[-1].lineno} in {stack[-1].name}" if stack else "desconocido"
+
+    def _finish_block(self, block: Dict, lag: float):
+        block["duration_ms"] = round(lag * 1000, 1)
+        with self._lock:
+            self.events.append(block)
+            offender = self.offenders.setdefault(block["culprit_frame"], {
+                "culprit_frame": block["culprit_frame"],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "routes": set(),
+                "last_stack": None,
+                "last_seen": None
+            })
+            offender["count"] += 1
+            offender["total_ms"] += block["duration_ms"]
+            offender["max_ms"] = max(offender["max_ms"], block["duration_ms"])
+            offender["routes"].add(block["route"] or ", ".join(block["in_flight"]) or "sin request")
+            offender["last_stack"] = block["stack"]
+            offender["last_seen"] = block["detected_at"]
+
+        log_technical_warning(
+            f"Event loop bloqueado {block['duration_ms']} ms en {block['culprit_frame']}",
+            "event_loop_monitor",
+            extra_data={"route": block["route"], "in_flight": block["in_flight"]}
+        )
+
+    # ---------- Reportes ----------
+
+    def report(self, limit: int = 20) -> Dict:
+        with self._lock:
+            samples = sorted(self.samples)
+            offenders = sorted(self.offenders.values(), key=lambda o: o["total_ms"], reverse=True)[:limit]
+            events = list(self.events)[-limit:]
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000, 1)
+
+        return {
+            "enabled": True,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": {
+                "p50": percentile(50),
+                "p99": percentile(99),
+                "max": round(self.max_lag * 1000, 1),
+                "samples": len(samples)
+            },
+            "in_flight": len(self.in_flight),
+            "offenders": [
+                {**o, "routes": sorted(o["routes"]), "total_ms": round(o["total_ms"], 1)}
+                for o in offenders
+            ],
+            "recent_blocks": events
+        }
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.max_lag = 0.0
+            self.events.clear()
+            self.offenders.clear()
+
+
+class EventLoopMonitorMiddleware:
+    """Middleware ASGI que registra las requests en vuelo para asociarlas a los bloqueos"""
+
+    def __init__(self, app: ASGIApp, monitor: EventLoopMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = id(scope)
+        self.monitor.in_flight[key] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.in_flight.pop(key, None)
+
+
+_monitor: Optional[EventLoopMonitor] = None
+
+
+def get_event_loop_monitor() -> Optional[EventLoopMonitor]:
+    return _monitor
+
+
+def setup_event_loop_monitor(app: FastAPI):
+    """Instala el monitor si EVENT_LOOP_DIAGNOSTICS está activo"""
+    global _monitor
+    if not diagnostics_enabled():
+        return None
+
+    _monitor = EventLoopMonitor(
+        interval=float(os.getenv("EVENT_LOOP_HEARTBEAT_MS", "50")) / 1000.0,
+        threshold_ms=float(os.getenv("EVENT_LOOP_BLOCK_THRESHOLD_MS", "200"))
+    )
+    app.add_middleware(EventLoopMonitorMiddleware, monitor=_monitor)
+    app.add_event_handler("startup", _monitor.start)
+    app.add_event_handler("shutdown", _monitor.stop)
+    return _monitor
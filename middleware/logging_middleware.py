@@ -4,9 +4,12 @@ import time
 import uuid
 import logging
 import os
+import functools
+import inspect
 from typing import Callable, Optional
 from fastapi import FastAPI, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.types import ASGIApp
 
 try:
@@ -14,7 +17,7 @@ try:
 except ImportError:  # Si no está instalado, seguimos sin decodificar
     jwt = None
 
-from utils.logging_utils import log_user_action, log_technical_error
+from utils.logging_utils import log_user_action, log_technical_error, AuditAction
 
 app_logger = logging.getLogger('app')
 
@@ -87,27 +90,31 @@ def setup_request_logging(app: FastAPI):
 
 
 def log_endpoint_access(action_name: str, resource_type: str = None):
+    """Registra el acceso al endpoint con un único registro al terminar (éxito/error y duración).
+    Conserva la firma del endpoint (functools.wraps) para que FastAPI resuelva sus parámetros,
+    y ejecuta los endpoints sync en el threadpool para no bloquear el event loop."""
     def decorator(func):
+        is_coroutine = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             request = next((a for a in args if isinstance(a, Request)), kwargs.get('request')) if (args or kwargs) else None
-            try:
-                result = await func(*args, **kwargs)
-                log_user_action(
-                    action=action_name,
-                    resource=resource_type,
-                    request=request,
-                    success=True,
-                    extra_data={"endpoint": str(getattr(request, 'url', ''))}
-                )
+            # Un solo registro por llamada, con resultado y duración; el endpoint puede completarlo con annotate_audit
+            with AuditAction(
+                action_name,
+                resource=resource_type,
+                request=request,
+                extra_data={"endpoint": request.url.path} if request is not None else None
+            ) as audit:
+                if is_coroutine:
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await run_in_threadpool(func, *args, **kwargs)
+                # Errores atrapados por el endpoint y devueltos como respuesta: la acción falló
+                status_code = getattr(result, "status_code", None)
+                if isinstance(status_code, int) and status_code >= 500:
+                    audit.failed = True
+                    audit.extra_data.setdefault("status_code", status_code)
                 return result
-            except Exception as e:
-                log_user_action(
-                    action=action_name,
-                    resource=resource_type,
-                    request=request,
-                    success=False,
-                    extra_data={"error": str(e)}
-                )
-                raise
         return wrapper
     return decorator
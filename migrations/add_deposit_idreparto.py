@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Migración: Añadir columna idreparto a la tabla deposits
+
+El idreparto se extraía de user_name con split + regex cada vez que se
+sincronizaban valores esperados o se cerraban repartos. A partir de esta
+migración se guarda al insertar/actualizar el depósito y se indexa junto con
+date_time para buscar los depósitos de un reparto en un día directamente en SQL.
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, select, update, bindparam
+from database import engine
+from models.deposit import Deposit
+from utils.idreparto import extraer_idreparto_de_user_name
+
+BATCH_SIZE = 1000
+
+def _column_exists(connection) -> bool:
+    check_query = """
+    SELECT COUNT(*) as column_count
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = 'deposits'
+    AND COLUMN_NAME = 'idreparto'
+    """
+    return connection.execute(text(check_query)).fetchone()[0] > 0
+
+def backfill_idreparto(connection) -> int:
+    """Completa idreparto de los depósitos existentes en lotes de BATCH_SIZE"""
+    actualizados = 0
+    ultimo_id = 0
+    stmt = (
+        update(Deposit.__table__)
+        .where(Deposit.__table__.c.id == bindparam("b_id"))
+        .values(idreparto=bindparam("b_idreparto"))
+    )
+    while True:
+        rows = connection.execute(
+            select(Deposit.id, Deposit.user_name)
+            .where(Deposit.id > ultimo_id, Deposit.idreparto.is_(None), Deposit.user_name.isnot(None))
+            .order_by(Deposit.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        ultimo_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            idreparto = extraer_idreparto_de_user_name(row.user_name)
+            if idreparto is not None:
+                params.append({"b_id": row.id, "b_idreparto": idreparto})
+        if params:
+            connection.execute(stmt, params)
+            actualizados += len(params)
+        connection.commit()
+        print(f"   📦 Hasta id {ultimo_id}: {actualizados} depósitos con idreparto")
+    return actualizados
+
+def run_migration():
+    """Añade la columna idreparto, su índice y la completa para los depósitos existentes"""
+
+    print("🔄 Iniciando migración: Añadir columna idreparto")
+
+    try:
+        with engine.connect() as connection:
+            if _column_exists(connection):
+                print("✅ La columna 'idreparto' ya existe en la tabla 'deposits'")
+            else:
+                print("📝 Ejecutando: ALTER TABLE deposits ADD idreparto INTEGER NULL")
+                connection.execute(text("ALTER TABLE deposits ADD idreparto INTEGER NULL"))
+                connection.commit()
+
+            index = next(i for i in Deposit.__table__.indexes if i.name == "ix_deposits_idreparto_date_time")
+            index.create(bind=connection, checkfirst=True)
+            connection.commit()
+            print("✅ Índice 'ix_deposits_idreparto_date_time' listo")
+
+            print("📝 Completando idreparto a partir de user_name...")
+            actualizados = backfill_idreparto(connection)
+
+            print("✅ Migración completada exitosamente")
+            print(f"📊 {actualizados} depósitos actualizados")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {str(e)}")
+        raise
+
+def rollback_migration():
+    """Rollback de la migración (eliminar índice y columna)"""
+
+    print("🔄 Iniciando rollback: Eliminar columna idreparto")
+
+    try:
+        with engine.connect() as connection:
+            if not _column_exists(connection):
+                print("✅ La columna 'idreparto' no existe en la tabla 'deposits'")
+                return
+
+            index = next(i for i in Deposit.__table__.indexes if i.name == "ix_deposits_idreparto_date_time")
+            index.drop(bind=connection, checkfirst=True)
+
+            print("📝 Ejecutando: ALTER TABLE deposits DROP COLUMN idreparto")
+            connection.execute(text("ALTER TABLE deposits DROP COLUMN idreparto"))
+            connection.commit()
+
+            print("✅ Rollback completado exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        rollback_migration()
+    else:
+        run_migration()
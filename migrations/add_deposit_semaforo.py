@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Migración: Añadir contadores y semáforo de documentos a la tabla deposits
+
+Los listados por planta/máquina calculaban el semáforo de cada depósito
+cargando sus cheques y retenciones en cada request. A partir de esta migración
+se guardan cheques_count, retenciones_count y semaforo (VERDE / AMARILLO / GRIS),
+mantenidos al commit por services.semaforo_service, con un índice
+(date_time, identifier, semaforo) para el resumen por planta.
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, select, func
+from database import engine
+from models.deposit import Deposit
+from services.semaforo_service import semaforo_update_statement
+
+BATCH_SIZE = 1000
+
+COLUMNS = {
+    "cheques_count": "INTEGER NOT NULL DEFAULT 0",
+    "retenciones_count": "INTEGER NOT NULL DEFAULT 0",
+    "semaforo": "VARCHAR(10) NOT NULL DEFAULT 'GRIS'",
+}
+
+def _column_exists(connection, column_name: str) -> bool:
+    check_query = """
+    SELECT COUNT(*) as column_count
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = 'deposits'
+    AND COLUMN_NAME = :column_name
+    """
+    return connection.execute(text(check_query), {"column_name": column_name}).fetchone()[0] > 0
+
+def _semaforo_index():
+    return next(i for i in Deposit.__table__.indexes if i.name == "ix_deposits_date_time_semaforo")
+
+def backfill_semaforos(connection) -> int:
+    """Recalcula contadores y semáforo de los depósitos existentes en lotes de BATCH_SIZE ids"""
+    actualizados = 0
+    max_id = connection.execute(select(func.max(Deposit.id))).scalar() or 0
+    stmt = semaforo_update_statement()
+    for desde in range(0, max_id, BATCH_SIZE):
+        hasta = desde + BATCH_SIZE
+        result = connection.execute(stmt.where(Deposit.id > desde, Deposit.id <= hasta))
+        actualizados += result.rowcount or 0
+        connection.commit()
+        print(f"   📦 Hasta id {min(hasta, max_id)}: {actualizados} depósitos actualizados")
+    return actualizados
+
+def run_migration():
+    """Añade las columnas del semáforo, su índice y las completa para los depósitos existentes"""
+
+    print("🔄 Iniciando migración: Añadir semáforo de documentos")
+
+    try:
+        with engine.connect() as connection:
+            for column_name, definition in COLUMNS.items():
+                if _column_exists(connection, column_name):
+                    print(f"✅ La columna '{column_name}' ya existe en la tabla 'deposits'")
+                    continue
+                print(f"📝 Ejecutando: ALTER TABLE deposits ADD {column_name} {definition}")
+                connection.execute(text(f"ALTER TABLE deposits ADD {column_name} {definition}"))
+                connection.commit()
+
+            _semaforo_index().create(bind=connection, checkfirst=True)
+            connection.commit()
+            print("✅ Índice 'ix_deposits_date_time_semaforo' listo")
+
+            print("📝 Calculando semáforo a partir de composición, cheques y retenciones...")
+            actualizados = backfill_semaforos(connection)
+
+            print("✅ Migración completada exitosamente")
+            print(f"📊 {actualizados} depósitos actualizados")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {str(e)}")
+        raise
+
+def rollback_migration():
+    """Rollback de la migración (eliminar índice y columnas)"""
+
+    print("🔄 Iniciando rollback: Eliminar semáforo de documentos")
+
+    try:
+        with engine.connect() as connection:
+            _semaforo_index().drop(bind=connection, checkfirst=True)
+            connection.commit()
+
+            for column_name in COLUMNS:
+                if not _column_exists(connection, column_name):
+                    print(f"✅ La columna '{column_name}' no existe en la tabla 'deposits'")
+                    continue
+                # En SQL Server el DEFAULT crea un constraint con nombre generado que hay que quitar antes
+                connection.execute(text(f"""
+                DECLARE @constraint NVARCHAR(256)
+                SELECT @constraint = dc.name
+                FROM sys.default_constraints dc
+                JOIN sys.columns c ON c.default_object_id = dc.object_id
+                WHERE dc.parent_object_id = OBJECT_ID('deposits') AND c.name = '{column_name}'
+                IF @constraint IS NOT NULL
+                    EXEC('ALTER TABLE deposits DROP CONSTRAINT ' + @constraint)
+                """))
+                print(f"📝 Ejecutando: ALTER TABLE deposits DROP COLUMN {column_name}")
+                connection.execute(text(f"ALTER TABLE deposits DROP COLUMN {column_name}"))
+                connection.commit()
+
+            print("✅ Rollback completado exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        rollback_migration()
+    else:
+        run_migration()
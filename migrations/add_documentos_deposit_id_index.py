@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Migración: Índices por deposit_id en cheques y retenciones
+
+Los listados por planta/máquina cargan los cheques y retenciones de todos los
+depósitos del día con IN (...) sobre deposit_id, y el semáforo los cuenta por
+depósito. Sin índice, cada lote recorre la tabla completa.
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine
+from models.cheque_retencion import Cheque, Retencion
+
+INDEXES = [
+    (Cheque, "ix_cheques_deposit_id"),
+    (Retencion, "ix_retenciones_deposit_id"),
+]
+
+def _index(model, name):
+    return next(i for i in model.__table__.indexes if i.name == name)
+
+def run_migration():
+    """Crea los índices (si no existen)"""
+
+    print("🔄 Iniciando migración: Índices por deposit_id en cheques y retenciones")
+
+    try:
+        with engine.connect() as connection:
+            for model, name in INDEXES:
+                _index(model, name).create(bind=connection, checkfirst=True)
+                connection.commit()
+                print(f"✅ Índice '{name}' listo")
+
+            print("✅ Migración completada exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {str(e)}")
+        raise
+
+def rollback_migration():
+    """Rollback de la migración (eliminar los índices)"""
+
+    print("🔄 Iniciando rollback: Índices por deposit_id en cheques y retenciones")
+
+    try:
+        with engine.connect() as connection:
+            for model, name in INDEXES:
+                _index(model, name).drop(bind=connection, checkfirst=True)
+                connection.commit()
+                print(f"✅ Índice '{name}' eliminado")
+
+            print("✅ Rollback completado exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        rollback_migration()
+    else:
+        run_migration()
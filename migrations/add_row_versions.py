@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Migración: Versionado de filas y lápidas para consultas incrementales
+
+Añade row_version a deposits, cheques y retenciones (y updated_at a deposits),
+el índice (date_time, row_version) y las tablas change_sequence y deleted_rows.
+Las filas existentes quedan con versión 0: cualquier cliente que pida cambios
+desde un cursor ya las tiene (o recibe el día completo si no tiene cursor).
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+from models.deposit import Deposit
+from models.change_tracking import ChangeSequence, DeletedRow
+
+COLUMNS = [
+    ("deposits", "row_version", "BIGINT NOT NULL DEFAULT 0"),
+    ("deposits", "updated_at", "DATETIME NULL"),
+    ("cheques", "row_version", "BIGINT NOT NULL DEFAULT 0"),
+    ("retenciones", "row_version", "BIGINT NOT NULL DEFAULT 0"),
+]
+
+def _column_exists(connection, table_name: str, column_name: str) -> bool:
+    check_query = """
+    SELECT COUNT(*) as column_count
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = :table_name
+    AND COLUMN_NAME = :column_name
+    """
+    return connection.execute(
+        text(check_query), {"table_name": table_name, "column_name": column_name}
+    ).fetchone()[0] > 0
+
+def _row_version_index():
+    return next(i for i in Deposit.__table__.indexes if i.name == "ix_deposits_date_time_row_version")
+
+def run_migration():
+    """Añade las columnas de versión, el índice y las tablas de secuencia y lápidas"""
+
+    print("🔄 Iniciando migración: Versionado de filas de depósitos")
+
+    try:
+        with engine.connect() as connection:
+            for table_name, column_name, definition in COLUMNS:
+                if _column_exists(connection, table_name, column_name):
+                    print(f"✅ La columna '{column_name}' ya existe en la tabla '{table_name}'")
+                    continue
+                print(f"📝 Ejecutando: ALTER TABLE {table_name} ADD {column_name} {definition}")
+                connection.execute(text(f"ALTER TABLE {table_name} ADD {column_name} {definition}"))
+                connection.commit()
+
+            _row_version_index().create(bind=connection, checkfirst=True)
+            connection.commit()
+            print("✅ Índice 'ix_deposits_date_time_row_version' listo")
+
+        ChangeSequence.__table__.create(bind=engine, checkfirst=True)
+        DeletedRow.__table__.create(bind=engine, checkfirst=True)
+        print("✅ Tablas 'change_sequence' y 'deleted_rows' listas")
+
+        print("✅ Migración completada exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {str(e)}")
+        raise
+
+def rollback_migration():
+    """Rollback de la migración (eliminar tablas, índice y columnas)"""
+
+    print("🔄 Iniciando rollback: Versionado de filas de depósitos")
+
+    try:
+        DeletedRow.__table__.drop(bind=engine, checkfirst=True)
+        ChangeSequence.__table__.drop(bind=engine, checkfirst=True)
+
+        with engine.connect() as connection:
+            _row_version_index().drop(bind=connection, checkfirst=True)
+            connection.commit()
+
+            for table_name, column_name, _ in COLUMNS:
+                if not _column_exists(connection, table_name, column_name):
+                    print(f"✅ La columna '{column_name}' no existe en la tabla '{table_name}'")
+                    continue
+                # En SQL Server el DEFAULT crea un constraint con nombre generado que hay que quitar antes
+                connection.execute(text(f"""
+                DECLARE @constraint NVARCHAR(256)
+                SELECT @constraint = dc.name
+                FROM sys.default_constraints dc
+                JOIN sys.columns c ON c.default_object_id = dc.object_id
+                WHERE dc.parent_object_id = OBJECT_ID('{table_name}') AND c.name = '{column_name}'
+                IF @constraint IS NOT NULL
+                    EXEC('ALTER TABLE {table_name} DROP CONSTRAINT ' + @constraint)
+                """))
+                print(f"📝 Ejecutando: ALTER TABLE {table_name} DROP COLUMN {column_name}")
+                connection.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+                connection.commit()
+
+            print("✅ Rollback completado exitosamente")
+
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        rollback_migration()
+    else:
+        run_migration()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Migración: Crear tabla deposit_aggregates y poblarla con el historial
+
+La tabla guarda agregados por día, planta, máquina y estado. A partir de
+esta migración se mantiene sola en cada commit que modifica depósitos,
+cheques o retenciones. Es obligatoria: hasta que termina, /db/deposits/summary
+y /charts/deposit-aggregates responden 503 (la marca de inicialización vive en
+change_sequence, ver services/aggregates_service.py).
+"""
+
+import os
+import sys
+
+# Añadir el directorio del proyecto al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine, SessionLocal
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from models.deposit_aggregate import DepositAggregate
+from models.change_tracking import ChangeSequence
+
+def run_migration():
+    """Crea la tabla deposit_aggregates (si no existe) y reconstruye los agregados"""
+
+    print("🔄 Iniciando migración: Crear tabla deposit_aggregates")
+
+    try:
+        DepositAggregate.__table__.create(bind=engine, checkfirst=True)
+        print("✅ Tabla 'deposit_aggregates' lista")
+
+        from services.aggregates_service import rebuild_aggregates
+
+        db = SessionLocal()
+        try:
+            print("📝 Reconstruyendo agregados a partir de la tabla 'deposits'...")
+            result = rebuild_aggregates(db)
+            print("✅ Migración completada exitosamente")
+            print(f"📊 {result['dias']} días procesados, {result['filas']} filas de agregados")
+        finally:
+            db.close()
+
+    except Exception as e:
+        print(f"❌ Error durante la migración: {str(e)}")
+        raise
+
+def rollback_migration():
+    """Rollback de la migración (eliminar la tabla)"""
+
+    print("🔄 Iniciando rollback: Eliminar tabla deposit_aggregates")
+
+    try:
+        DepositAggregate.__table__.drop(bind=engine, checkfirst=True)
+
+        from services.aggregates_service import AGGREGATES_MARKER
+
+        db = SessionLocal()
+        try:
+            db.query(ChangeSequence).filter(ChangeSequence.name == AGGREGATES_MARKER).delete()
+            db.commit()
+        finally:
+            db.close()
+        print("✅ Rollback completado exitosamente")
+        print("📊 Tabla 'deposit_aggregates' eliminada")
+
+    except Exception as e:
+        print(f"❌ Error durante el rollback: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        rollback_migration()
+    else:
+        run_migration()
@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from database import Base
+from datetime import datetime
+
+class ChangeSequence(Base):
+    """
+    Contadores monótonos con nombre. La secuencia 'deposits' da la row_version de
+    cada commit que toca depósitos, cheques o retenciones (ver
+    services/row_version_service.py). La fila 'deposit_aggregates' marca si el
+    historial de agregados ya se reconstruyó (services/aggregates_service.py).
+    """
+    __tablename__ = "change_sequence"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, unique=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ChangeSequence(name={self.name}, value={self.value})>"
+
+class DeletedRow(Base):
+    """
+    Lápidas de depósitos, cheques y retenciones borrados, para que los clientes
+    que piden cambios desde un cursor puedan quitarlos.
+    """
+    __tablename__ = "deleted_rows"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String(50), nullable=False)  # deposits, cheques, retenciones
+    row_key = Column(String(255), nullable=False)  # deposit_id del depósito o id del cheque/retención
+    deposit_id = Column(String(255), nullable=True)
+    date = Column(String(10), nullable=True)  # Día del depósito, formato YYYY-MM-DD
+    row_version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_deleted_rows_date_row_version', 'date', 'row_version'),
+    )
+
+    def __repr__(self):
+        return f"<DeletedRow(table={self.table_name}, key={self.row_key}, version={self.row_version})>"
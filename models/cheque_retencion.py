@@ -12,7 +12,7 @@ class Cheque(Base):
     __tablename__ = "cheques"
     
     id = Column(Integer, primary_key=True, index=True)
-    deposit_id = Column(String(255), ForeignKey("deposits.deposit_id"), nullable=False)  # Usar deposit_id string como estaba
+    deposit_id = Column(String(255), ForeignKey("deposits.deposit_id"), nullable=False, index=True)  # Usar deposit_id string como estaba
     nrocta = Column(BigInteger, default=1)  # Cambiado a BigInteger para soportar números grandes
     concepto = Column(String(50), default="CHE")
     banco = Column(String(255))
@@ -23,6 +23,7 @@ class Cheque(Base):
     titular = Column(String(255), default="")
     fecha = Column(String(50))  # Este será la "fecha_cobro" del frontend - aumentado para timestamps
     importe = Column(Float)
+    row_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Ver services.row_version_service
     
     # Relación con Deposit
     deposit = relationship("Deposit", back_populates="cheques")
@@ -31,13 +32,14 @@ class Retencion(Base):
     __tablename__ = "retenciones"
     
     id = Column(Integer, primary_key=True, index=True)
-    deposit_id = Column(String(255), ForeignKey("deposits.deposit_id"), nullable=False)  # Usar deposit_id string como estaba
+    deposit_id = Column(String(255), ForeignKey("deposits.deposit_id"), nullable=False, index=True)  # Usar deposit_id string como estaba
     nrocta = Column(BigInteger, default=1)  # Cambiado a BigInteger para soportar números grandes
     concepto = Column(String(50), default="RIB")
     nro_retencion = Column(String(100))  # Este será el "numero" del frontend
     fecha = Column(String(50))  # Fecha de la retención - aumentado para timestamps completos
     importe = Column(Float)
     tipo = Column(String(50))  # Campo adicional para el frontend (tipo de retención)
+    row_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Ver services.row_version_service
     
     # Relación con Deposit
     deposit = relationship("Deposit", back_populates="retenciones")
@@ -1,11 +1,39 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Enum, Index
 from sqlalchemy.types import TypeDecorator, String as SQLString
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from database import Base
+from utils.idreparto import extraer_idreparto_de_user_name
 import enum
 
 TOLERANCE_DIFFERENCE = 10000
 
+# Semáforo de documentos (cheques/retenciones esperados vs cargados)
+SEMAFORO_VERDE    = "VERDE"     # Tiene documentos esperados y están todos cargados
+SEMAFORO_AMARILLO = "AMARILLO"  # Falta cargar cheques o retenciones esperados
+SEMAFORO_GRIS     = "GRIS"      # No se esperan cheques ni retenciones
+
+def calcular_semaforo_docs(composicion_esperado, cheques_count, retenciones_count, semaforo=None) -> dict:
+    """Detalle del semáforo de documentos de un depósito a partir de su composición y contadores"""
+    composicion = composicion_esperado or ""
+    cheques_esperados = "C" in composicion
+    retenciones_esperadas = "R" in composicion
+    cheques_cargados = (cheques_count or 0) > 0
+    retenciones_cargadas = (retenciones_count or 0) > 0
+    return {
+        "cheques_esperados": cheques_esperados,
+        "retenciones_esperadas": retenciones_esperadas,
+        "cheques_cargados": cheques_cargados,
+        "retenciones_cargadas": retenciones_cargadas,
+        "cheques_pendientes": cheques_esperados and not cheques_cargados,
+        "retenciones_pendientes": retenciones_esperadas and not retenciones_cargadas,
+        "docs_completos": (
+            (not cheques_esperados or cheques_cargados) and
+            (not retenciones_esperadas or retenciones_cargadas)
+        ),
+        "tiene_docs_esperados": cheques_esperados or retenciones_esperadas,
+        "estado": semaforo or SEMAFORO_GRIS
+    }
+
 class EstadoDeposito(enum.Enum):
     PENDIENTE = "PENDIENTE"
     LISTO     = "LISTO"
@@ -18,6 +46,7 @@ class Deposit(Base):
     deposit_id       = Column(String(255), unique=True, index=True)
     identifier       = Column(String(255))
     user_name        = Column(String(255))
+    idreparto        = Column(Integer, nullable=True)  # Extraído de user_name al guardar
     total_amount     = Column(Integer)
     deposit_esperado = Column(Integer, nullable=True)  # Total suma (Efectivo + Retenciones + Cheques)
     efectivo_esperado = Column(Integer, nullable=True)  # Solo efectivo para cierre
@@ -29,11 +58,33 @@ class Deposit(Base):
     st_name          = Column(String(255))
     estado           = Column(Enum(EstadoDeposito), default=EstadoDeposito.LISTO)
     fecha_envio      = Column(DateTime, nullable=True)  # Fecha cuando se envió el reparto
+    # Semáforo desnormalizado, mantenido al commit por services.semaforo_service
+    cheques_count     = Column(Integer, nullable=False, default=0, server_default="0")
+    retenciones_count = Column(Integer, nullable=False, default=0, server_default="0")
+    semaforo          = Column(String(10), nullable=False, default=SEMAFORO_GRIS, server_default=SEMAFORO_GRIS)
+    # Versión del último commit que tocó el depósito o sus documentos (services.row_version_service)
+    row_version       = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at        = Column(DateTime, nullable=True)
 
     # Relaciones con cheques y retenciones
     cheques = relationship("Cheque", back_populates="deposit", cascade="all, delete-orphan")
     retenciones = relationship("Retencion", back_populates="deposit", cascade="all, delete-orphan")
 
+    # Búsqueda de los depósitos de un reparto en un día (valores esperados y cierre)
+    __table_args__ = (
+        Index('ix_deposits_idreparto_date_time', 'idreparto', 'date_time'),
+        # Conteo de semáforos por día y máquina sin leer la tabla
+        Index('ix_deposits_date_time_semaforo', 'date_time', 'identifier', 'semaforo'),
+        # Cambios de un día posteriores a un cursor (/db/deposits/changes)
+        Index('ix_deposits_date_time_row_version', 'date_time', 'row_version'),
+    )
+
+    @validates('user_name')
+    def _set_idreparto(self, key, user_name):
+        """Mantiene idreparto sincronizado con user_name (se calcula una sola vez, al guardar)"""
+        self.idreparto = extraer_idreparto_de_user_name(user_name)
+        return user_name
+
     @property
     def tiene_diferencia(self):
         """Verifica si hay diferencia entre monto esperado y real"""
@@ -47,6 +98,13 @@ class Deposit(Base):
         if self.deposit_esperado is None:
             return 0
         return self.total_amount - self.deposit_esperado
+
+    @property
+    def semaforo_docs(self):
+        """Semáforo de documentos a partir de los contadores guardados (sin cargar cheques/retenciones)"""
+        return calcular_semaforo_docs(
+            self.composicion_esperado, self.cheques_count, self.retenciones_count, self.semaforo
+        )
     
     
     def actualizar_estado(self):
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint, Index
+from database import Base
+from datetime import datetime
+
+class DepositAggregate(Base):
+    """
+    Agregados materializados de depósitos por día, planta, máquina y estado.
+    Se recalculan dentro de la misma transacción que modifica los depósitos,
+    cheques o retenciones del día (ver services/aggregates_service.py).
+    """
+    __tablename__ = "deposit_aggregates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(String(10), nullable=False)  # Formato YYYY-MM-DD
+    plant = Column(String(50), nullable=False)  # 'jumillano', 'plata', 'nafa'
+    machine = Column(String(20), nullable=False)  # L-EJU-001, L-EJU-002, etc.
+    estado = Column(String(20), nullable=False)  # PENDIENTE, LISTO, ENVIADO
+    st_name = Column(String(255), nullable=True)
+    deposit_count = Column(Integer, default=0)
+    total_amount = Column(Float, default=0.0)
+    deposit_esperado = Column(Float, default=0.0)  # Suma de esperados (solo depósitos con esperado)
+    diferencia = Column(Float, default=0.0)  # Suma de (total_amount - deposit_esperado)
+    con_esperado_count = Column(Integer, default=0)  # Depósitos que ya tienen valor esperado
+    cheques_total = Column(Float, default=0.0)
+    cheques_count = Column(Integer, default=0)
+    retenciones_total = Column(Float, default=0.0)
+    retenciones_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('date', 'plant', 'machine', 'estado', name='_agg_date_plant_machine_estado_uc'),
+        Index('ix_deposit_aggregates_date_plant', 'date', 'plant'),
+    )
+
+    def __repr__(self):
+        return f"<DepositAggregate(date={self.date}, plant={self.plant}, machine={self.machine}, estado={self.estado}, count={self.deposit_count})>"
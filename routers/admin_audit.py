@@ -0,0 +1,71 @@
+"""
+Router de consulta del log de auditoría (acciones de usuario)
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from auth.dependencies import get_superadmin_user
+from models.user import User
+from services.audit_index import audit_index, AUDIT_MAX_PAGE_SIZE
+
+router = APIRouter(
+    prefix="/admin/audit",
+    tags=["admin-audit"]
+)
+
+
+@router.get("")
+async def search_audit_log(
+    user: Optional[str] = Query(None, description="user_id registrado en la acción"),
+    resource_id: Optional[str] = Query(None, description="ID del recurso (depósito, cheque, retención...)"),
+    action: Optional[str] = Query(None, description="Acción, por ejemplo UPDATE_DEPOSIT"),
+    resource: Optional[str] = Query(None, description="Tipo de recurso"),
+    request_id: Optional[str] = Query(None),
+    success: Optional[bool] = Query(None),
+    from_date: Optional[str] = Query(None, alias="from", description="YYYY-MM-DD o timestamp ISO"),
+    to_date: Optional[str] = Query(None, alias="to", description="YYYY-MM-DD (inclusive) o timestamp ISO"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=AUDIT_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_superadmin_user)
+):
+    """
+    Busca acciones de usuario en user_actions.log y sus segmentos rotados/archivados,
+    de la más reciente a la más antigua
+    """
+    try:
+        # El índice se actualiza con las líneas nuevas antes de consultar (lectura de archivos y SQLite)
+        return await run_in_threadpool(
+            audit_index.search,
+            user=user,
+            resource_id=resource_id,
+            action=action,
+            resource=resource,
+            request_id=request_id,
+            success=success,
+            date_from=from_date,
+            date_to=to_date,
+            page=page,
+            page_size=page_size
+        )
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/stats")
+async def audit_index_stats(current_user: User = Depends(get_superadmin_user)):
+    """Estado del índice de auditoría"""
+    try:
+        return await run_in_threadpool(audit_index.stats)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.post("/reindex")
+async def refresh_audit_index(current_user: User = Depends(get_superadmin_user)):
+    """Indexa ya las líneas nuevas del log (sin esperar a la próxima consulta)"""
+    try:
+        added = await run_in_threadpool(audit_index.refresh, True)
+        return {"status": "ok", "added": added}
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
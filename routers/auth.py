@@ -11,7 +11,7 @@ from schemas.auth_schemas import (
 )
 
 # Importar utilidades de logging
-from utils.logging_utils import log_user_action, log_technical_error, log_technical_warning
+from utils.logging_utils import log_technical_error, log_technical_warning, audit_action, annotate_audit
 from middleware.logging_middleware import log_endpoint_access
 
 router = APIRouter(
@@ -24,83 +24,47 @@ def login(request: Request, login_data: LoginRequest):
     """
     Autenticar usuario y obtener token JWT
     """
-    try:
-        # Log del intento de login
-        log_user_action(
-            action="ATTEMPT_LOGIN",
-            resource="authentication",
-            request=request,
-            extra_data={
-                "username": login_data.username,
-                "attempt_time": "now"
-            }
-        )
-        
-        result = auth_service.login(login_data.username, login_data.password)
-        
-        # Log de login exitoso
-        log_user_action(
-            action="LOGIN_SUCCESS",
-            user_id=login_data.username,
-            resource="authentication", 
-            request=request,
-            success=True,
-            extra_data={
-                "username": login_data.username,
-                "user_role": result.get("user", {}).get("role", "unknown")
-            }
-        )
-        
-        return result
-        
-    except HTTPException as e:
-        # Log de login fallido
-        log_user_action(
-            action="LOGIN_FAILED",
-            resource="authentication",
-            request=request,
-            success=False,
-            extra_data={
-                "username": login_data.username,
-                "error_code": e.status_code,
-                "error_detail": str(e.detail)
-            }
-        )
-        
-        # Log técnico del error
-        log_technical_warning(
-            f"Login fallido para usuario {login_data.username}: {e.detail}",
-            "authentication_failed",
-            request=request,
-            extra_data={"username": login_data.username, "status_code": e.status_code}
-        )
-        raise
-        
-    except Exception as e:
-        # Log de error técnico
-        log_technical_error(
-            e,
-            "login_endpoint", 
-            request=request,
-            extra_data={"username": login_data.username}
-        )
-        
-        # Log de login fallido por error del sistema
-        log_user_action(
-            action="LOGIN_SYSTEM_ERROR", 
-            resource="authentication",
-            request=request,
-            success=False,
-            extra_data={
-                "username": login_data.username,
-                "error_type": type(e).__name__
-            }
-        )
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error en el proceso de login: {str(e)}"
-        )
+    # Un único registro LOGIN con resultado y duración (en lugar de ATTEMPT_LOGIN + LOGIN_SUCCESS/FAILED)
+    with audit_action(
+        "LOGIN",
+        resource="authentication",
+        request=request,
+        extra_data={"username": login_data.username}
+    ) as audit:
+        try:
+            result = auth_service.login(login_data.username, login_data.password)
+            
+            audit.user_id = login_data.username
+            audit.extra_data["user_role"] = result.get("user", {}).get("role", "unknown")
+            
+            return result
+            
+        except HTTPException as e:
+            # Log técnico del error
+            log_technical_warning(
+                f"Login fallido para usuario {login_data.username}: {e.detail}",
+                "authentication_failed",
+                request=request,
+                extra_data={"username": login_data.username, "status_code": e.status_code}
+            )
+            raise
+            
+        except Exception as e:
+            # Log de error técnico
+            log_technical_error(
+                e,
+                "login_endpoint", 
+                request=request,
+                extra_data={"username": login_data.username}
+            )
+            
+            # Falla del sistema (no de credenciales): conservar el tipo de error original
+            audit.extra_data["error_type"] = type(e).__name__
+            
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error en el proceso de login: {str(e)}"
+            )
 
 @router.get("/me", response_model=CurrentUserResponse)
 @log_endpoint_access("GET_USER_INFO", "authentication")
@@ -109,19 +73,8 @@ def get_current_user_info(request: Request, current_user: User = Depends(get_cur
     Obtener información del usuario actual
     """
     try:
-        # Log de consulta de información de usuario
-        log_user_action(
-            action="GET_USER_INFO",
-            user_id=current_user.username,
-            resource="user_profile",
-            request=request,
-            success=True,
-            extra_data={
-                "user_id": current_user.id,
-                "username": current_user.username,
-                "role": current_user.role.value
-            }
-        )
+        # Completa el registro GET_USER_INFO del decorador
+        annotate_audit(user_id=current_user.username, role=current_user.role.value)
         
         return {
             "id": current_user.id,
@@ -1,14 +1,17 @@
 """
 Router para manejo de totales diarios y datos para gráficos
 """
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request
 from fastapi.responses import JSONResponse
 from services.daily_totals_service import (
     save_daily_totals, 
     get_daily_totals_by_period, 
     get_monthly_chart_data,
-    auto_save_today_totals
+    auto_save_today_totals,
+    ensure_recent_data_exists,
+    query_daily_totals
 )
+from services.http_cache import daily_totals_validator, cached_response, with_validators
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -53,16 +56,37 @@ def save_today_totals():
 
 @router.get("/daily-totals")
 def get_daily_totals(
+    request: Request,
     start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
     end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
     plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa, total)")
 ):
     """
     Obtiene los totales diarios para un período específico
+    Responde 304 si el cliente tiene la versión vigente (y desde memoria si el período ya terminó)
     """
     try:
-        totals = get_daily_totals_by_period(start_date, end_date, plant)
-        return JSONResponse(
+        from database import SessionLocal
+        
+        # Programar el backfill de los días faltantes antes de versionar el período
+        ensure_recent_data_exists(end_date, start_date)
+        
+        db = SessionLocal()
+        try:
+            validator = daily_totals_validator(
+                db,
+                datetime.strptime(start_date, "%Y-%m-%d").date(),
+                datetime.strptime(end_date, "%Y-%m-%d").date(),
+                plant
+            )
+        finally:
+            db.close()
+        cached = cached_response(request, validator)
+        if cached is not None:
+            return cached
+        
+        totals = query_daily_totals(start_date, end_date, plant)
+        return with_validators(validator, JSONResponse(
             status_code=200,
             content={
                 "start_date": start_date,
@@ -71,7 +95,7 @@ def get_daily_totals(
                 "totals": totals,
                 "count": len(totals)
             }
-        )
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener totales: {str(e)}")
 
@@ -158,36 +182,206 @@ def get_last_30_days_totals(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener datos: {str(e)}")
 
+@router.post("/backfill")
+def start_daily_totals_backfill(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    max_workers: int = Query(2, ge=1, le=4, description="Consultas simultáneas a miniBank"),
+    requests_per_second: float = Query(1.0, gt=0, le=5, description="Días iniciados por segundo"),
+    resume: bool = Query(True, description="Retomar desde el checkpoint si es el mismo rango")
+):
+    """
+    Inicia en segundo plano el backfill de los totales diarios faltantes del rango
+    """
+    try:
+        from services.daily_totals_backfill import start_backfill
+        
+        result = start_backfill(
+            start_date,
+            end_date,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            resume=resume
+        )
+        return JSONResponse(
+            status_code=202 if result["started"] else 409,
+            content={
+                "message": "Backfill iniciado" if result["started"] else "Ya hay un backfill en curso",
+                **result
+            }
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al iniciar backfill: {str(e)}")
+
+@router.get("/backfill/status")
+def get_daily_totals_backfill_status():
+    """
+    Obtiene el progreso del backfill de totales diarios en curso (o del último ejecutado)
+    """
+    from services.daily_totals_backfill import get_backfill_status
+    return JSONResponse(status_code=200, content=get_backfill_status())
+
+@router.get("/deposit-aggregates")
+def get_deposit_aggregates(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa)")
+):
+    """
+    Obtiene totales por día y planta desde la tabla de agregados de depósitos
+    (cantidad, monto, esperado, diferencia, cheques, retenciones y estados)
+    """
+    try:
+        from database import SessionLocal
+        from services.aggregates_service import get_aggregates_by_period, AGGREGATES_NOT_READY
+        
+        db = SessionLocal()
+        try:
+            aggregates = get_aggregates_by_period(db, start_date, end_date, plant)
+        finally:
+            db.close()
+        
+        if aggregates is None:
+            return JSONResponse(status_code=503, content={"error": AGGREGATES_NOT_READY})
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "start_date": start_date,
+                "end_date": end_date,
+                "plant": plant,
+                "aggregates": aggregates,
+                "count": len(aggregates)
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener agregados: {str(e)}")
+
+def _run_analytics(func, *args, **kwargs):
+    """
+    Ejecuta una función de services.analytics_service con su propia sesión
+    """
+    from database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+def _validate_analytics_range(start_date: str, end_date: str):
+    """400 si las fechas no son YYYY-MM-DD o el rango está invertido"""
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date no puede ser posterior a end_date")
+
+def _parse_number_list(value: str, cast, detail: str) -> list:
+    """Lista separada por coma (p. ej. windows=7,30); 400 con `detail` si algún valor no es numérico"""
+    try:
+        return [cast(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
+
+@router.get("/analytics/rolling")
+def get_analytics_rolling(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa)"),
+    windows: str = Query("7,30", description="Ventanas en días separadas por coma")
+):
+    """
+    Totales diarios de depósitos con promedios móviles
+    """
+    _validate_analytics_range(start_date, end_date)
+    window_list = _parse_number_list(windows, int, "Las ventanas deben ser números enteros separados por coma")
+    if not window_list or any(w < 1 or w > 365 for w in window_list):
+        raise HTTPException(status_code=400, detail="Las ventanas deben estar entre 1 y 365 días")
+    
+    try:
+        from services.analytics_service import get_rolling_averages
+        
+        data = _run_analytics(get_rolling_averages, start_date, end_date, plant, window_list)
+        return JSONResponse(status_code=200, content={"start_date": start_date, "end_date": end_date, "plant": plant, **data})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular promedios móviles: {str(e)}")
+
+@router.get("/analytics/week-over-week")
+def get_analytics_week_over_week(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa)")
+):
+    """
+    Variación diaria y semanal de depósitos contra la semana anterior
+    """
+    _validate_analytics_range(start_date, end_date)
+    
+    try:
+        from services.analytics_service import get_week_over_week
+        
+        data = _run_analytics(get_week_over_week, start_date, end_date, plant)
+        return JSONResponse(status_code=200, content={"start_date": start_date, "end_date": end_date, "plant": plant, **data})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular variación semanal: {str(e)}")
+
+@router.get("/analytics/reparto-variance")
+def get_analytics_reparto_variance(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa)"),
+    top: int = Query(50, ge=1, le=1000, description="Cantidad máxima de repartos")
+):
+    """
+    Estadísticas de la diferencia real - esperado (total_amount - deposit_esperado) por reparto
+    """
+    _validate_analytics_range(start_date, end_date)
+    
+    try:
+        from services.analytics_service import get_reparto_variance
+        
+        data = _run_analytics(get_reparto_variance, start_date, end_date, plant, top)
+        return JSONResponse(status_code=200, content={"start_date": start_date, "end_date": end_date, "plant": plant, **data})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular variación por reparto: {str(e)}")
+
+@router.get("/analytics/percentiles")
+def get_analytics_percentiles(
+    start_date: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD"),
+    end_date: str = Query(..., description="Fecha final en formato YYYY-MM-DD"),
+    plant: Optional[str] = Query(None, description="Planta específica (jumillano, plata, nafa)"),
+    q: str = Query("10,50,90,95", description="Percentiles separados por coma")
+):
+    """
+    Percentiles mensuales del monto por depósito y del total diario
+    """
+    _validate_analytics_range(start_date, end_date)
+    q_list = _parse_number_list(q, float, "Los percentiles deben ser números separados por coma")
+    if not q_list or any(not 0 <= p <= 100 for p in q_list):
+        raise HTTPException(status_code=400, detail="Los percentiles deben estar entre 0 y 100")
+    
+    try:
+        from services.analytics_service import get_monthly_percentiles
+        
+        data = _run_analytics(get_monthly_percentiles, start_date, end_date, plant, q_list)
+        return JSONResponse(status_code=200, content={"start_date": start_date, "end_date": end_date, "plant": plant, **data})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular percentiles: {str(e)}")
+
 @router.get("/stats/summary")
 def get_summary_stats():
     """
     Obtiene un resumen de estadísticas generales
     """
     try:
-        # Últimos 7 días
-        end_date = datetime.now().strftime("%Y-%m-%d")
-        start_date_7 = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        start_date_30 = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-        
-        last_7_days = get_daily_totals_by_period(start_date_7, end_date, "total")
-        last_30_days = get_daily_totals_by_period(start_date_30, end_date, "total")
-        
-        def calculate_total(totals):
-            return sum(t["total_amount"] for t in totals)
-        
-        summary = {
-            "last_7_days": {
-                "total": calculate_total(last_7_days),
-                "average": calculate_total(last_7_days) / 7 if last_7_days else 0,
-                "days": len(last_7_days)
-            },
-            "last_30_days": {
-                "total": calculate_total(last_30_days),
-                "average": calculate_total(last_30_days) / 30 if last_30_days else 0,
-                "days": len(last_30_days)
-            },
-            "current_month": get_monthly_chart_data(datetime.now().year, datetime.now().month, "total")
-        }
+        from services.chart_data_service import get_summary_stats_data
+        
+        summary = get_summary_stats_data()
         
         return JSONResponse(status_code=200, content=summary)
         
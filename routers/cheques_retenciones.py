@@ -10,7 +10,7 @@ from auth.dependencies import get_any_user
 from datetime import datetime
 
 # Importar utilidades de logging
-from utils.logging_utils import log_user_action, log_technical_error, log_technical_warning
+from utils.logging_utils import log_technical_error, log_technical_warning, annotate_audit
 from middleware.logging_middleware import log_endpoint_access
 
 router = APIRouter(
@@ -70,18 +70,13 @@ def crear_cheque(
     """Crear un nuevo cheque asociado a un depósito"""
     db = SessionLocal()
     try:
-        # Log del intento de creación
-        log_user_action(
-            action="ATTEMPT_CREATE_CHEQUE",
+        # Datos de la acción (se registra una sola vez al terminar, con resultado y duración)
+        annotate_audit(
             user_id=current_user.username,
-            resource="cheques",
-            request=request,
-            extra_data={
-                "deposit_id": cheque_data.deposit_id,
-                "importe": cheque_data.importe,
-                "banco": cheque_data.banco,
-                "nro_cheque": cheque_data.nro_cheque
-            }
+            deposit_id=cheque_data.deposit_id,
+            importe=cheque_data.importe,
+            banco=cheque_data.banco,
+            nro_cheque=cheque_data.nro_cheque
         )
         
         # Verificar que el depósito existe
@@ -115,22 +110,7 @@ def crear_cheque(
         db.commit()
         db.refresh(cheque)
         
-        # Log de creación exitosa
-        log_user_action(
-            action="CREATE_CHEQUE_SUCCESS",
-            user_id=current_user.username,
-            resource="cheques",
-            resource_id=str(cheque.id),
-            request=request,
-            success=True,
-            extra_data={
-                "cheque_id": cheque.id,
-                "deposit_id": cheque.deposit_id,
-                "importe": cheque.importe,
-                "banco": cheque.banco,
-                "nro_cheque": cheque.nro_cheque
-            }
-        )
+        annotate_audit(resource_id=cheque.id, cheque_id=cheque.id)
         
         return {
             "success": True,
@@ -158,19 +138,8 @@ def crear_cheque(
             }
         )
         
-        # Log de creación fallida
-        log_user_action(
-            action="CREATE_CHEQUE_FAILED",
-            user_id=current_user.username,
-            resource="cheques",
-            request=request,
-            success=False,
-            extra_data={
-                "deposit_id": cheque_data.deposit_id,
-                "error_type": type(e).__name__,
-                "error_message": str(e)
-            }
-        )
+        # Causa original de la falla para el registro de la acción
+        annotate_audit(error_type=type(e).__name__, error_message=str(e))
         
         raise HTTPException(
             status_code=500,
@@ -317,22 +286,16 @@ def eliminar_cheque(
         db.delete(cheque)
         db.commit()
         
-        # Log de eliminación exitosa
-        log_user_action(
-            action="DELETE_CHEQUE_SUCCESS",
-            user_id=current_user.username,
-            resource="cheques",
-            resource_id=str(cheque.id),
-            request=request,
-            success=True,
-            extra_data=cheque_info
-        )
+        # Datos del cheque eliminado en el registro de la acción
+        annotate_audit(resource_id=cheque_info["cheque_id"], **cheque_info)
         
         return {
             "success": True,
             "message": "Cheque eliminado exitosamente"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -353,18 +316,13 @@ def crear_retencion(
     """Crear una nueva retención asociada a un depósito"""
     db = SessionLocal()
     try:
-        # Log del intento de creación
-        log_user_action(
-            action="ATTEMPT_CREATE_RETENCION",
+        # Datos de la acción (se registra una sola vez al terminar, con resultado y duración)
+        annotate_audit(
             user_id=current_user.username,
-            resource="retenciones",
-            request=request,
-            extra_data={
-                "deposit_id": retencion_data.deposit_id,
-                "importe": retencion_data.importe,
-                "concepto": retencion_data.concepto,
-                "nro_retencion": retencion_data.nro_retencion
-            }
+            deposit_id=retencion_data.deposit_id,
+            importe=retencion_data.importe,
+            concepto=retencion_data.concepto,
+            nro_retencion=retencion_data.nro_retencion
         )
         
         # Verificar que el depósito existe
@@ -389,22 +347,7 @@ def crear_retencion(
         db.commit()
         db.refresh(retencion)
         
-        # Log de creación exitosa
-        log_user_action(
-            action="CREATE_RETENCION_SUCCESS",
-            user_id=current_user.username,
-            resource="retenciones",
-            resource_id=str(retencion.id),
-            request=request,
-            success=True,
-            extra_data={
-                "retencion_id": retencion.id,
-                "deposit_id": retencion.deposit_id,
-                "importe": retencion.importe,
-                "concepto": retencion.concepto,
-                "nro_retencion": retencion.nro_retencion
-            }
-        )
+        annotate_audit(resource_id=retencion.id, retencion_id=retencion.id)
         
         return {
             "success": True,
@@ -432,19 +375,8 @@ def crear_retencion(
             }
         )
         
-        # Log de creación fallida
-        log_user_action(
-            action="CREATE_RETENCION_FAILED",
-            user_id=current_user.username,
-            resource="retenciones",
-            request=request,
-            success=False,
-            extra_data={
-                "deposit_id": retencion_data.deposit_id,
-                "error_type": type(e).__name__,
-                "error_message": str(e)
-            }
-        )
+        # Causa original de la falla para el registro de la acción
+        annotate_audit(error_type=type(e).__name__, error_message=str(e))
         
         raise HTTPException(
             status_code=500,
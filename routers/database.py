@@ -3,10 +3,14 @@ Router para operaciones CRUD de la base de datos
 """
 import traceback
 from datetime import datetime
-from fastapi import APIRouter, Query, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Query, HTTPException, Request
 from fastapi.responses import JSONResponse
+from utils.json_response import FastJSONResponse
+from services.http_cache import deposits_day_validator, cached_response, with_validators
 from schemas.requests import StatusUpdateRequest, ExpectedAmountUpdateRequest
 from sqlalchemy import func, text, Date, distinct
+from sqlalchemy.orm import selectinload
 import os
 
 def get_date_function(column):
@@ -28,62 +32,72 @@ router = APIRouter(
 
 
 @router.get("/deposits/by-plant")
-def get_deposits_from_db_by_plant(date: str = Query(...)):
+def get_deposits_from_db_by_plant(
+    request: Request,
+    date: str = Query(...),
+    refresh: bool = Query(False, description="Sincronizar con miniBank y la API de repartos aunque los datos estén frescos"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada (segundos) antes de volver a sincronizar")
+):
     """
     Obtiene depósitos desde la base de datos organizados por planta
-    Auto-sincroniza datos frescos de miniBank y valores esperados de la API externa
+    Sincroniza miniBank y valores esperados de la API externa según la política de
+    frescura (nunca para días cerrados). Responde 304 si el cliente tiene la versión vigente.
+    Las decisiones de sincronización de esta request van en X-Freshness; auto_synced_* del
+    cuerpo corresponden a la request que lo armó y en un 304 o copia de la caché pueden ser viejos
     """
     try:
         from database import SessionLocal
-        from sqlalchemy import func
-        from sqlalchemy.types import Date
         from datetime import datetime as dt
         from models.deposit import Deposit
         from services.deposits_service import get_all_deposits, save_deposits_to_db
         from services.repartos_api_service import actualizar_depositos_esperados
+        from services.freshness_policy import FreshnessPolicy, SOURCE_MINIBANK, SOURCE_EXPECTED
         
-        # Verificar si hay depósitos en la base de datos para esta fecha
         today = datetime.now().strftime("%Y-%m-%d")
+        query_date = dt.strptime(date, "%Y-%m-%d").date()
         auto_synced_minibank = False
         auto_synced_expected = False
         
-        # Verificar si ya hay datos en la base de datos
-        db_temp = SessionLocal()
-        query_date_temp = dt.strptime(date, "%Y-%m-%d").date()
-        existing_deposits_count = db_temp.query(Deposit).filter(
-            func.cast(Deposit.date_time, Date) == query_date_temp
-        ).count()
-        db_temp.close()
+        policy = FreshnessPolicy("db.by-plant", query_date, refresh=refresh, max_staleness=max_staleness)
         
-        # Auto-sincronizar miniBank si no hay datos O si es hoy
-        if existing_deposits_count == 0 or date == today:
+        # Sincronizar miniBank: carga inicial de días sin datos o datos de hoy vencidos
+        if policy.decide(SOURCE_MINIBANK).sync:
             try:
-                print(f"🔄 Auto-sincronizando datos de miniBank para {date} (existentes: {existing_deposits_count})")
+                print(f"🔄 Auto-sincronizando datos de miniBank para {date} ({policy.decisions[SOURCE_MINIBANK].reason})")
                 # Obtener datos frescos de la API de miniBank y guardarlos
                 fresh_data = get_all_deposits(date)
                 save_deposits_to_db(fresh_data)
                 auto_synced_minibank = True
+                policy.record(SOURCE_MINIBANK, ok=True)
                 print("✅ Datos de miniBank sincronizados")
             except Exception as sync_error:
+                policy.record(SOURCE_MINIBANK, ok=False)
                 print(f"⚠️ Error en auto-sincronización de miniBank: {sync_error}")
         
-        # SIEMPRE sincronizar valores esperados desde la API externa (para cualquier fecha)
-        try:
+        # Valores esperados desde la API externa (los depósitos recién traídos los necesitan)
+        if policy.decide(SOURCE_EXPECTED, new_data=auto_synced_minibank).sync:
             print(f"🔄 Auto-sincronizando valores esperados desde API externa para {date}...")
-            resultado_esperados = actualizar_depositos_esperados(date)
-            print(f"💰 Valores esperados: {resultado_esperados.get('actualizados', 0)} depósitos actualizados")
-            auto_synced_expected = True
-        except Exception as sync_error:
-            print(f"⚠️ Error en auto-sincronización de valores esperados: {sync_error}")
-            auto_synced_expected = False
+            resultado_esperados = actualizar_depositos_esperados(date, force_refresh=refresh)
+            auto_synced_expected = resultado_esperados.get("status") != "error"
+            policy.record(SOURCE_EXPECTED, ok=auto_synced_expected)
+            if auto_synced_expected:
+                print(f"💰 Valores esperados: {resultado_esperados.get('actualizados', 0)} depósitos actualizados")
+            else:
+                print(f"⚠️ Error en auto-sincronización de valores esperados: {resultado_esperados.get('message')}")
         
         db = SessionLocal()
         
-        # Convertir string de fecha a objeto datetime para comparar
-        query_date = dt.strptime(date, "%Y-%m-%d").date()
+        # Versión posterior a las sincronizaciones y anterior a la lectura: el ETag nunca es más nuevo que el contenido
+        validator = deposits_day_validator(db, "by-plant", query_date)
+        cached = None if refresh else cached_response(request, validator)
+        if cached is not None:
+            db.close()
+            return policy.apply(cached)
         
         # Consultar depósitos de la fecha especificada
-        deposits = db.query(Deposit).filter(
+        deposits = db.query(Deposit).options(
+            selectinload(Deposit.cheques), selectinload(Deposit.retenciones)
+        ).filter(
             get_date_function(Deposit.date_time) == query_date
         ).all()
         
@@ -150,20 +164,8 @@ def get_deposits_from_db_by_plant(date: str = Query(...)):
                 } for retencion in deposit.retenciones],
                 "total_cheques": len(deposit.cheques),
                 "total_retenciones": len(deposit.retenciones),
-                # Semáforos para indicar documentos pendientes/completados
-                "semaforo_docs": {
-                    "cheques_esperados": "C" in (deposit.composicion_esperado or ""),
-                    "retenciones_esperadas": "R" in (deposit.composicion_esperado or ""),
-                    "cheques_cargados": len(deposit.cheques) > 0,
-                    "retenciones_cargadas": len(deposit.retenciones) > 0,
-                    "cheques_pendientes": "C" in (deposit.composicion_esperado or "") and len(deposit.cheques) == 0,
-                    "retenciones_pendientes": "R" in (deposit.composicion_esperado or "") and len(deposit.retenciones) == 0,
-                    "docs_completos": (
-                        ("C" not in (deposit.composicion_esperado or "") or len(deposit.cheques) > 0) and
-                        ("R" not in (deposit.composicion_esperado or "") or len(deposit.retenciones) > 0)
-                    ),
-                    "tiene_docs_esperados": "C" in (deposit.composicion_esperado or "") or "R" in (deposit.composicion_esperado or "")
-                }
+                # Semáforos para indicar documentos pendientes/completados (contadores guardados)
+                "semaforo_docs": deposit.semaforo_docs
             }
             
             if deposit.identifier in plants["jumillano"]["machines"]:
@@ -184,7 +186,7 @@ def get_deposits_from_db_by_plant(date: str = Query(...)):
         
         db.close()
         
-        return {
+        return policy.apply(with_validators(validator, FastJSONResponse(content={
             "status": "ok",
             "date": date,
             "source": "database",
@@ -202,7 +204,7 @@ def get_deposits_from_db_by_plant(date: str = Query(...)):
                 "grand_total": plants["jumillano"]["total"] + plants["plata"]["total"] + plants["nafa"]["total"],
                 "total_deposits": sum(plant["count"] for plant in plants.values())
             }
-        }
+        }), store=not refresh))
         
     except Exception as e:
         print(f"❌ Error al consultar BD: {str(e)}")
@@ -211,9 +213,10 @@ def get_deposits_from_db_by_plant(date: str = Query(...)):
 
 
 @router.get("/deposits/by-machine")
-def get_deposits_from_db_by_machine(date: str = Query(...)):
+def get_deposits_from_db_by_machine(request: Request, date: str = Query(...)):
     """
     Obtiene depósitos desde la base de datos organizados por máquina
+    Responde 304 si el cliente tiene la versión vigente (y desde memoria si el día está cerrado)
     """
     try:
         from database import SessionLocal
@@ -226,8 +229,16 @@ def get_deposits_from_db_by_machine(date: str = Query(...)):
         # Convertir string de fecha a objeto datetime para comparar
         query_date = dt.strptime(date, "%Y-%m-%d").date()
         
+        validator = deposits_day_validator(db, "by-machine", query_date)
+        cached = cached_response(request, validator)
+        if cached is not None:
+            db.close()
+            return cached
+        
         # Consultar depósitos de la fecha especificada
-        deposits = db.query(Deposit).filter(
+        deposits = db.query(Deposit).options(
+            selectinload(Deposit.cheques), selectinload(Deposit.retenciones)
+        ).filter(
             get_date_function(Deposit.date_time) == query_date
         ).all()
         
@@ -283,20 +294,8 @@ def get_deposits_from_db_by_machine(date: str = Query(...)):
                 } for retencion in deposit.retenciones],
                 "total_cheques": len(deposit.cheques),
                 "total_retenciones": len(deposit.retenciones),
-                # Semáforos para indicar documentos pendientes/completados
-                "semaforo_docs": {
-                    "cheques_esperados": "C" in (deposit.composicion_esperado or ""),
-                    "retenciones_esperadas": "R" in (deposit.composicion_esperado or ""),
-                    "cheques_cargados": len(deposit.cheques) > 0,
-                    "retenciones_cargadas": len(deposit.retenciones) > 0,
-                    "cheques_pendientes": "C" in (deposit.composicion_esperado or "") and len(deposit.cheques) == 0,
-                    "retenciones_pendientes": "R" in (deposit.composicion_esperado or "") and len(deposit.retenciones) == 0,
-                    "docs_completos": (
-                        ("C" not in (deposit.composicion_esperado or "") or len(deposit.cheques) > 0) and
-                        ("R" not in (deposit.composicion_esperado or "") or len(deposit.retenciones) > 0)
-                    ),
-                    "tiene_docs_esperados": "C" in (deposit.composicion_esperado or "") or "R" in (deposit.composicion_esperado or "")
-                }
+                # Semáforos para indicar documentos pendientes/completados (contadores guardados)
+                "semaforo_docs": deposit.semaforo_docs
             }
             
             machines[machine_id]["deposits"].append(deposit_data)
@@ -309,7 +308,7 @@ def get_deposits_from_db_by_machine(date: str = Query(...)):
         
         db.close()
         
-        return {
+        return with_validators(validator, FastJSONResponse(content={
             "status": "ok",
             "date": date,
             "source": "database",
@@ -319,7 +318,7 @@ def get_deposits_from_db_by_machine(date: str = Query(...)):
                 "grand_total": sum(machine["total"] for machine in machines.values()),
                 "total_deposits": sum(machine["count"] for machine in machines.values())
             }
-        }
+        }))
         
     except Exception as e:
         print(f"❌ Error al consultar BD: {str(e)}")
@@ -366,57 +365,68 @@ def get_available_dates():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/deposits/changes")
+def get_deposit_changes_since(
+    date: str = Query(..., description="Fecha YYYY-MM-DD"),
+    since: int = Query(0, ge=0, description="Cursor devuelto por la consulta anterior (0 = día completo)")
+):
+    """
+    Depósitos del día que cambiaron después del cursor `since` (con cheques y
+    retenciones) y los borrados, para refrescar sin volver a bajar todo el día.
+    Guardar `cursor` de la respuesta para la próxima consulta; si `full` es true,
+    reemplazar los datos del día en lugar de aplicar el delta.
+    """
+    try:
+        query_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    try:
+        from database import SessionLocal
+        from services.row_version_service import get_deposit_changes
+
+        db = SessionLocal()
+        try:
+            changes = get_deposit_changes(db, query_date, since)
+        finally:
+            db.close()
+
+        return FastJSONResponse(content={
+            "status": "ok",
+            "date": date,
+            **changes,
+            "count": len(changes["deposits"])
+        })
+
+    except Exception as e:
+        print(f"❌ Error al consultar cambios de depósitos: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/deposits/summary")
 def get_db_summary():
     """
-    Obtiene un resumen general de la base de datos
+    Obtiene un resumen general de la base de datos (leído desde la tabla de agregados)
     """
     try:
         from database import SessionLocal
-        from sqlalchemy import func, distinct
-        from models.deposit import Deposit
+        from services.aggregates_service import get_aggregates_summary, AGGREGATES_NOT_READY
         
         db = SessionLocal()
+        try:
+            summary = get_aggregates_summary(db)
+        finally:
+            db.close()
         
-        # Estadísticas generales
-        total_deposits = db.query(func.count(Deposit.id)).scalar()
-        total_amount = db.query(func.sum(Deposit.total_amount)).scalar() or 0
-        unique_machines = db.query(func.count(distinct(Deposit.identifier))).scalar()
-        date_range = db.query(
-            func.min(get_date_function(Deposit.date_time)).label('min_date'),
-            func.max(get_date_function(Deposit.date_time)).label('max_date')
-        ).first()
-        
-        # Totales por máquina
-        machine_totals = db.query(
-            Deposit.identifier,
-            Deposit.st_name,
-            func.count(Deposit.id).label('deposit_count'),
-            func.sum(Deposit.total_amount).label('total_amount')
-        ).group_by(Deposit.identifier, Deposit.st_name).all()
-        
-        machines_summary = []
-        for machine in machine_totals:
-            machines_summary.append({
-                "identifier": machine.identifier,
-                "st_name": machine.st_name,
-                "deposit_count": machine.deposit_count,
-                "total_amount": machine.total_amount
-            })
+        if summary is None:
+            return JSONResponse(status_code=503, content={"error": AGGREGATES_NOT_READY})
         
-        db.close()
+        machines_summary = summary.pop("machines")
         
         return {
             "status": "ok",
-            "summary": {
-                "total_deposits": total_deposits,
-                "total_amount": float(total_amount),
-                "unique_machines": unique_machines,
-                "date_range": {
-                    "from": date_range.min_date.strftime("%Y-%m-%d") if date_range.min_date else None,
-                    "to": date_range.max_date.strftime("%Y-%m-%d") if date_range.max_date else None
-                }
-            },
+            "summary": summary,
             "machines": machines_summary
         }
         
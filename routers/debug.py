@@ -1,5 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
+from auth.dependencies import get_admin_user
+from models.user import User
 
 router = APIRouter(
     prefix="/debug",
@@ -223,3 +225,32 @@ def test_login():
                 "traceback": traceback.format_exc()
             }
         )
+
+
+@router.get("/event-loop")
+def get_event_loop_diagnostics(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(get_admin_user)
+):
+    """Lag del event loop y callbacks que lo bloquearon (requiere EVENT_LOOP_DIAGNOSTICS=1)"""
+    from middleware.event_loop_monitor import get_event_loop_monitor
+
+    monitor = get_event_loop_monitor()
+    if monitor is None:
+        return {
+            "enabled": False,
+            "message": "Diagnóstico desactivado. Iniciar la API con EVENT_LOOP_DIAGNOSTICS=1"
+        }
+    return monitor.report(limit)
+
+
+@router.delete("/event-loop")
+def reset_event_loop_diagnostics(current_user: User = Depends(get_admin_user)):
+    """Reinicia las estadísticas del diagnóstico de event loop"""
+    from middleware.event_loop_monitor import get_event_loop_monitor
+
+    monitor = get_event_loop_monitor()
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Diagnóstico de event loop desactivado")
+    monitor.reset()
+    return {"status": "ok", "message": "Estadísticas reiniciadas"}
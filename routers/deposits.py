@@ -4,12 +4,13 @@ Router para endpoints de consulta de depósitos desde miniBank
 from datetime import datetime
 from fastapi import APIRouter, Query, Request
 from fastapi.responses import JSONResponse
+from utils.json_response import FastJSONResponse
 from pydantic import BaseModel, field_validator
 from typing import Optional
 from schemas.requests import StatusUpdateRequest, ExpectedAmountUpdateRequest
 
 # Importar utilidades de logging
-from utils.logging_utils import log_user_action, log_technical_error, log_technical_warning
+from utils.logging_utils import log_user_action, log_technical_error, log_technical_warning, annotate_audit, fail_audit
 from middleware.logging_middleware import log_endpoint_access
 from services.deposits_service import (
     get_deposits,
@@ -24,6 +25,7 @@ from services.deposits_service import (
 )
 from services.deposits_mapper import map_deposit_to_reparto
 from services.repartos_api_service import actualizar_depositos_esperados
+from services.freshness_policy import FreshnessPolicy, SOURCE_EXPECTED
 
 router = APIRouter(
     prefix="/deposits",
@@ -62,25 +64,47 @@ def _digits_str(value, default: str = "") -> str:
     return digits if digits else default
 
 
+def _auto_sync_expected(date: str, etiqueta: str, refresh: bool, max_staleness: Optional[int]):
+    """
+    Sincroniza los valores esperados del día si la política de frescura lo pide.
+    Devuelve (política, resultado); resultado es None si no se sincronizó y la
+    política es None si la fecha no viene como YYYY-MM-DD (formato que exige la API de repartos)
+    """
+    try:
+        fecha = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        return None, None
+    
+    policy = FreshnessPolicy("deposits", fecha, refresh=refresh, max_staleness=max_staleness)
+    decision = policy.decide(SOURCE_EXPECTED)
+    if not decision.sync:
+        print(f"⏭️ Valores esperados para {etiqueta} {date} sin sincronizar ({decision.reason})")
+        return policy, None
+    
+    print(f"🔄 Auto-sincronizando valores esperados para {etiqueta} {date}...")
+    resultado_sync = actualizar_depositos_esperados(date, force_refresh=refresh)
+    policy.record(SOURCE_EXPECTED, ok=resultado_sync.get("status") != "error")
+    print(f"💰 Sincronización: {resultado_sync.get('actualizados', 0)} depósitos actualizados")
+    return policy, resultado_sync
+
+
+def _with_freshness(response, policy: Optional[FreshnessPolicy]):
+    """El cuerpo es el de miniBank tal cual: las decisiones de frescura van en X-Freshness"""
+    if policy is not None:
+        policy.apply(response)
+    return response
+
+
 @router.get("")
 @log_endpoint_access("VIEW_DEPOSITS", "deposits")
 def deposits(request: Request, stIdentifier: str = Query(...), date: str = Query(...)):
     try:
-        # Log de la acción específica
-        log_user_action(
-            action="VIEW_DEPOSITS_BY_IDENTIFIER",
-            resource="deposits",
-            request=request,
-            extra_data={
-                "identifier": stIdentifier,
-                "date": date,
-                "query_type": "by_identifier"
-            }
-        )
+        # Datos de la consulta para el registro de la acción
+        annotate_audit(identifier=stIdentifier, date=date, query_type="by_identifier")
         
         data = get_deposits(stIdentifier, date)
         
-        return JSONResponse(content=data)
+        return FastJSONResponse(content=data)
     except Exception as e:
         # Log del error técnico
         log_technical_error(
@@ -92,41 +116,34 @@ def deposits(request: Request, stIdentifier: str = Query(...), date: str = Query
                 "date": date
             }
         )
+        # La excepción no se propaga: la acción se registra como fallida igual
+        fail_audit(e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/jumillano")
 @log_endpoint_access("VIEW_JUMILLANO_DEPOSITS", "deposits")
-def deposits_jumillano(request: Request, date: str = Query(...)):
+def deposits_jumillano(
+    request: Request,
+    date: str = Query(...),
+    refresh: bool = Query(False, description="Sincronizar valores esperados aunque estén frescos"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada (segundos) de los valores esperados")
+):
     try:
-        # Log de inicio de consulta
-        log_user_action(
-            action="VIEW_JUMILLANO_DEPOSITS",
-            resource="deposits",
-            request=request,
-            extra_data={"date": date, "plant": "jumillano"}
-        )
+        # Datos de la consulta para el registro de la acción
+        annotate_audit(date=date, plant="jumillano")
         
         # Obtener datos de miniBank
         data = get_jumillano_deposits(date)
         
-        # Auto-sincronizar valores esperados desde API externa
+        # Auto-sincronizar valores esperados desde API externa (según la política de frescura)
+        policy = None
         try:
-            print(f"🔄 Auto-sincronizando valores esperados para Jumillano {date}...")
-            resultado_sync = actualizar_depositos_esperados(date)
-            print(f"💰 Sincronización: {resultado_sync.get('actualizados', 0)} depósitos actualizados")
+            policy, resultado_sync = _auto_sync_expected(date, "Jumillano", refresh, max_staleness)
             
-            # Log de sincronización exitosa
-            log_user_action(
-                action="AUTO_SYNC_EXPECTED_AMOUNTS",
-                resource="deposits",
-                request=request,
-                extra_data={
-                    "date": date,
-                    "plant": "jumillano", 
-                    "updated_deposits": resultado_sync.get('actualizados', 0)
-                }
-            )
+            # Resultado de la sincronización en el mismo registro
+            if resultado_sync is not None:
+                annotate_audit(auto_sync_expected=True, updated_deposits=resultado_sync.get('actualizados', 0))
             
         except Exception as sync_error:
             print(f"⚠️ Error en auto-sincronización de valores esperados: {sync_error}")
@@ -138,7 +155,7 @@ def deposits_jumillano(request: Request, date: str = Query(...)):
                 extra_data={"date": date, "plant": "jumillano"}
             )
         
-        return JSONResponse(content=data)
+        return _with_freshness(FastJSONResponse(content=data), policy)
     except Exception as e:
         # Log del error técnico
         log_technical_error(
@@ -147,65 +164,76 @@ def deposits_jumillano(request: Request, date: str = Query(...)):
             request=request,
             extra_data={"date": date, "plant": "jumillano"}
         )
+        # La excepción no se propaga: la acción se registra como fallida igual
+        fail_audit(e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/nafa")
-def deposits_nafa(date: str = Query(...)):
+def deposits_nafa(
+    date: str = Query(...),
+    refresh: bool = Query(False, description="Sincronizar valores esperados aunque estén frescos"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada (segundos) de los valores esperados")
+):
     try:
         # Obtener datos de miniBank
         data = get_nafa_deposits(date)
         
-        # Auto-sincronizar valores esperados desde API externa
+        # Auto-sincronizar valores esperados desde API externa (según la política de frescura)
+        policy = None
         try:
-            print(f"🔄 Auto-sincronizando valores esperados para Nafa {date}...")
-            resultado_sync = actualizar_depositos_esperados(date)
-            print(f"💰 Sincronización: {resultado_sync.get('actualizados', 0)} depósitos actualizados")
+            policy, _ = _auto_sync_expected(date, "Nafa", refresh, max_staleness)
         except Exception as sync_error:
             print(f"⚠️ Error en auto-sincronización de valores esperados: {sync_error}")
             # Continuar aunque falle la sincronización
         
-        return JSONResponse(content=data)
+        return _with_freshness(FastJSONResponse(content=data), policy)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/plata")
-def deposits_plata(date: str = Query(...)):
+def deposits_plata(
+    date: str = Query(...),
+    refresh: bool = Query(False, description="Sincronizar valores esperados aunque estén frescos"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada (segundos) de los valores esperados")
+):
     try:
         # Obtener datos de miniBank
         data = get_plata_deposits(date)
         
-        # Auto-sincronizar valores esperados desde API externa
+        # Auto-sincronizar valores esperados desde API externa (según la política de frescura)
+        policy = None
         try:
-            print(f"🔄 Auto-sincronizando valores esperados para La Plata {date}...")
-            resultado_sync = actualizar_depositos_esperados(date)
-            print(f"💰 Sincronización: {resultado_sync.get('actualizados', 0)} depósitos actualizados")
+            policy, _ = _auto_sync_expected(date, "La Plata", refresh, max_staleness)
         except Exception as sync_error:
             print(f"⚠️ Error en auto-sincronización de valores esperados: {sync_error}")
             # Continuar aunque falle la sincronización
         
-        return JSONResponse(content=data)
+        return _with_freshness(FastJSONResponse(content=data), policy)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/all")
-def deposits_all(date: str = Query(...)):
+def deposits_all(
+    date: str = Query(...),
+    refresh: bool = Query(False, description="Sincronizar valores esperados aunque estén frescos"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Antigüedad máxima aceptada (segundos) de los valores esperados")
+):
     try:
         # Obtener datos de miniBank
         data = get_all_deposits(date)
         
-        # Auto-sincronizar valores esperados desde API externa
+        # Auto-sincronizar valores esperados desde API externa (según la política de frescura)
+        policy = None
         try:
-            print(f"🔄 Auto-sincronizando valores esperados para {date}...")
-            resultado_sync = actualizar_depositos_esperados(date)
-            print(f"💰 Sincronización: {resultado_sync.get('actualizados', 0)} depósitos actualizados")
+            policy, _ = _auto_sync_expected(date, "todas las plantas", refresh, max_staleness)
         except Exception as sync_error:
             print(f"⚠️ Error en auto-sincronización de valores esperados: {sync_error}")
             # Continuar aunque falle la sincronización
         
-        return JSONResponse(content=data)
+        return _with_freshness(FastJSONResponse(content=data), policy)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -233,12 +261,12 @@ def get_all_deposits_with_sync(date: str = Query(None)):
             save_deposits_to_db(data)
             print("📊 Datos de hoy sincronizados automáticamente en BD")
         
-        return {
+        return FastJSONResponse(content={
             "status": "ok",
             "date": date,
             "auto_synced": date == today,
             "data": data
-        }
+        })
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         from fastapi import HTTPException
@@ -249,21 +277,26 @@ def get_all_deposits_with_sync(date: str = Query(None)):
 # Para mantener URLs que el frontend espera
 
 @router.get("/db/by-plant")
-def get_deposits_from_db_by_plant_compat(date: str = Query(...)):
+def get_deposits_from_db_by_plant_compat(
+    request: Request,
+    date: str = Query(...),
+    refresh: bool = Query(False),
+    max_staleness: Optional[int] = Query(None, ge=0)
+):
     """
     COMPATIBILIDAD: Redirige a la nueva ubicación en /api/db/deposits/by-plant
     """
     from routers.database import get_deposits_from_db_by_plant
-    return get_deposits_from_db_by_plant(date)
+    return get_deposits_from_db_by_plant(request, date, refresh=refresh, max_staleness=max_staleness)
 
 
 @router.get("/db/by-machine") 
-def get_deposits_from_db_by_machine_compat(date: str = Query(...)):
+def get_deposits_from_db_by_machine_compat(request: Request, date: str = Query(...)):
     """
     COMPATIBILIDAD: Redirige a la nueva ubicación en /api/db/deposits/by-machine
     """
     from routers.database import get_deposits_from_db_by_machine
-    return get_deposits_from_db_by_machine(date)
+    return get_deposits_from_db_by_machine(request, date)
 
 
 @router.get("/db/dates")
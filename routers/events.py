@@ -0,0 +1,70 @@
+"""
+Router del feed de cambios en tiempo real (server-sent events)
+"""
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from services.event_broker import event_broker, EVENTS_HEARTBEAT_SECONDS
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"]
+)
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    date: Optional[List[str]] = Query(None, description="Fechas YYYY-MM-DD a seguir (todas si se omite)"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Stream SSE con los cambios de depósitos confirmados (estado, semáforo, valores
+    esperados, depósitos nuevos) de las fechas pedidas.
+
+    Eventos:
+    - `deposits`: {"date", "deposits": [...], "eliminados": [...]} con los depósitos
+      modificados, con la misma forma que los de /db/deposits/by-plant (sin el
+      detalle de cheques y retenciones).
+    - `resync`: el cliente debe volver a pedir el día (cambio masivo o eventos perdidos).
+    """
+    for fecha in date or []:
+        try:
+            datetime.strptime(fecha, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    subscription = event_broker.subscribe(date, last_event_id)
+
+    async def event_stream():
+        try:
+            # Indica al navegador cada cuánto reintentar si se corta la conexión
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscription.get(EVENTS_HEARTBEAT_SECONDS)
+                if event is not None:
+                    yield event.to_sse()
+                    continue
+                if event_broker.closed or await request.is_disconnected():
+                    break
+                # Comentario SSE para mantener viva la conexión a través de proxies
+                yield ": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.get("/stats")
+def get_events_stats():
+    """Suscriptores conectados y eventos publicados por este proceso"""
+    return {"status": "ok", **event_broker.stats()}
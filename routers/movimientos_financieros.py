@@ -3,9 +3,14 @@ from pydantic import BaseModel
 from typing import List, Optional
 import logging
 from database import SessionLocal
-from models.deposit import Deposit
+from models.deposit import Deposit, EstadoDeposito
 from models.cheque_retencion import Cheque, Retencion, TipoConcepto
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from services.deposit_change_tracker import mark_deposits_changed
+
+# Máximo de cheques + retenciones aceptados en un mismo lote
+MAX_MOVIMIENTOS_POR_LOTE = 500
 
 # Modelos Pydantic para validación
 class ChequeModel(BaseModel):
@@ -33,6 +38,11 @@ class MovimientoFinancieroRequest(BaseModel):
     cheques: Optional[List[ChequeModel]] = []
     retenciones: Optional[List[RetencionModel]] = []
 
+class MovimientoBatchRequest(BaseModel):
+    deposit_id: str  # ID del depósito al que se asocian los cheques/retenciones
+    cheques: List[ChequeModel] = []
+    retenciones: List[RetencionModel] = []
+
 # Dependency para obtener la sesión de la base de datos
 def get_db():
     db = SessionLocal()
@@ -44,7 +54,7 @@ def get_db():
 router = APIRouter()
 
 @router.post("/movimientos-financieros")
-async def crear_movimiento_financiero(data: MovimientoFinancieroRequest, db: Session = Depends(get_db)):
+def crear_movimiento_financiero(data: MovimientoFinancieroRequest, db: Session = Depends(get_db)):
     try:
         logging.info(f"📥 Recibiendo movimiento para depósito: {data.deposit_id}")
         
@@ -60,8 +70,10 @@ async def crear_movimiento_financiero(data: MovimientoFinancieroRequest, db: Ses
         resultado = {}
         
         if data.tipo_concepto == "CHE" and data.cheques:
+            validar_lote(data.cheques, [])
             resultado = procesar_cheques(db, deposit, data.cheques)
         elif data.tipo_concepto == "RIB" and data.retenciones:
+            validar_lote([], data.retenciones)
             resultado = procesar_retenciones(db, deposit, data.retenciones)
         else:
             raise HTTPException(
@@ -69,6 +81,10 @@ async def crear_movimiento_financiero(data: MovimientoFinancieroRequest, db: Ses
                 detail="Tipo de movimiento inválido o sin datos"
             )
         
+        # 3. Un único commit para todo el movimiento
+        actualizar_estado_con_movimientos(db, deposit)
+        db.commit()
+        
         logging.info(f"✅ Movimiento creado exitosamente para {data.deposit_id}")
         return {
             "success": True, 
@@ -80,10 +96,95 @@ async def crear_movimiento_financiero(data: MovimientoFinancieroRequest, db: Ses
             "movimiento": resultado
         }
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
+        db.rollback()
         logging.error(f"❌ Error procesando movimiento: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/movimientos-financieros/batch")
+def crear_movimientos_batch(data: MovimientoBatchRequest, db: Session = Depends(get_db)):
+    """
+    Crea en una sola transacción todos los cheques y retenciones de un depósito.
+    Se valida el lote completo antes de escribir: si algún ítem es inválido no se guarda ninguno.
+    """
+    try:
+        logging.info(
+            f"📥 Recibiendo lote para depósito {data.deposit_id}: "
+            f"{len(data.cheques)} cheques, {len(data.retenciones)} retenciones"
+        )
+        
+        validar_lote(data.cheques, data.retenciones)
+        
+        deposit = encontrar_deposit(db, data.deposit_id)
+        if not deposit:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Depósito no encontrado: {data.deposit_id}"
+            )
+        
+        resultado_cheques = procesar_cheques(db, deposit, data.cheques) if data.cheques else None
+        resultado_retenciones = procesar_retenciones(db, deposit, data.retenciones) if data.retenciones else None
+        
+        actualizar_estado_con_movimientos(db, deposit)
+        db.commit()
+        
+        logging.info(f"✅ Lote guardado para {data.deposit_id}")
+        return {
+            "success": True,
+            "deposit": {
+                "id": deposit.id,
+                "deposit_id": deposit.deposit_id,
+                "user_name": deposit.user_name,
+                "estado": deposit.estado.value if deposit.estado else None
+            },
+            "cheques": resultado_cheques,
+            "retenciones": resultado_retenciones
+        }
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logging.error(f"❌ Error procesando lote de movimientos: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def validar_lote(cheques: List[ChequeModel], retenciones: List[RetencionModel]):
+    """
+    Valida el lote completo y lanza HTTPException 422 con todos los errores encontrados
+    """
+    errores = []
+    
+    if not cheques and not retenciones:
+        errores.append("El lote no contiene cheques ni retenciones")
+    if len(cheques) + len(retenciones) > MAX_MOVIMIENTOS_POR_LOTE:
+        errores.append(f"El lote supera el máximo de {MAX_MOVIMIENTOS_POR_LOTE} movimientos")
+    
+    cheques_vistos = set()
+    for i, cheque in enumerate(cheques):
+        if cheque.importe <= 0:
+            errores.append(f"cheques[{i}]: el importe debe ser mayor a 0")
+        if not cheque.nro_cheque or not cheque.nro_cheque.strip():
+            errores.append(f"cheques[{i}]: falta el número de cheque")
+        clave = (cheque.banco, cheque.nro_cheque)
+        if clave in cheques_vistos:
+            errores.append(f"cheques[{i}]: el cheque {cheque.nro_cheque} del banco {cheque.banco} está repetido en el lote")
+        cheques_vistos.add(clave)
+    
+    retenciones_vistas = set()
+    for i, retencion in enumerate(retenciones):
+        if retencion.importe <= 0:
+            errores.append(f"retenciones[{i}]: el importe debe ser mayor a 0")
+        if retencion.nro_retencion in retenciones_vistas:
+            errores.append(f"retenciones[{i}]: la retención {retencion.nro_retencion} está repetida en el lote")
+        retenciones_vistas.add(retencion.nro_retencion)
+    
+    if errores:
+        raise HTTPException(status_code=422, detail={"message": "Lote inválido", "errores": errores})
+
 def encontrar_deposit(db: Session, deposit_id: str) -> Deposit:
     """
     Buscar el depósito por deposit_id
@@ -94,38 +195,68 @@ def encontrar_deposit(db: Session, deposit_id: str) -> Deposit:
     
     return deposit
 
+def insertar_con_ids(db: Session, model, rows: List[dict]) -> List[int]:
+    """
+    Inserta todas las filas en un solo INSERT (executemany con RETURNING) y devuelve
+    los ids en el mismo orden de `rows`. No hace commit.
+    """
+    if not rows:
+        return []
+    
+    dialect = db.get_bind().dialect
+    if getattr(dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+        return list(db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows
+        ))
+    
+    # Motores sin RETURNING en executemany: alta por ORM con un único flush
+    objetos = [model(**row) for row in rows]
+    db.add_all(objetos)
+    db.flush()
+    return [objeto.id for objeto in objetos]
+
+def actualizar_estado_con_movimientos(db: Session, deposit: Deposit):
+    """
+    Un depósito con cheques o retenciones queda PENDIENTE (salvo que ya se haya enviado)
+    y se marca como modificado para mantener los datos derivados del día
+    """
+    if deposit.estado != EstadoDeposito.ENVIADO:
+        deposit.estado = EstadoDeposito.PENDIENTE
+    mark_deposits_changed(db, deposit_ids=[deposit.deposit_id], fechas=[deposit.date_time] if deposit.date_time else [])
+
 def procesar_cheques(db: Session, deposit: Deposit, cheques_data: List[ChequeModel]) -> dict:
     """
-    Crear cheques en la base de datos asociados al depósito
+    Crear cheques en la base de datos asociados al depósito (sin commit)
     """
-    cheques_creados = []
+    rows = [
+        {
+            "deposit_id": deposit.deposit_id,
+            "nrocta": cheque_data.nrocta,
+            "concepto": cheque_data.concepto,
+            "banco": cheque_data.banco,
+            "sucursal": cheque_data.sucursal,
+            "localidad": cheque_data.localidad,
+            "nro_cheque": cheque_data.nro_cheque,
+            "nro_cuenta": cheque_data.nro_cuenta,
+            "titular": cheque_data.titular,
+            "fecha": cheque_data.fecha,
+            "importe": cheque_data.importe
+        }
+        for cheque_data in cheques_data
+    ]
+    ids = insertar_con_ids(db, Cheque, rows)
     
-    for cheque_data in cheques_data:
-        cheque = Cheque(
-            deposit_id=deposit.deposit_id,
-            nrocta=cheque_data.nrocta,
-            concepto=cheque_data.concepto,
-            banco=cheque_data.banco,
-            sucursal=cheque_data.sucursal,
-            localidad=cheque_data.localidad,
-            nro_cheque=cheque_data.nro_cheque,
-            nro_cuenta=cheque_data.nro_cuenta,
-            titular=cheque_data.titular,
-            fecha=cheque_data.fecha,
-            importe=cheque_data.importe
-        )
-        
-        db.add(cheque)
-        db.commit()
-        db.refresh(cheque)
-        
-        cheques_creados.append({
-            "id": cheque.id,
-            "nro_cheque": cheque.nro_cheque,
-            "titular": cheque.titular,
-            "importe": cheque.importe,
-            "fecha": cheque.fecha
-        })
+    cheques_creados = [
+        {
+            "id": cheque_id,
+            "nro_cheque": row["nro_cheque"],
+            "titular": row["titular"],
+            "importe": row["importe"],
+            "fecha": row["fecha"]
+        }
+        for cheque_id, row in zip(ids, rows)
+    ]
     
     logging.info(f"💰 {len(cheques_creados)} cheques creados para depósito {deposit.deposit_id}")
     
@@ -138,31 +269,31 @@ def procesar_cheques(db: Session, deposit: Deposit, cheques_data: List[ChequeMod
 
 def procesar_retenciones(db: Session, deposit: Deposit, retenciones_data: List[RetencionModel]) -> dict:
     """
-    Crear retenciones en la base de datos asociadas al depósito
+    Crear retenciones en la base de datos asociadas al depósito (sin commit)
     """
-    retenciones_creadas = []
+    rows = [
+        {
+            "deposit_id": deposit.deposit_id,
+            "nrocta": retencion_data.nrocta,
+            "concepto": retencion_data.concepto,
+            "nro_retencion": str(retencion_data.nro_retencion),
+            "fecha": retencion_data.fecha,
+            "importe": retencion_data.importe
+        }
+        for retencion_data in retenciones_data
+    ]
+    ids = insertar_con_ids(db, Retencion, rows)
     
-    for retencion_data in retenciones_data:
-        retencion = Retencion(
-            deposit_id=deposit.deposit_id,
-            nrocta=retencion_data.nrocta,
-            concepto=retencion_data.concepto,
-            nro_retencion=retencion_data.nro_retencion,
-            fecha=retencion_data.fecha,
-            importe=retencion_data.importe
-        )
-        
-        db.add(retencion)
-        db.commit()
-        db.refresh(retencion)
-        
-        retenciones_creadas.append({
-            "id": retencion.id,
-            "nro_retencion": retencion.nro_retencion,
-            "concepto": retencion.concepto,
-            "importe": retencion.importe,
-            "fecha": retencion.fecha
-        })
+    retenciones_creadas = [
+        {
+            "id": retencion_id,
+            "nro_retencion": row["nro_retencion"],
+            "concepto": row["concepto"],
+            "importe": row["importe"],
+            "fecha": row["fecha"]
+        }
+        for retencion_id, row in zip(ids, rows)
+    ]
     
     logging.info(f"🏦 {len(retenciones_creadas)} retenciones creadas para depósito {deposit.deposit_id}")
     
@@ -174,7 +305,7 @@ def procesar_retenciones(db: Session, deposit: Deposit, retenciones_data: List[R
     }
 
 @router.get("/deposits/{deposit_id}/movimientos")
-async def obtener_movimientos_deposit(deposit_id: str, db: Session = Depends(get_db)):
+def obtener_movimientos_deposit(deposit_id: str, db: Session = Depends(get_db)):
     """
     Obtener todos los cheques y retenciones de un depósito
     """
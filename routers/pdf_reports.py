@@ -1,10 +1,20 @@
 """
 Router para generación de PDFs
 """
-from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse, Response
-from services.deposits_service import get_all_totals, get_all_deposits, get_jumillano_deposits, get_plata_deposits, get_nafa_deposits
-from services.pdf_service import generate_daily_closure_pdf, generate_detailed_repartos_pdf
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from services.report_data_provider import (
+    load_daily_closure_data,
+    load_repartos_data,
+    load_cheques_retenciones,
+    report_fingerprint
+)
+from services.pdf_service import generate_daily_closure_pdf, generate_detailed_repartos_pdf, generate_range_pdf_from_db
+from services.pdf_renderer import get_or_render_pdf, render_pdf, iter_pdf_chunks
+from services.deposits_service import PLANTAS_MAQUINAS
 
 router = APIRouter(
     prefix="/pdf",
@@ -12,183 +22,227 @@ router = APIRouter(
 )
 
 
+def _prepare_report(report_type: str, date: str, plant, deposits_data, totals):
+    """Resuelve cheques/retenciones y la huella del reporte (consulta a la base y hash)"""
+    cheques_retenciones = load_cheques_retenciones(deposits_data)
+    fingerprint = report_fingerprint(report_type, date, plant, deposits_data, totals, cheques_retenciones)
+    return cheques_retenciones, fingerprint
+
+
+async def _pdf_response(request: Request, report_type: str, date: str, plant, deposits_data, totals=None, filename: str = None):
+    """
+    Responde el PDF desde la caché o renderizándolo en el pool de procesos, en bloques y con ETag;
+    304 si el cliente ya tiene esa versión
+    """
+    cheques_retenciones, fingerprint = await run_in_threadpool(
+        _prepare_report, report_type, date, plant, deposits_data, totals
+    )
+    etag = f'"{fingerprint}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename={filename}" if filename else "inline"
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": headers["Cache-Control"]})
+
+    if report_type == "daily-closure":
+        pdf_content, from_cache = await get_or_render_pdf(
+            report_type, date, plant, fingerprint, generate_daily_closure_pdf,
+            totals, date, deposits_data=deposits_data, cheques_retenciones=cheques_retenciones
+        )
+    else:
+        pdf_content, from_cache = await get_or_render_pdf(
+            report_type, date, plant, fingerprint, generate_detailed_repartos_pdf,
+            deposits_data, date, cheques_retenciones=cheques_retenciones
+        )
+
+    headers["X-PDF-Cache"] = "HIT" if from_cache else "MISS"
+    headers["Content-Length"] = str(len(pdf_content))
+    return StreamingResponse(iter_pdf_chunks(pdf_content), media_type="application/pdf", headers=headers)
+
+
 @router.get("/daily-closure")
-def generate_daily_closure_pdf_endpoint(date: str = Query(...)):
+async def generate_daily_closure_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera un PDF con el cierre de caja diario para todas las ubicaciones
     """
     try:
-        # Obtener los totales para el día especificado
-        totals = get_all_totals(date)
-        
-        # Generar el PDF
-        pdf_content = generate_daily_closure_pdf(totals, date)
+        # Totales y detalle desde la base (opcionalmente sincronizando antes con miniBank)
+        totals, deposits_data = await run_in_threadpool(load_daily_closure_data, date, sync=sync)
         
         # Crear el nombre del archivo
         filename = f"cierre_caja_{date.replace('-', '_')}.pdf"
         
-        # Retornar el PDF como respuesta
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        # Retornar el PDF como respuesta (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "daily-closure", date, None, deposits_data, totals, filename=filename)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/daily-closure/preview")
-def preview_daily_closure_pdf_endpoint(date: str = Query(...)):
+async def preview_daily_closure_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera y muestra un PDF con el cierre de caja diario para previsualización en el navegador
     """
     try:
-        # Obtener los totales para el día especificado
-        totals = get_all_totals(date)
+        # Totales y detalle desde la base (opcionalmente sincronizando antes con miniBank)
+        totals, deposits_data = await run_in_threadpool(load_daily_closure_data, date, sync=sync)
         
-        # Generar el PDF
-        pdf_content = generate_daily_closure_pdf(totals, date)
-        
-        # Retornar el PDF para visualización en el navegador
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "inline"
-            }
-        )
+        # Retornar el PDF para visualización en el navegador (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "daily-closure", date, None, deposits_data, totals)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/repartos")
-def generate_repartos_pdf_endpoint(date: str = Query(...)):
+async def generate_repartos_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera un PDF con todos los repartos detallados por planta
     """
     try:
-        # Obtener los datos de depósitos de todas las máquinas
-        repartos_data = get_all_deposits(date)
-        
-        # Generar el PDF
-        pdf_content = generate_detailed_repartos_pdf(repartos_data, date)
+        # Obtener los depósitos de todas las máquinas desde la base
+        repartos_data = await run_in_threadpool(load_repartos_data, date, sync=sync)
         
         # Crear el nombre del archivo
         filename = f"repartos_detallados_{date.replace('-', '_')}.pdf"
         
-        # Retornar el PDF como respuesta
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        # Retornar el PDF como respuesta (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "repartos", date, None, repartos_data, filename=filename)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/repartos/preview")
-def preview_repartos_pdf_endpoint(date: str = Query(...)):
+async def preview_repartos_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera y muestra un PDF con todos los repartos detallados para previsualización en el navegador
     """
     try:
-        # Obtener los datos de depósitos de todas las máquinas
-        repartos_data = get_all_deposits(date)
-        
-        # Generar el PDF
-        pdf_content = generate_detailed_repartos_pdf(repartos_data, date)
+        # Obtener los depósitos de todas las máquinas desde la base
+        repartos_data = await run_in_threadpool(load_repartos_data, date, sync=sync)
         
-        # Retornar el PDF para visualización en el navegador
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "inline"
-            }
-        )
+        # Retornar el PDF para visualización en el navegador (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "repartos", date, None, repartos_data)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/repartos/jumillano")
-def generate_repartos_jumillano_pdf_endpoint(date: str = Query(...)):
+async def generate_repartos_jumillano_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera un PDF con los repartos detallados solo de Jumillano
     """
     try:
-        # Obtener los datos de depósitos solo de Jumillano
-        jumillano_data = get_jumillano_deposits(date)
-        
-        # Generar el PDF
-        pdf_content = generate_detailed_repartos_pdf(jumillano_data, date)
+        # Obtener los depósitos solo de Jumillano desde la base
+        jumillano_data = await run_in_threadpool(load_repartos_data, date, "jumillano", sync=sync)
         
         # Crear el nombre del archivo
         filename = f"repartos_jumillano_{date.replace('-', '_')}.pdf"
         
-        # Retornar el PDF como respuesta
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        # Retornar el PDF como respuesta (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "repartos", date, "jumillano", jumillano_data, filename=filename)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/repartos/plata")
-def generate_repartos_plata_pdf_endpoint(date: str = Query(...)):
+async def generate_repartos_plata_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera un PDF con los repartos detallados solo de La Plata
     """
     try:
-        # Obtener los datos de depósitos solo de La Plata
-        plata_data = get_plata_deposits(date)
-        
-        # Generar el PDF
-        pdf_content = generate_detailed_repartos_pdf(plata_data, date)
+        # Obtener los depósitos solo de La Plata desde la base
+        plata_data = await run_in_threadpool(load_repartos_data, date, "plata", sync=sync)
         
         # Crear el nombre del archivo
         filename = f"repartos_plata_{date.replace('-', '_')}.pdf"
         
-        # Retornar el PDF como respuesta
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        # Retornar el PDF como respuesta (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "repartos", date, "plata", plata_data, filename=filename)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
 @router.get("/repartos/nafa")
-def generate_repartos_nafa_pdf_endpoint(date: str = Query(...)):
+async def generate_repartos_nafa_pdf_endpoint(
+    request: Request,
+    date: str = Query(...),
+    sync: bool = Query(False, description="Sincronizar con miniBank antes de generar el PDF")
+):
     """
     Genera un PDF con los repartos detallados solo de Nafa
     """
     try:
-        # Obtener los datos de depósitos solo de Nafa
-        nafa_data = get_nafa_deposits(date)
-        
-        # Generar el PDF
-        pdf_content = generate_detailed_repartos_pdf(nafa_data, date)
+        # Obtener los depósitos solo de Nafa desde la base
+        nafa_data = await run_in_threadpool(load_repartos_data, date, "nafa", sync=sync)
         
         # Crear el nombre del archivo
         filename = f"repartos_nafa_{date.replace('-', '_')}.pdf"
         
-        # Retornar el PDF como respuesta
-        return Response(
-            content=pdf_content,
+        # Retornar el PDF como respuesta (desde la caché si los datos no cambiaron, en bloques)
+        return await _pdf_response(request, "repartos", date, "nafa", nafa_data, filename=filename)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/range")
+async def generate_range_pdf_endpoint(
+    from_date: str = Query(..., alias="from", description="Fecha inicial YYYY-MM-DD"),
+    to_date: str = Query(..., alias="to", description="Fecha final YYYY-MM-DD (inclusive)"),
+    plant: Optional[str] = Query(None, description="jumillano, plata o nafa (por defecto todas)")
+):
+    """
+    Genera un PDF con los repartos de un rango de fechas (por ejemplo, un mes completo)
+    """
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d")
+        end = datetime.strptime(to_date, "%Y-%m-%d")
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Las fechas deben tener formato YYYY-MM-DD"})
+    if start > end:
+        return JSONResponse(status_code=400, content={"error": "'from' no puede ser posterior a 'to'"})
+    if plant is not None and plant not in PLANTAS_MAQUINAS:
+        return JSONResponse(status_code=400, content={"error": f"Planta desconocida: {plant}"})
+
+    try:
+        # Los depósitos se leen de la base en lotes dentro del proceso que arma el PDF
+        pdf_content = await render_pdf(generate_range_pdf_from_db, from_date, to_date, plant)
+        
+        # Crear el nombre del archivo
+        filename = f"repartos_{plant or 'todas'}_{from_date.replace('-', '_')}_a_{to_date.replace('-', '_')}.pdf"
+        
+        return StreamingResponse(
+            iter_pdf_chunks(pdf_content),
             media_type="application/pdf",
             headers={
-                "Content-Disposition": f"attachment; filename={filename}"
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Length": str(len(pdf_content))
             }
         )
     except Exception as e:
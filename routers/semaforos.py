@@ -0,0 +1,44 @@
+"""
+Router del semáforo de documentos (cheques/retenciones) por planta
+"""
+import traceback
+from datetime import datetime
+from fastapi import APIRouter, Query, HTTPException
+
+router = APIRouter(
+    prefix="/semaforos",
+    tags=["semaforos"]
+)
+
+
+@router.get("/summary")
+def get_semaforos_summary_by_plant(date: str = Query(..., description="Fecha YYYY-MM-DD")):
+    """
+    Cantidad de depósitos en verde (documentos completos), amarillo (documentos
+    pendientes) y gris (sin documentos esperados) por planta para una fecha
+    """
+    try:
+        query_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+    try:
+        from database import SessionLocal
+        from services.semaforo_service import get_semaforos_summary
+
+        db = SessionLocal()
+        try:
+            summary = get_semaforos_summary(db, query_date)
+        finally:
+            db.close()
+
+        return {
+            "status": "ok",
+            "date": date,
+            **summary
+        }
+
+    except Exception as e:
+        print(f"❌ Error al obtener resumen de semáforos: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
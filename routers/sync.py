@@ -15,7 +15,7 @@ from services.deposits_service import (
 from services.repartos_api_service import actualizar_depositos_esperados
 
 # Importar utilidades de logging
-from utils.logging_utils import log_user_action, log_technical_error, log_technical_warning
+from utils.logging_utils import log_technical_error, log_technical_warning, annotate_audit
 from middleware.logging_middleware import log_endpoint_access
 
 router = APIRouter(
@@ -28,17 +28,8 @@ router = APIRouter(
 @log_endpoint_access("SYNC_JUMILLANO_DEPOSITS", "synchronization")
 def save_jumillano_deposits(request: Request, date: str = Query(...)):
     try:
-        # Log inicio de sincronización
-        log_user_action(
-            action="START_SYNC_JUMILLANO",
-            resource="synchronization",
-            request=request,
-            extra_data={
-                "date": date,
-                "plant": "jumillano",
-                "sync_type": "deposits"
-            }
-        )
+        # Datos de la acción (se registra una sola vez al terminar, con resultado y duración)
+        annotate_audit(date=date, plant="jumillano", sync_type="deposits")
         
         print(f"🔄 Iniciando guardado de depósitos para fecha: {date}")
         data = get_jumillano_deposits(date)
@@ -48,19 +39,7 @@ def save_jumillano_deposits(request: Request, date: str = Query(...)):
         
         print("✅ Proceso completado exitosamente")
         
-        # Log de sincronización exitosa
-        log_user_action(
-            action="SYNC_JUMILLANO_SUCCESS",
-            resource="synchronization",
-            request=request,
-            success=True,
-            extra_data={
-                "date": date,
-                "plant": "jumillano",
-                "records_processed": len(data) if isinstance(data, list) else 1,
-                "sync_duration": "completed"
-            }
-        )
+        annotate_audit(records_processed=len(data) if isinstance(data, list) else 1)
         
         return {"status": "ok", "message": "Depósitos guardados correctamente"}
         
@@ -80,19 +59,8 @@ def save_jumillano_deposits(request: Request, date: str = Query(...)):
             }
         )
         
-        # Log de sincronización fallida
-        log_user_action(
-            action="SYNC_JUMILLANO_FAILED",
-            resource="synchronization",
-            request=request,
-            success=False,
-            extra_data={
-                "date": date,
-                "plant": "jumillano", 
-                "error_type": type(e).__name__,
-                "error_message": str(e)
-            }
-        )
+        # Causa original de la falla para el registro de la acción
+        annotate_audit(error_type=type(e).__name__, error_message=str(e))
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -101,17 +69,8 @@ def save_jumillano_deposits(request: Request, date: str = Query(...)):
 @log_endpoint_access("SYNC_ALL_DEPOSITS", "synchronization")
 def save_all_deposits(request: Request, date: str = Query(...)):
     try:
-        # Log inicio de sincronización completa
-        log_user_action(
-            action="START_SYNC_ALL_PLANTS",
-            resource="synchronization",
-            request=request,
-            extra_data={
-                "date": date,
-                "plants": "all",
-                "sync_type": "full_deposits"
-            }
-        )
+        # Datos de la acción (se registra una sola vez al terminar, con resultado y duración)
+        annotate_audit(date=date, plants="all", sync_type="full_deposits")
         
         print(f"🔄 Iniciando guardado de TODOS los depósitos para fecha: {date}")
         data = get_all_deposits(date)
@@ -121,19 +80,7 @@ def save_all_deposits(request: Request, date: str = Query(...)):
         
         print("✅ Proceso completado exitosamente para todas las máquinas")
         
-        # Log de sincronización exitosa
-        log_user_action(
-            action="SYNC_ALL_PLANTS_SUCCESS",
-            resource="synchronization",
-            request=request,
-            success=True,
-            extra_data={
-                "date": date,
-                "plants": "all",
-                "records_processed": len(data) if isinstance(data, list) else 1,
-                "sync_duration": "completed"
-            }
-        )
+        annotate_audit(records_processed=len(data) if isinstance(data, list) else 1)
         
         return {"status": "ok", "message": "Todos los depósitos guardados correctamente"}
         
@@ -153,19 +100,8 @@ def save_all_deposits(request: Request, date: str = Query(...)):
             }
         )
         
-        # Log de sincronización fallida
-        log_user_action(
-            action="SYNC_ALL_PLANTS_FAILED",
-            resource="synchronization",
-            request=request,
-            success=False,
-            extra_data={
-                "date": date,
-                "plants": "all",
-                "error_type": type(e).__name__,
-                "error_message": str(e)
-            }
-        )
+        # Causa original de la falla para el registro de la acción
+        annotate_audit(error_type=type(e).__name__, error_message=str(e))
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -218,8 +154,8 @@ def sync_deposits_today():
         save_deposits_to_db(data)
         print("📊 Datos sincronizados automáticamente")
         
-        # Retornar los totales también
-        totals = get_all_totals(today)
+        # Retornar los totales también (reutilizando los datos ya obtenidos)
+        totals = get_all_totals(today, deposits_data=data)
         
         return {
             "status": "ok", 
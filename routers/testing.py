@@ -45,7 +45,7 @@ def test_idreparto_extraction():
     """
     Endpoint para probar la extracción de idreparto de diferentes formatos de user_name
     """
-    from services.repartos_api_service import extraer_idreparto_de_user_name
+    from utils.idreparto import extraer_idreparto_de_user_name
     
     # Casos de prueba
     test_cases = [
@@ -104,7 +104,7 @@ def test_external_api(date: str = Query(...)):
         
         print(f"🧪 Probando API externa para fecha: {fecha_api}")
         
-        repartos = get_repartos_valores(fecha_api)
+        repartos = get_repartos_valores(fecha_api, force_refresh=True)
         
         return {
             "status": "ok",
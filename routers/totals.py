@@ -71,14 +71,15 @@ def get_totals_with_sync(date: str = Query(None)):
         
         # Verificar si es hoy y sincronizar automáticamente
         today = datetime.now().strftime("%Y-%m-%d")
+        data = None
         if date == today:
             # Auto-sincronizar datos de hoy
             data = get_all_deposits(date)
             save_deposits_to_db(data)
             print("📊 Datos de hoy sincronizados automáticamente")
         
-        # Obtener totales
-        totals = get_all_totals(date)
+        # Obtener totales (reutilizando los datos ya obtenidos si se sincronizó)
+        totals = get_all_totals(date, deposits_data=data)
         
         return {
             "status": "ok",
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Script para completar los totales diarios (daily_totals) faltantes de un rango de fechas
+"""
+import sys
+import os
+import argparse
+from datetime import datetime, timedelta
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.daily_totals_backfill import (
+    DailyTotalsBackfill,
+    find_missing_dates,
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_REQUESTS_PER_SECOND,
+    DEFAULT_MAX_RETRIES
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de totales diarios desde miniBank")
+    parser.add_argument("--start", help="Fecha inicial YYYY-MM-DD (por defecto: hace 30 días)")
+    parser.add_argument("--end", help="Fecha final YYYY-MM-DD (por defecto: hoy)")
+    parser.add_argument("--days", type=int, default=30, help="Días hacia atrás si no se indica --start")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Consultas simultáneas")
+    parser.add_argument("--rate", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="Días iniciados por segundo")
+    parser.add_argument("--retries", type=int, default=DEFAULT_MAX_RETRIES, help="Intentos por día")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el checkpoint existente")
+    parser.add_argument("--dry-run", action="store_true", help="Solo listar los días faltantes")
+
+    args = parser.parse_args()
+
+    end_date = args.end or datetime.now().strftime("%Y-%m-%d")
+    start_date = args.start or (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=args.days)).strftime("%Y-%m-%d")
+
+    print(f"🚀 Backfill de totales diarios: {start_date} → {end_date}")
+
+    if args.dry_run:
+        missing = find_missing_dates(start_date, end_date)
+        print(f"📋 Días faltantes: {len(missing)}")
+        for date in missing:
+            print(f"   📅 {date}")
+        return
+
+    job = DailyTotalsBackfill(
+        start_date,
+        end_date,
+        max_workers=args.workers,
+        requests_per_second=args.rate,
+        max_retries=args.retries,
+        resume=not args.no_resume
+    )
+    status = job.run()
+
+    print(f"\n📊 Resultado: {status['status']}")
+    print(f"   ✅ Completados: {status['progress']['done']}")
+    print(f"   ❌ Con error: {status['progress']['failed']}")
+    for date, error in status["failed_dates"].items():
+        print(f"      📅 {date}: {error}")
+
+    if status["failed_dates"]:
+        print("\n💡 Volvé a ejecutar el script para reintentar los días con error")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
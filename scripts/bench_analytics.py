@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark de services/analytics_service sobre un dataset sintético
+
+Genera N depósitos (por defecto 1.000.000) repartidos en un rango de días y
+repartos, y compara los cálculos vectorizados con NumPy contra una versión
+equivalente en Python puro (agrupando con diccionarios fila por fila).
+"""
+import sys
+import os
+import argparse
+import time
+from collections import defaultdict
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.analytics_service import (
+    daily_series,
+    rolling_mean,
+    week_over_week,
+    grouped_stats,
+    grouped_percentiles
+)
+
+
+def generate_dataset(rows: int, days: int, repartos: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    day_idx = rng.integers(0, days, size=rows)
+    reparto_idx = rng.integers(0, repartos, size=rows)
+    amounts = np.round(rng.gamma(2.0, 150000.0, size=rows), 0)
+    esperado = amounts + rng.normal(0, 5000, size=rows)
+    esperado[rng.random(rows) < 0.2] = np.nan  # 20% sin valor esperado
+    return day_idx, reparto_idx, amounts, esperado
+
+
+def timed(label, func, results):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    results.append((label, elapsed))
+    return value
+
+
+def run_numpy(day_idx, reparto_idx, amounts, esperado, days, repartos):
+    results = []
+    daily = timed("Totales diarios", lambda: daily_series(day_idx, amounts, days), results)
+    timed("Promedio móvil 7d/30d", lambda: (rolling_mean(daily, 7), rolling_mean(daily, 30)), results)
+    timed("Variación semanal", lambda: week_over_week(daily), results)
+    timed("Varianza por reparto", lambda: grouped_stats(reparto_idx, amounts - esperado, repartos), results)
+    month_idx = day_idx // 30
+    timed("Percentiles mensuales", lambda: grouped_percentiles(month_idx, amounts, int(month_idx.max()) + 1, (10, 50, 90, 95)), results)
+    return results
+
+
+def run_python(day_idx, reparto_idx, amounts, esperado, days, repartos):
+    results = []
+    day_list = day_idx.tolist()
+    reparto_list = reparto_idx.tolist()
+    amount_list = amounts.tolist()
+    esperado_list = esperado.tolist()
+
+    def totals():
+        daily = [0.0] * days
+        for d, a in zip(day_list, amount_list):
+            daily[d] += a
+        return daily
+    daily = timed("Totales diarios", totals, results)
+
+    def rolling():
+        out = {}
+        for window in (7, 30):
+            out[window] = [
+                sum(daily[i - window + 1:i + 1]) / window if i >= window - 1 else None
+                for i in range(days)
+            ]
+        return out
+    timed("Promedio móvil 7d/30d", rolling, results)
+
+    timed("Variación semanal", lambda: [daily[i] - daily[i - 7] if i >= 7 else None for i in range(days)], results)
+
+    def variance():
+        groups = defaultdict(list)
+        for r, a, e in zip(reparto_list, amount_list, esperado_list):
+            if e == e:  # no NaN
+                groups[r].append(a - e)
+        stats = {}
+        for r, values in groups.items():
+            mean = sum(values) / len(values)
+            stats[r] = sum((v - mean) ** 2 for v in values) / len(values)
+        return stats
+    timed("Varianza por reparto", variance, results)
+
+    def percentiles():
+        groups = defaultdict(list)
+        for d, a in zip(day_list, amount_list):
+            groups[d // 30].append(a)
+        out = {}
+        for month, values in groups.items():
+            values.sort()
+            out[month] = [values[min(len(values) - 1, int(len(values) * p / 100))] for p in (10, 50, 90, 95)]
+        return out
+    timed("Percentiles mensuales", percentiles, results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de analítica vectorizada")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Cantidad de depósitos sintéticos")
+    parser.add_argument("--days", type=int, default=730, help="Días del rango")
+    parser.add_argument("--repartos", type=int, default=400, help="Cantidad de repartos distintos")
+    parser.add_argument("--skip-python", action="store_true", help="No ejecutar la versión en Python puro")
+    args = parser.parse_args()
+
+    print(f"🧪 Generando {args.rows:,} depósitos en {args.days} días y {args.repartos} repartos...")
+    data = generate_dataset(args.rows, args.days, args.repartos)
+
+    numpy_results = run_numpy(*data, args.days, args.repartos)
+    python_results = None if args.skip_python else run_python(*data, args.days, args.repartos)
+
+    print(f"\n{'Cálculo':<25}{'NumPy (ms)':>14}{'Python (ms)':>14}{'Mejora':>10}")
+    print("-" * 63)
+    for i, (label, elapsed) in enumerate(numpy_results):
+        if python_results:
+            py_elapsed = python_results[i][1]
+            print(f"{label:<25}{elapsed * 1000:>14.1f}{py_elapsed * 1000:>14.1f}{py_elapsed / elapsed:>9.1f}x")
+        else:
+            print(f"{label:<25}{elapsed * 1000:>14.1f}{'-':>14}{'-':>10}")
+
+    total_np = sum(e for _, e in numpy_results)
+    print("-" * 63)
+    if python_results:
+        total_py = sum(e for _, e in python_results)
+        print(f"{'TOTAL':<25}{total_np * 1000:>14.1f}{total_py * 1000:>14.1f}{total_py / total_np:>9.1f}x")
+    else:
+        print(f"{'TOTAL':<25}{total_np * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de requests con logging de auditoría intenso
+
+Levanta una app FastAPI mínima con el middleware de logging de la aplicación y un
+endpoint que registra N acciones de usuario por request, y mide la latencia por
+request (p50/p95/p99) escribiendo los logs en el hilo de la request (sincrónico)
+y a través de la cola del hilo escritor (LOG_ASYNC). Los logs van a un directorio
+temporal; la salida de consola se descarta.
+
+Con --io-latency-ms se simula un disco lento (o un volumen de red): cada flush de
+un archivo de log espera ese tiempo, como lo haría una escritura bloqueante.
+"""
+import sys
+import os
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from config.logging_config import LoggingConfig
+from middleware.logging_middleware import setup_request_logging
+from utils.logging_utils import log_user_action
+
+
+class SlowStream:
+    """Envuelve el archivo de un handler y demora cada flush"""
+    def __init__(self, stream, latency: float):
+        self._stream = stream
+        self._latency = latency
+
+    def write(self, data):
+        return self._stream.write(data)
+
+    def flush(self):
+        time.sleep(self._latency)
+        self._stream.flush()
+
+    def close(self):
+        self._stream.close()
+
+
+def slow_down_files(config: LoggingConfig, latency: float):
+    if config.pipeline is not None:
+        handlers = [h for hs in config.pipeline.routes.values() for h in hs]
+    else:
+        handlers = [h for logger in config._configured_loggers for h in logger.handlers]
+    for handler in handlers:
+        if isinstance(handler, logging.FileHandler) and handler.stream is not None:
+            handler.stream = SlowStream(handler.stream, latency)
+
+
+def build_app(actions_per_request: int) -> FastAPI:
+    app = FastAPI()
+    setup_request_logging(app)
+
+    @app.get("/audit")
+    def audit(request: Request):
+        for i in range(actions_per_request):
+            log_user_action(
+                "UPDATE_DEPOSIT",
+                user_id="bench",
+                resource="deposit",
+                resource_id=str(i),
+                request=request,
+                extra_data={"deposit_esperado": i * 1000, "composicion": "ECR"}
+            )
+        return {"ok": True}
+
+    return app
+
+
+def run(async_logging: bool, requests: int, actions: int, threads: int, io_latency: float):
+    base_dir = tempfile.mkdtemp(prefix="bench_logging_")
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, "w")  # el handler de consola toma sys.stderr al crearse
+    config = LoggingConfig(base_dir=base_dir, async_logging=async_logging)
+    config.setup_logging()
+    sys.stderr = stderr
+    if io_latency > 0:
+        slow_down_files(config, io_latency)
+
+    client = TestClient(build_app(actions))
+    client.get("/audit")  # calentamiento
+
+    def one_request(_):
+        start = time.perf_counter()
+        client.get("/audit")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    stats = config.stats()
+    drain_start = time.perf_counter()
+    config.shutdown()
+    drain = time.perf_counter() - drain_start
+
+    size = os.path.getsize(os.path.join(base_dir, "logs", "user_actions.log"))
+    return latencies, elapsed, drain, stats, size
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de logging sincrónico vs cola")
+    parser.add_argument("--requests", type=int, default=2000, help="Cantidad de requests")
+    parser.add_argument("--actions", type=int, default=20, help="Acciones de auditoría por request")
+    parser.add_argument("--threads", type=int, default=8, help="Requests concurrentes")
+    parser.add_argument("--io-latency-ms", type=float, default=0.0, help="Demora simulada por flush de archivo (ms)")
+    args = parser.parse_args()
+
+    print(
+        f"🧪 {args.requests:,} requests, {args.actions} acciones de auditoría por request, "
+        f"{args.threads} concurrentes, latencia de disco simulada {args.io_latency_ms} ms\n"
+    )
+    print(f"{'Modo':<14}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'Total (s)':>11}{'Vaciado (s)':>13}{'Descartados':>13}{'Log (MB)':>10}")
+    print("-" * 91)
+    for label, async_logging in (("Sincrónico", False), ("Cola", True)):
+        latencies, elapsed, drain, stats, size = run(
+            async_logging, args.requests, args.actions, args.threads, args.io_latency_ms / 1000
+        )
+        dropped = sum(stats.get("dropped", {}).values())
+        print(
+            f"{label:<14}"
+            f"{percentile(latencies, 50) * 1000:>10.2f}"
+            f"{percentile(latencies, 95) * 1000:>10.2f}"
+            f"{percentile(latencies, 99) * 1000:>10.2f}"
+            f"{elapsed:>11.2f}"
+            f"{drain:>13.2f}"
+            f"{dropped:>13,}"
+            f"{size / 1e6:>10.1f}"
+        )
+        if stats:
+            print(f"{'':<14}lotes: {stats['batches']:,}, lote máximo: {stats['max_batch']}, media: {statistics.mean(latencies) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de generación de PDFs (cierre diario y repartos detallados)
+
+Crea una base SQLite temporal con N depósitos (por defecto 300) con cheques y
+retenciones, y compara el tiempo de generación consultando los totales depósito
+por depósito (comportamiento anterior) contra la consulta agrupada única.
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+
+# Base SQLite temporal: debe configurarse antes de importar database
+_tmp_dir = tempfile.mkdtemp(prefix="bench_pdf_")
+os.environ["DB_TYPE"] = "sqlite"
+os.chdir(_tmp_dir)
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, engine, SessionLocal
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from models.deposit_aggregate import DepositAggregate
+import services.aggregates_service  # Registra el refresco de agregados al commit
+from services import pdf_service
+from services.deposits_service import PLANTAS_MAQUINAS, get_all_totals
+
+DATE = "2025-01-15"
+
+
+def generate_dataset(deposits: int, seed: int = 42):
+    """Inserta los depósitos en la base temporal y arma la respuesta equivalente de miniBank"""
+    rng = random.Random(seed)
+    machines = [maquina for maquinas in PLANTAS_MAQUINAS.values() for maquina in maquinas]
+    deposits_data = {machine: {"ArrayOfWSDepositsByDayDTO": {"WSDepositsByDayDTO": []}} for machine in machines}
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for i in range(deposits):
+            machine = machines[i % len(machines)]
+            deposit_id = f"BENCH{i:06d}"
+            reparto = rng.randint(1, 400)
+            amount = rng.randint(10_000, 900_000)
+            db.add(Deposit(
+                deposit_id=deposit_id,
+                identifier=machine,
+                user_name=f"{reparto}, RTO {reparto}",
+                total_amount=amount,
+                deposit_esperado=amount,
+                currency_code="ARS",
+                deposit_type="Bills",
+                date_time=datetime.strptime(f"{DATE} 10:00:00", "%Y-%m-%d %H:%M:%S")
+            ))
+            for _ in range(rng.randint(0, 3)):
+                db.add(Cheque(deposit_id=deposit_id, nro_cheque=str(rng.randint(1, 10**8)), importe=rng.randint(1_000, 50_000)))
+            for _ in range(rng.randint(0, 2)):
+                db.add(Retencion(deposit_id=deposit_id, nro_retencion=str(rng.randint(1, 10**8)), importe=rng.randint(100, 5_000)))
+
+            deposits_data[machine]["ArrayOfWSDepositsByDayDTO"]["WSDepositsByDayDTO"].append({
+                "depositId": deposit_id,
+                "userName": f"{reparto}, RTO {reparto}",
+                "dateTime": f"{DATE}T10:00:00",
+                "currencies": {"WSDepositCurrency": {"currencyCode": "ARS", "totalAmount": str(amount)}}
+            })
+        db.commit()
+    finally:
+        db.close()
+
+    return deposits_data, get_all_totals(DATE, deposits_data=deposits_data, save=False)
+
+
+def per_deposit_totals_map(deposit_ids):
+    """Comportamiento anterior: una sesión y dos consultas por depósito"""
+    return {deposit_id: pdf_service.get_cheques_retenciones_totals(deposit_id) for deposit_id in deposit_ids}
+
+
+def run(deposits_data, totals_data, repeat):
+    results = []
+    for name, func in (
+        ("Cierre diario", lambda: pdf_service.generate_daily_closure_pdf(totals_data, DATE, deposits_data)),
+        ("Repartos detallados", lambda: pdf_service.generate_detailed_repartos_pdf(deposits_data, DATE)),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        results.append((name, (time.perf_counter() - start) / repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de generación de PDFs")
+    parser.add_argument("--deposits", type=int, default=300, help="Cantidad de depósitos sintéticos")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medición")
+    args = parser.parse_args()
+
+    print(f"🧪 Generando {args.deposits} depósitos en {_tmp_dir}...")
+    deposits_data, totals_data = generate_dataset(args.deposits)
+
+    grouped_map = pdf_service.get_cheques_retenciones_totals_map
+    pdf_service.get_cheques_retenciones_totals_map = per_deposit_totals_map
+    try:
+        before = run(deposits_data, totals_data, args.repeat)
+    finally:
+        pdf_service.get_cheques_retenciones_totals_map = grouped_map
+    after = run(deposits_data, totals_data, args.repeat)
+
+    print(f"\n{'PDF':<25}{'Por depósito (ms)':>20}{'Agrupado (ms)':>16}{'Mejora':>10}")
+    print("-" * 71)
+    for (name, old), (_, new) in zip(before, after):
+        print(f"{name:<25}{old * 1000:>20.1f}{new * 1000:>16.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark del reporte PDF por rango de fechas
+
+Crea una base SQLite temporal con N depósitos (por defecto 10.000) repartidos en
+D días (por defecto 31) y mide tiempo y pico de memoria (tracemalloc) al generar
+el reporte para rangos crecientes. Con --compare también arma la versión con una
+única tabla construida en memoria, como el reporte diario detallado.
+"""
+import sys
+import os
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Base SQLite temporal: debe configurarse antes de importar database
+_tmp_dir = tempfile.mkdtemp(prefix="bench_pdf_range_")
+os.environ["DB_TYPE"] = "sqlite"
+os.chdir(_tmp_dir)
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from database import Base, engine
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from services import pdf_service
+from services.deposits_service import PLANTAS_MAQUINAS
+from services.report_data_provider import iter_range_deposits
+
+START = datetime(2025, 1, 1)
+
+
+def generate_dataset(deposits: int, days: int, seed: int = 42):
+    rng = random.Random(seed)
+    machines = [maquina for maquinas in PLANTAS_MAQUINAS.values() for maquina in maquinas]
+    Base.metadata.create_all(bind=engine)
+
+    deposit_rows, cheque_rows, retencion_rows = [], [], []
+    for i in range(deposits):
+        deposit_id = f"BENCH{i:07d}"
+        reparto = rng.randint(1, 400)
+        deposit_rows.append({
+            "deposit_id": deposit_id,
+            "identifier": machines[i % len(machines)],
+            "user_name": f"{reparto}, RTO {reparto}",
+            "total_amount": rng.randint(10_000, 900_000),
+            "currency_code": "ARS",
+            "deposit_type": "Bills",
+            "date_time": START + timedelta(days=rng.randrange(days), minutes=rng.randrange(16 * 60))
+        })
+        if rng.random() < 0.3:
+            cheque_rows.append({"deposit_id": deposit_id, "nro_cheque": str(i), "importe": rng.randint(1_000, 50_000)})
+        if rng.random() < 0.2:
+            retencion_rows.append({"deposit_id": deposit_id, "nro_retencion": str(i), "importe": rng.randint(100, 5_000)})
+
+    with engine.begin() as conn:
+        conn.execute(insert(Deposit), deposit_rows)
+        if cheque_rows:
+            conn.execute(insert(Cheque), cheque_rows)
+        if retencion_rows:
+            conn.execute(insert(Retencion), retencion_rows)
+
+
+def single_table_pdf(start_date: str, end_date: str) -> bytes:
+    """Versión en memoria: todas las filas en una lista y en una sola tabla"""
+    from io import BytesIO
+    rows = [['Hora', 'Usuario', 'Efectivo ($)', 'Cheques ($)', 'Retenciones ($)', 'Máquina', 'ID Depósito']]
+    for d in list(iter_range_deposits(start_date, end_date)):
+        rows.append([
+            d['date_time'].strftime("%d/%m %H:%M"), d['user_name'],
+            pdf_service.format_currency(d['total_amount']), pdf_service.format_currency(d['cheques']),
+            pdf_service.format_currency(d['retenciones']), d['identifier'], d['deposit_id']
+        ])
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build([Table(rows, repeatRows=1)])
+    return buffer.getvalue()
+
+
+def measure(func):
+    """Tiempo sin instrumentar y pico de memoria en una segunda corrida con tracemalloc"""
+    start = time.perf_counter()
+    content = func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del reporte PDF por rango")
+    parser.add_argument("--deposits", type=int, default=10_000, help="Cantidad de depósitos sintéticos")
+    parser.add_argument("--days", type=int, default=31, help="Días del período")
+    parser.add_argument("--compare", action="store_true", help="Medir también la versión con una sola tabla en memoria")
+    args = parser.parse_args()
+
+    print(f"🧪 Generando {args.deposits:,} depósitos en {args.days} días ({_tmp_dir})...")
+    generate_dataset(args.deposits, args.days)
+
+    start_date = START.strftime("%Y-%m-%d")
+    ranges = sorted({1, max(1, args.days // 4), args.days})
+
+    print(f"\n{'Reporte':<30}{'Depósitos':>10}{'Tiempo (s)':>12}{'Pico (MB)':>12}{'PDF (MB)':>10}")
+    print("-" * 74)
+    for days in ranges:
+        end_date = (START + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        count = sum(1 for _ in iter_range_deposits(start_date, end_date))
+        elapsed, peak, size = measure(lambda: pdf_service.generate_range_pdf_from_db(start_date, end_date))
+        print(f"{f'Por bloques ({days} días)':<30}{count:>10,}{elapsed:>12.2f}{peak / 1e6:>12.1f}{size / 1e6:>10.1f}")
+
+        if args.compare:
+            elapsed, peak, size = measure(lambda: single_table_pdf(start_date, end_date))
+            print(f"{f'Tabla única ({days} días)':<30}{count:>10,}{elapsed:>12.2f}{peak / 1e6:>12.1f}{size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
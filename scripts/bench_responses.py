@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark de tamaño y latencia de respuestas JSON grandes
+
+Crea una base SQLite temporal con un día pesado (por defecto 3.000 depósitos
+con cheques y retenciones) y mide:
+- la serialización del payload de /db/deposits/by-machine con la ruta por
+  defecto de FastAPI (jsonable_encoder + json) contra FastJSONResponse (orjson);
+- el tamaño y el tiempo de compresión con gzip y brotli (si está instalado);
+- la latencia de punta a punta y los bytes transferidos según Accept-Encoding.
+"""
+import sys
+import os
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Base SQLite temporal: debe configurarse antes de importar database
+_tmp_dir = tempfile.mkdtemp(prefix="bench_responses_")
+os.environ["DB_TYPE"] = "sqlite"
+os.chdir(_tmp_dir)
+
+# Agregar el directorio padre al path para importar módulos
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from database import Base, engine
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from models.change_tracking import ChangeSequence, DeletedRow  # noqa: F401 (tablas)
+from middleware.compression import CompressionMiddleware, _Compressor, brotli
+from routers.database import router as database_router
+from services.deposits_service import PLANTAS_MAQUINAS
+from utils.json_response import FastJSONResponse, orjson
+
+DAY = datetime(2025, 3, 14)
+
+
+def generate_day(deposits: int, seed: int = 7):
+    rng = random.Random(seed)
+    machines = [maquina for maquinas in PLANTAS_MAQUINAS.values() for maquina in maquinas]
+    Base.metadata.create_all(bind=engine)
+
+    deposit_rows, cheque_rows, retencion_rows = [], [], []
+    for i in range(deposits):
+        deposit_id = f"BENCH{i:07d}"
+        reparto = rng.randint(1, 400)
+        total = rng.randint(10_000, 900_000)
+        deposit_rows.append({
+            "deposit_id": deposit_id,
+            "identifier": machines[i % len(machines)],
+            "user_name": f"{reparto}, RTO {reparto}",
+            "idreparto": reparto,
+            "total_amount": total,
+            "deposit_esperado": total + rng.choice([0, 0, 0, 500, -1000]),
+            "composicion_esperado": rng.choice(["E", "EC", "ER", "ECR"]),
+            "currency_code": "ARS",
+            "deposit_type": "Bills",
+            "date_time": DAY + timedelta(minutes=rng.randrange(16 * 60)),
+            "pos_name": "POS",
+            "st_name": "Planta"
+        })
+        for j in range(rng.choice([0, 0, 1, 2, 3])):
+            cheque_rows.append({
+                "deposit_id": deposit_id, "nro_cheque": f"{i}{j}", "banco": "Banco Nación",
+                "fecha": "2025-03-20", "importe": rng.randint(1_000, 50_000)
+            })
+        if rng.random() < 0.3:
+            retencion_rows.append({
+                "deposit_id": deposit_id, "nro_retencion": str(i), "fecha": "2025-03-14",
+                "importe": rng.randint(100, 5_000), "tipo": "IIBB"
+            })
+
+    with engine.begin() as conn:
+        conn.execute(insert(Deposit), deposit_rows)
+        if cheque_rows:
+            conn.execute(insert(Cheque), cheque_rows)
+        if retencion_rows:
+            conn.execute(insert(Retencion), retencion_rows)
+
+
+def build_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.include_router(database_router, prefix="/api")
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+def best_of(func, repeat: int):
+    tiempos = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        tiempos.append(time.perf_counter() - start)
+    return min(tiempos), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización y compresión de respuestas")
+    parser.add_argument("--deposits", type=int, default=3000, help="Depósitos del día")
+    parser.add_argument("--requests", type=int, default=30, help="Requests por codificación")
+    args = parser.parse_args()
+
+    print(f"🧪 Generando {args.deposits:,} depósitos para {DAY:%Y-%m-%d} ({_tmp_dir})...")
+    generate_day(args.deposits)
+
+    client = TestClient(build_app())
+    url = f"/api/db/deposits/by-machine?date={DAY:%Y-%m-%d}"
+    payload = json.loads(client.get(url, headers={"Accept-Encoding": "identity"}).content)
+
+    print(f"\n📦 Serialización del payload (orjson {'disponible' if orjson else 'NO instalado'})")
+    print(f"{'Ruta':<36}{'Tiempo (ms)':>12}{'Tamaño (KB)':>13}")
+    print("-" * 61)
+    elapsed, body = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body, 5)
+    print(f"{'jsonable_encoder + JSONResponse':<36}{elapsed * 1000:>12.1f}{len(body) / 1024:>13.1f}")
+    elapsed, body = best_of(lambda: FastJSONResponse(payload).body, 5)
+    print(f"{'FastJSONResponse':<36}{elapsed * 1000:>12.1f}{len(body) / 1024:>13.1f}")
+
+    print(f"\n🗜️  Compresión del cuerpo ({len(body) / 1024:.1f} KB)")
+    print(f"{'Codificación':<36}{'Tiempo (ms)':>12}{'Tamaño (KB)':>13}{'Ratio':>8}")
+    print("-" * 69)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        def comprimir():
+            compressor = _Compressor(encoding, 6, 4)
+            return compressor.compress(body) + compressor.finish()
+        elapsed, compressed = best_of(comprimir, 5)
+        print(f"{encoding:<36}{elapsed * 1000:>12.1f}{len(compressed) / 1024:>13.1f}{len(body) / len(compressed):>8.1f}x")
+    if brotli is None:
+        print("   (brotli no instalado: solo gzip)")
+
+    print(f"\n🌐 Punta a punta: {args.requests} requests por codificación")
+    print(f"{'Accept-Encoding':<36}{'p50 (ms)':>12}{'p95 (ms)':>10}{'Transferido (KB)':>18}")
+    print("-" * 76)
+    for accept in ["identity"] + encodings:
+        latencias = []
+        transferido = 0
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url, headers={"Accept-Encoding": accept})
+            latencias.append(time.perf_counter() - start)
+            transferido = int(response.headers.get("content-length", len(response.content)))
+        latencias.sort()
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+        print(f"{accept:<36}{statistics.median(latencias) * 1000:>12.1f}{p95 * 1000:>10.1f}{transferido / 1024:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 """
 Script de limpieza y mantenimiento de logs
 Permite comprimir, archivar y limpiar logs antiguos
+
+user_actions.log no se toca: la aplicación lo rota por tamaño y a medianoche,
+comprime los segmentos y respeta un tope de disco (SizedTimedRotatingFileHandler).
 """
 
 import os
@@ -12,6 +15,12 @@ from datetime import datetime, timedelta
 import argparse
 import json
 
+# Logs que rota y limpia la propia aplicación (incluye sus segmentos rotados)
+MANAGED_LOGS = ("user_actions.log",)
+
+def is_managed_log(log_file: Path) -> bool:
+    return any(log_file.name == name or log_file.name.startswith(name + ".") for name in MANAGED_LOGS)
+
 class LogCleaner:
     def __init__(self, base_dir="/home/gonzalo/Documentos/BackendCierreRepartos"):
         self.logs_dir = Path(base_dir) / "logs"
@@ -57,7 +66,7 @@ class LogCleaner:
         total_saved_mb = 0
         
         for log_file in self.logs_dir.glob("*.log*"):
-            if log_file.is_file() and not log_file.name.startswith('archive'):
+            if log_file.is_file() and not log_file.name.startswith('archive') and not is_managed_log(log_file):
                 age = self.get_file_age_days(log_file)
                 size_mb = self.get_file_size_mb(log_file)
                 
@@ -110,7 +119,7 @@ class LogCleaner:
         truncated_count = 0
         
         for log_file in self.logs_dir.glob("*.log"):
-            if log_file.is_file():
+            if log_file.is_file() and not is_managed_log(log_file):
                 size_mb = self.get_file_size_mb(log_file)
                 
                 if size_mb > max_size_mb:
@@ -210,7 +219,7 @@ class LogCleaner:
             print(f"  • Considerar archivar logs (más de 100 MB activos)")
         if total_archives_size > 500:
             print(f"  • Considerar limpiar archivos antiguos (más de 500 MB archivados)")
-        if any(self.get_file_size_mb(f) > 50 for f in self.logs_dir.glob("*.log")):
+        if any(self.get_file_size_mb(f) > 50 for f in self.logs_dir.glob("*.log") if not is_managed_log(f)):
             print(f"  • Hay logs individuales mayores a 50 MB que deberían truncarse")
 
     def full_maintenance(self, archive_days=7, delete_days=30, max_log_size_mb=50):
@@ -11,6 +11,7 @@ from pathlib import Path
 from datetime import datetime
 import subprocess
 import sys
+import os
 
 class LogMonitor:
     def __init__(self, base_dir="/home/gonzalo/Documentos/BackendCierreRepartos"):
@@ -170,6 +171,24 @@ class LogMonitor:
         except Exception as e:
             print(f"❌ Error en monitoreo: {e}")
 
+    def search_audit(self, user=None, resource_id=None, action=None, date_from=None, date_to=None, lines=20):
+        """Busca acciones de usuario en el índice de auditoría (incluye segmentos rotados y archivados)"""
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from services.audit_index import AuditIndex
+        
+        index = AuditIndex(index_path=str(self.logs_dir / "audit_index.sqlite3"), log_path=self.user_actions_log)
+        added = index.refresh(force=True)
+        result = index.search(
+            user=user, resource_id=resource_id, action=action,
+            date_from=date_from, date_to=date_to, page_size=lines
+        )
+        
+        print(f"🔎 {result['total']} acciones encontradas ({added} nuevas indexadas), mostrando {len(result['items'])}:")
+        print("=" * 80)
+        for item in result['items']:
+            print(self.format_json_log(json.dumps(item)))
+            print()
+
     def show_log_stats(self):
         """Muestra estadísticas de los archivos de log"""
         print("📈 Estadísticas de logs:")
@@ -207,12 +226,17 @@ class LogMonitor:
 
 def main():
     parser = argparse.ArgumentParser(description='Monitor de logs de la aplicación')
-    parser.add_argument('--action', choices=['user', 'errors', 'general', 'watch', 'stats'], 
+    parser.add_argument('--action', choices=['user', 'errors', 'general', 'watch', 'stats', 'audit'], 
                        default='stats', help='Acción a realizar')
     parser.add_argument('--lines', type=int, default=20, 
                        help='Número de líneas a mostrar')
     parser.add_argument('--watch-type', choices=['all', 'user', 'errors', 'general'], 
                        default='all', help='Tipo de logs a monitorear en tiempo real')
+    parser.add_argument('--user', help='Filtrar auditoría por usuario')
+    parser.add_argument('--resource-id', help='Filtrar auditoría por ID de recurso')
+    parser.add_argument('--audit-action', help='Filtrar auditoría por acción')
+    parser.add_argument('--from', dest='date_from', help='Fecha inicial YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='Fecha final YYYY-MM-DD')
     
     args = parser.parse_args()
     
@@ -228,6 +252,8 @@ def main():
         monitor.watch_logs(args.watch_type)
     elif args.action == 'stats':
         monitor.show_log_stats()
+    elif args.action == 'audit':
+        monitor.search_audit(args.user, args.resource_id, args.audit_action, args.date_from, args.date_to, args.lines)
     
     print()
 
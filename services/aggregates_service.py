@@ -0,0 +1,277 @@
+"""
+Servicio de agregados materializados de depósitos
+
+Mantiene la tabla `deposit_aggregates` (día × planta × máquina × estado).
+Cada vez que se confirma una transacción que toca depósitos, cheques o
+retenciones, se recalculan solo los días afectados con una consulta agrupada
+acotada a ese día, así los endpoints de resumen y gráficos leen O(días)
+filas en lugar de recorrer toda la tabla de depósitos.
+
+El historial se carga una sola vez con migrations/create_deposit_aggregates.py,
+que deja la marca AGGREGATES_MARKER en change_sequence: 0 mientras reconstruye
+(los commits ya mantienen sus días) y 1 al terminar. Sin la marca los commits no
+tocan la tabla y las lecturas devuelven None (el endpoint responde 503): una
+tabla con solo los días escritos desde el deploy daría totales incompletos.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy import select, delete, insert, func, case, distinct
+from sqlalchemy.orm import Session
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from models.deposit_aggregate import DepositAggregate
+from models.change_tracking import ChangeSequence
+from services.deposits_service import get_planta_from_identifier
+from services.deposit_change_tracker import on_before_commit
+
+
+AGGREGATES_MARKER = "deposit_aggregates"
+_MARKER_BUILDING = 0
+_MARKER_READY = 1
+AGGREGATES_NOT_READY = "Los agregados todavía no se inicializaron: ejecutar migrations/create_deposit_aggregates.py"
+
+# Una vez completa, la marca no vuelve atrás: se recuerda por proceso
+_ready = False
+
+
+def _marker_value(db: Session) -> Optional[int]:
+    return db.execute(select(ChangeSequence.value).where(ChangeSequence.name == AGGREGATES_MARKER)).scalar()
+
+
+def _set_marker(db: Session, value: int):
+    marker = db.query(ChangeSequence).filter(ChangeSequence.name == AGGREGATES_MARKER).first()
+    if marker is None:
+        db.add(ChangeSequence(name=AGGREGATES_MARKER, value=value))
+    else:
+        marker.value = value
+
+
+def aggregates_ready(db: Session) -> bool:
+    """True si el historial ya se reconstruyó (la tabla refleja todos los depósitos)"""
+    global _ready
+    if not _ready:
+        _ready = _marker_value(db) == _MARKER_READY
+    return _ready
+
+
+def _documentos_por_deposito(model, inicio: datetime, fin: datetime):
+    """Subconsulta con total y cantidad de cheques/retenciones por depósito del día"""
+    return (
+        select(
+            model.deposit_id.label("deposit_id"),
+            func.sum(model.importe).label("total"),
+            func.count(model.id).label("cantidad")
+        )
+        .join(Deposit, Deposit.deposit_id == model.deposit_id)
+        .where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+        .group_by(model.deposit_id)
+        .subquery()
+    )
+
+
+def compute_aggregates_for_date(db: Session, fecha: date) -> List[dict]:
+    """
+    Calcula los agregados de un día con una única consulta agrupada por máquina y estado
+    """
+    inicio = datetime.combine(fecha, time.min)
+    fin = inicio + timedelta(days=1)
+
+    cheques_sq = _documentos_por_deposito(Cheque, inicio, fin)
+    retenciones_sq = _documentos_por_deposito(Retencion, inicio, fin)
+
+    tiene_esperado = Deposit.deposit_esperado.isnot(None)
+
+    stmt = (
+        select(
+            Deposit.identifier,
+            Deposit.estado,
+            func.max(Deposit.st_name).label("st_name"),
+            func.count(Deposit.id).label("deposit_count"),
+            func.coalesce(func.sum(Deposit.total_amount), 0).label("total_amount"),
+            func.coalesce(func.sum(Deposit.deposit_esperado), 0).label("deposit_esperado"),
+            func.coalesce(func.sum(case(
+                (tiene_esperado, Deposit.total_amount - Deposit.deposit_esperado),
+                else_=0
+            )), 0).label("diferencia"),
+            func.count(Deposit.deposit_esperado).label("con_esperado_count"),
+            func.coalesce(func.sum(cheques_sq.c.total), 0).label("cheques_total"),
+            func.coalesce(func.sum(cheques_sq.c.cantidad), 0).label("cheques_count"),
+            func.coalesce(func.sum(retenciones_sq.c.total), 0).label("retenciones_total"),
+            func.coalesce(func.sum(retenciones_sq.c.cantidad), 0).label("retenciones_count"),
+        )
+        .outerjoin(cheques_sq, cheques_sq.c.deposit_id == Deposit.deposit_id)
+        .outerjoin(retenciones_sq, retenciones_sq.c.deposit_id == Deposit.deposit_id)
+        .where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+        .group_by(Deposit.identifier, Deposit.estado)
+    )
+
+    fecha_str = fecha.strftime("%Y-%m-%d")
+    now = datetime.utcnow()
+    rows = []
+    for row in db.execute(stmt):
+        machine = row.identifier or "desconocida"
+        rows.append({
+            "date": fecha_str,
+            "plant": get_planta_from_identifier(machine),
+            "machine": machine,
+            "estado": row.estado.value if row.estado is not None else "SIN_ESTADO",
+            "st_name": row.st_name,
+            "deposit_count": row.deposit_count,
+            "total_amount": float(row.total_amount),
+            "deposit_esperado": float(row.deposit_esperado),
+            "diferencia": float(row.diferencia),
+            "con_esperado_count": row.con_esperado_count,
+            "cheques_total": float(row.cheques_total),
+            "cheques_count": int(row.cheques_count),
+            "retenciones_total": float(row.retenciones_total),
+            "retenciones_count": int(row.retenciones_count),
+            "updated_at": now
+        })
+    return rows
+
+
+def refresh_aggregates_for_dates(db: Session, fechas: Iterable[date]) -> int:
+    """
+    Recalcula y reemplaza los agregados de los días indicados dentro de la transacción
+    actual de `db` (no hace commit). Devuelve la cantidad de filas de agregados escritas.
+    """
+    escritas = 0
+    for fecha in sorted(set(fechas)):
+        rows = compute_aggregates_for_date(db, fecha)
+        db.execute(delete(DepositAggregate).where(DepositAggregate.date == fecha.strftime("%Y-%m-%d")))
+        if rows:
+            db.execute(insert(DepositAggregate), rows)
+        escritas += len(rows)
+    return escritas
+
+
+@on_before_commit
+def _refresh_aggregates_on_commit(session: Session, changes):
+    """
+    Mantiene los agregados de los días tocados en la misma transacción (solo desde que
+    la migración empezó a reconstruir el historial)
+    """
+    if changes.fechas and (_ready or _marker_value(session) is not None):
+        refresh_aggregates_for_dates(session, changes.fechas)
+
+
+def rebuild_aggregates(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> dict:
+    """
+    Reconstruye los agregados de un rango de días y hace commit. Sin rango reconstruye todo
+    el historial y marca la tabla como inicializada (lo usa la migración)
+    """
+    completo = start_date is None and end_date is None
+    if completo:
+        # Desde acá los commits mantienen sus días mientras se recorre el historial
+        _set_marker(db, _MARKER_BUILDING)
+        db.commit()
+
+    if start_date is None or end_date is None:
+        min_dt, max_dt = db.query(func.min(Deposit.date_time), func.max(Deposit.date_time)).one()
+        if min_dt is not None:
+            start_date = start_date or min_dt.date()
+            end_date = end_date or max_dt.date()
+
+    dias = 0
+    filas = 0
+    fecha = start_date
+    while fecha is not None and fecha <= end_date:
+        filas += refresh_aggregates_for_dates(db, [fecha])
+        dias += 1
+        fecha += timedelta(days=1)
+    if completo:
+        _set_marker(db, _MARKER_READY)
+    db.commit()
+    print(f"✅ Agregados reconstruidos: {dias} días, {filas} filas")
+    return {"dias": dias, "filas": filas}
+
+
+def get_aggregates_summary(db: Session) -> Optional[dict]:
+    """
+    Resumen general (equivalente a /db/deposits/summary) leído desde los agregados.
+    None si el historial todavía no se reconstruyó
+    """
+    if not aggregates_ready(db):
+        return None
+
+    totals = db.query(
+        func.coalesce(func.sum(DepositAggregate.deposit_count), 0),
+        func.coalesce(func.sum(DepositAggregate.total_amount), 0),
+        func.count(distinct(DepositAggregate.machine)),
+        func.min(DepositAggregate.date),
+        func.max(DepositAggregate.date)
+    ).one()
+
+    machine_totals = db.query(
+        DepositAggregate.machine,
+        func.max(DepositAggregate.st_name).label("st_name"),
+        func.sum(DepositAggregate.deposit_count).label("deposit_count"),
+        func.sum(DepositAggregate.total_amount).label("total_amount")
+    ).group_by(DepositAggregate.machine).order_by(DepositAggregate.machine).all()
+
+    return {
+        "total_deposits": int(totals[0]),
+        "total_amount": float(totals[1]),
+        "unique_machines": totals[2],
+        "date_range": {"from": totals[3], "to": totals[4]},
+        "machines": [
+            {
+                "identifier": m.machine,
+                "st_name": m.st_name,
+                "deposit_count": int(m.deposit_count or 0),
+                "total_amount": float(m.total_amount or 0)
+            }
+            for m in machine_totals
+        ]
+    }
+
+
+def get_aggregates_by_period(db: Session, start_date: str, end_date: str, plant: Optional[str] = None) -> Optional[List[dict]]:
+    """
+    Totales por día y planta (sumando máquinas y estados) desde los agregados.
+    None si el historial todavía no se reconstruyó
+    """
+    if not aggregates_ready(db):
+        return None
+
+    query = db.query(
+        DepositAggregate.date,
+        DepositAggregate.plant,
+        func.sum(DepositAggregate.deposit_count).label("deposit_count"),
+        func.sum(DepositAggregate.total_amount).label("total_amount"),
+        func.sum(DepositAggregate.deposit_esperado).label("deposit_esperado"),
+        func.sum(DepositAggregate.diferencia).label("diferencia"),
+        func.sum(DepositAggregate.cheques_total).label("cheques_total"),
+        func.sum(DepositAggregate.retenciones_total).label("retenciones_total"),
+        func.sum(case((DepositAggregate.estado == "PENDIENTE", DepositAggregate.deposit_count), else_=0)).label("pendientes"),
+        func.sum(case((DepositAggregate.estado == "LISTO", DepositAggregate.deposit_count), else_=0)).label("listos"),
+        func.sum(case((DepositAggregate.estado == "ENVIADO", DepositAggregate.deposit_count), else_=0)).label("enviados")
+    ).filter(
+        DepositAggregate.date >= start_date,
+        DepositAggregate.date <= end_date
+    )
+    if plant:
+        query = query.filter(DepositAggregate.plant == plant)
+
+    rows = query.group_by(DepositAggregate.date, DepositAggregate.plant).order_by(
+        DepositAggregate.date, DepositAggregate.plant
+    ).all()
+
+    return [
+        {
+            "date": r.date,
+            "plant": r.plant,
+            "deposit_count": int(r.deposit_count or 0),
+            "total_amount": float(r.total_amount or 0),
+            "deposit_esperado": float(r.deposit_esperado or 0),
+            "diferencia": float(r.diferencia or 0),
+            "cheques_total": float(r.cheques_total or 0),
+            "retenciones_total": float(r.retenciones_total or 0),
+            "estados": {
+                "PENDIENTE": int(r.pendientes or 0),
+                "LISTO": int(r.listos or 0),
+                "ENVIADO": int(r.enviados or 0)
+            }
+        }
+        for r in rows
+    ]
@@ -0,0 +1,304 @@
+"""
+Servicio de analítica de depósitos con NumPy
+
+Las columnas necesarias se leen con una sola consulta y se convierten a
+arreglos NumPy; todos los cálculos (agrupaciones por día/mes/reparto,
+ventanas móviles, variaciones y percentiles) son vectorizados, sin recorrer
+objetos del ORM fila por fila.
+
+Las funciones `daily_series`, `rolling_mean`, `week_over_week`,
+`grouped_stats` y `grouped_percentiles` son puras (solo reciben arreglos),
+así se pueden medir con datos sintéticos (ver scripts/bench_analytics.py).
+"""
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.deposit import Deposit
+from services.deposits_service import PLANTAS_MAQUINAS
+
+# ==================== CARGA DE DATOS ====================
+
+class DepositColumns:
+    """
+    Columnas de depósitos de un rango como arreglos NumPy
+    """
+
+    def __init__(self, start: date, end: date, day_idx, amounts, esperado, reparto_idx, repartos):
+        self.start = start
+        self.end = end
+        self.day_idx = day_idx          # int64: días desde `start`
+        self.amounts = amounts          # float64: total_amount
+        self.esperado = esperado        # float64: deposit_esperado (NaN si no hay)
+        self.reparto_idx = reparto_idx  # int64: índice en `repartos`
+        self.repartos = repartos        # list: idreparto (o user_name si no se pudo extraer)
+
+    @property
+    def n_days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def load_deposit_columns(db: Session, start_date: str, end_date: str, plant: Optional[str] = None) -> DepositColumns:
+    """
+    Lee fecha, monto, esperado y user_name de los depósitos del rango en una sola consulta
+    """
+    start = _parse_date(start_date)
+    end = _parse_date(end_date)
+
+    stmt = select(
+        Deposit.date_time,
+        Deposit.total_amount,
+        Deposit.deposit_esperado,
+        Deposit.idreparto,
+        Deposit.user_name
+    ).where(
+        Deposit.date_time >= datetime.combine(start, datetime.min.time()),
+        Deposit.date_time < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    )
+    if plant:
+        stmt = stmt.where(Deposit.identifier.in_(PLANTAS_MAQUINAS.get(plant, [])))
+
+    rows = db.execute(stmt).all()
+    if not rows:
+        empty_i = np.empty(0, dtype=np.int64)
+        empty_f = np.empty(0, dtype=np.float64)
+        return DepositColumns(start, end, empty_i, empty_f, empty_f, empty_i, [])
+
+    date_times, amounts, esperados, idrepartos, user_names = zip(*rows)
+
+    days = np.array(date_times, dtype="datetime64[s]").astype("datetime64[D]")
+    day_idx = (days - np.datetime64(start, "D")).astype(np.int64)
+    amounts_arr = np.array(amounts, dtype=np.float64)
+    esperado_arr = np.array([np.nan if e is None else e for e in esperados], dtype=np.float64)
+
+    # idreparto viene precalculado al guardar; NULL significa que user_name no tiene uno
+    # extraíble, así que esos depósitos se agrupan por el user_name tal cual
+    keys = [
+        idreparto if idreparto is not None else (user_name or "")
+        for idreparto, user_name in zip(idrepartos, user_names)
+    ]
+    posiciones = {}
+    reparto_idx = np.fromiter(
+        (posiciones.setdefault(key, len(posiciones)) for key in keys), dtype=np.int64, count=len(keys)
+    )
+
+    return DepositColumns(start, end, day_idx, amounts_arr, esperado_arr, reparto_idx, list(posiciones))
+
+
+# ==================== CÁLCULOS VECTORIZADOS ====================
+
+def daily_series(day_idx: np.ndarray, values: np.ndarray, n_days: int) -> np.ndarray:
+    """Suma de `values` por día (días sin datos quedan en 0)"""
+    return np.bincount(day_idx, weights=values, minlength=n_days)[:n_days]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Promedio móvil de `window` días; las primeras `window - 1` posiciones quedan en NaN"""
+    result = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return result
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+def week_over_week(values: np.ndarray, lag: int = 7) -> Dict[str, np.ndarray]:
+    """Diferencia absoluta y porcentual contra el mismo día de la semana anterior"""
+    delta = np.full(len(values), np.nan)
+    pct = np.full(len(values), np.nan)
+    if len(values) > lag:
+        previous = values[:-lag]
+        delta[lag:] = values[lag:] - previous
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct[lag:] = np.where(previous != 0, delta[lag:] / previous * 100, np.nan)
+    return {"delta": delta, "pct": pct}
+
+
+def grouped_stats(group_idx: np.ndarray, values: np.ndarray, n_groups: int) -> Dict[str, np.ndarray]:
+    """
+    Cantidad, suma, promedio, varianza poblacional y desvío por grupo con bincount
+    (los valores NaN se ignoran)
+    """
+    valid = ~np.isnan(values)
+    group_idx = group_idx[valid]
+    values = values[valid]
+
+    count = np.bincount(group_idx, minlength=n_groups).astype(np.float64)
+    total = np.bincount(group_idx, weights=values, minlength=n_groups)
+    total_sq = np.bincount(group_idx, weights=values * values, minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count > 0, total / count, np.nan)
+        variance = np.where(count > 0, total_sq / count - mean * mean, np.nan)
+    variance = np.maximum(variance, 0.0)  # Errores de redondeo
+
+    return {
+        "count": count,
+        "sum": total,
+        "mean": mean,
+        "variance": variance,
+        "std": np.sqrt(variance)
+    }
+
+
+def grouped_percentiles(group_idx: np.ndarray, values: np.ndarray, n_groups: int, q: Sequence[float]) -> np.ndarray:
+    """
+    Percentiles `q` de `values` por grupo. Devuelve una matriz (n_groups, len(q)),
+    NaN para grupos vacíos. Se agrupa con un único ordenamiento por grupo y cada
+    percentil se resuelve con selección parcial (np.percentile), sin ordenar valores.
+    """
+    result = np.full((n_groups, len(q)), np.nan)
+    if len(values) == 0:
+        return result
+
+    order = np.argsort(group_idx, kind="stable")
+    grouped_values = values[order]
+    bounds = np.searchsorted(group_idx[order], np.arange(n_groups + 1))
+
+    for g in range(n_groups):
+        lo, hi = bounds[g], bounds[g + 1]
+        if hi > lo:
+            result[g] = np.percentile(grouped_values[lo:hi], q)
+    return result
+
+
+# ==================== RESPUESTAS ====================
+
+def _to_list(values: np.ndarray, decimals: int = 2) -> List[Optional[float]]:
+    """Convierte a lista JSON (NaN -> None)"""
+    rounded = np.round(values.astype(np.float64), decimals)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+
+def _day_labels(start: date, n_days: int) -> List[str]:
+    return [str(d) for d in np.arange(np.datetime64(start, "D"), np.datetime64(start, "D") + n_days)]
+
+
+def get_rolling_averages(db: Session, start_date: str, end_date: str, plant: Optional[str] = None, windows: Sequence[int] = (7, 30)) -> Dict:
+    """
+    Totales diarios y promedios móviles. Se leen `max(windows) - 1` días previos
+    para que el promedio esté completo desde el primer día pedido.
+    """
+    lookback = max(windows) - 1 if windows else 0
+    load_start = (_parse_date(start_date) - timedelta(days=lookback)).strftime("%Y-%m-%d")
+    cols = load_deposit_columns(db, load_start, end_date, plant)
+
+    daily = daily_series(cols.day_idx, cols.amounts, cols.n_days)
+    counts = daily_series(cols.day_idx, np.ones(len(cols)), cols.n_days)
+
+    visible = slice(lookback, None)
+    return {
+        "labels": _day_labels(cols.start, cols.n_days)[visible],
+        "daily_total": _to_list(daily[visible]),
+        "deposit_count": [int(c) for c in counts[visible]],
+        "rolling": {
+            f"{window}d": _to_list(rolling_mean(daily, window)[visible])
+            for window in windows
+        }
+    }
+
+
+def get_week_over_week(db: Session, start_date: str, end_date: str, plant: Optional[str] = None) -> Dict:
+    """
+    Variación diaria contra el mismo día de la semana anterior y totales semanales
+    """
+    load_start = (_parse_date(start_date) - timedelta(days=7)).strftime("%Y-%m-%d")
+    cols = load_deposit_columns(db, load_start, end_date, plant)
+
+    daily = daily_series(cols.day_idx, cols.amounts, cols.n_days)
+    wow = week_over_week(daily)
+
+    # Totales por semana ISO (lunes a domingo) de los días pedidos
+    days = np.arange(np.datetime64(cols.start, "D"), np.datetime64(cols.start, "D") + cols.n_days)[7:]
+    week_start = days - ((days.astype(np.int64) - 4) % 7)  # 1970-01-05 fue lunes
+    weeks, week_idx = np.unique(week_start, return_inverse=True)
+    weekly = np.bincount(week_idx, weights=daily[7:], minlength=len(weeks))
+    weekly_wow = week_over_week(weekly, lag=1)
+
+    return {
+        "labels": _day_labels(cols.start, cols.n_days)[7:],
+        "daily_total": _to_list(daily[7:]),
+        "delta": _to_list(wow["delta"][7:]),
+        "delta_pct": _to_list(wow["pct"][7:]),
+        "weeks": [
+            {
+                "week_start": str(week),
+                "total": float(round(weekly[i], 2)),
+                "delta": None if np.isnan(weekly_wow["delta"][i]) else float(round(weekly_wow["delta"][i], 2)),
+                "delta_pct": None if np.isnan(weekly_wow["pct"][i]) else float(round(weekly_wow["pct"][i], 2))
+            }
+            for i, week in enumerate(weeks)
+        ]
+    }
+
+
+def get_reparto_variance(db: Session, start_date: str, end_date: str, plant: Optional[str] = None, top: int = 50) -> Dict:
+    """
+    Diferencia real - esperado por reparto: cantidad, suma, promedio, varianza y desvío.
+    Solo cuenta depósitos con valor esperado. Ordenado por desvío descendente.
+    """
+    cols = load_deposit_columns(db, start_date, end_date, plant)
+    diferencia = cols.amounts - cols.esperado  # NaN si no hay esperado
+    stats = grouped_stats(cols.reparto_idx, diferencia, len(cols.repartos))
+
+    order = np.argsort(-np.nan_to_num(stats["std"], nan=-1.0), kind="stable")
+    order = order[stats["count"][order] > 0][:top]
+
+    return {
+        "deposits": len(cols),
+        "deposits_with_expected": int(np.count_nonzero(~np.isnan(cols.esperado))),
+        "repartos": [
+            {
+                "idreparto": cols.repartos[i],
+                "count": int(stats["count"][i]),
+                "total_diferencia": float(round(stats["sum"][i], 2)),
+                "mean_diferencia": float(round(stats["mean"][i], 2)),
+                "variance": float(round(stats["variance"][i], 2)),
+                "std": float(round(stats["std"][i], 2))
+            }
+            for i in order
+        ]
+    }
+
+
+def get_monthly_percentiles(db: Session, start_date: str, end_date: str, plant: Optional[str] = None, q: Sequence[float] = (10, 50, 90, 95)) -> Dict:
+    """
+    Percentiles del monto de los depósitos y del total diario, por mes
+    """
+    cols = load_deposit_columns(db, start_date, end_date, plant)
+
+    days = np.datetime64(cols.start, "D") + cols.day_idx
+    months = days.astype("datetime64[M]")
+    month_labels, month_idx = np.unique(months, return_inverse=True)
+    deposit_pct = grouped_percentiles(month_idx, cols.amounts, len(month_labels), q)
+    month_counts = np.bincount(month_idx, minlength=len(month_labels))
+
+    # Totales diarios (solo días con depósitos) agrupados por mes
+    daily = daily_series(cols.day_idx, cols.amounts, cols.n_days)
+    active_days = np.flatnonzero(np.bincount(cols.day_idx, minlength=cols.n_days)[:cols.n_days])
+    active_months = (np.datetime64(cols.start, "D") + active_days).astype("datetime64[M]")
+    daily_month_idx = np.searchsorted(month_labels, active_months)
+    daily_pct = grouped_percentiles(daily_month_idx, daily[active_days], len(month_labels), q)
+
+    return {
+        "percentiles": list(q),
+        "months": [
+            {
+                "month": str(month),
+                "deposits": int(month_counts[i]),
+                "deposit_amount": dict(zip([f"p{p:g}" for p in q], _to_list(deposit_pct[i]))),
+                "daily_total": dict(zip([f"p{p:g}" for p in q], _to_list(daily_pct[i])))
+            }
+            for i, month in enumerate(month_labels)
+        ]
+    }
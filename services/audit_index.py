@@ -0,0 +1,329 @@
+"""
+Índice de consulta del log de auditoría (user_actions.log)
+
+Las acciones de usuario se escriben como líneas JSON en user_actions.log, que se
+rota por tamaño y a medianoche en segmentos comprimidos (user_actions.log.*.gz);
+los segmentos archivados antes de eso por scripts/clean_logs.py quedan en
+logs/archive. Para responder "quién modificó el depósito X el día Y" sin recorrer
+todos los archivos, este módulo indexa incrementalmente esas líneas en una base
+SQLite propia (por defecto logs/audit_index.sqlite3) con los campos de búsqueda
+(día, acción, usuario, recurso, request_id) y lo mínimo para mostrar cada entrada.
+
+Cada segmento se identifica por el hash de su primera línea, que no cambia al
+rotarlo ni al comprimirlo: así se retoma la lectura desde el último byte indexado
+y un segmento ya completo no se vuelve a leer aunque cambie de nombre.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.logging_config import logging_config
+
+AUDIT_INDEX_PATH = os.getenv("AUDIT_INDEX_PATH", str(logging_config.logs_dir / "audit_index.sqlite3"))
+# Segundos mínimos entre dos actualizaciones del índice disparadas por consultas
+AUDIT_INDEX_REFRESH_INTERVAL = float(os.getenv("AUDIT_INDEX_REFRESH_INTERVAL", "5"))
+# Días de entradas que se conservan en el índice (0 = sin límite)
+AUDIT_INDEX_RETENTION_DAYS = int(os.getenv("AUDIT_INDEX_RETENTION_DAYS", "400"))
+AUDIT_MAX_PAGE_SIZE = 500
+
+_INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_segments (
+    key TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS audit_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit_entries (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    day TEXT NOT NULL,
+    action TEXT,
+    user_id TEXT,
+    resource TEXT,
+    resource_id TEXT,
+    request_id TEXT,
+    success INTEGER,
+    ip_address TEXT,
+    message TEXT,
+    extra_data TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_audit_day_ts ON audit_entries (day, ts);
+CREATE INDEX IF NOT EXISTS ix_audit_user_ts ON audit_entries (user_id, ts);
+CREATE INDEX IF NOT EXISTS ix_audit_resource_id_ts ON audit_entries (resource_id, ts);
+CREATE INDEX IF NOT EXISTS ix_audit_action_ts ON audit_entries (action, ts);
+CREATE INDEX IF NOT EXISTS ix_audit_request_id ON audit_entries (request_id);
+"""
+
+
+def _entry_from_line(line: bytes) -> Optional[tuple]:
+    try:
+        data = json.loads(line)
+    except ValueError:
+        # Encabezados de logs truncados u otras líneas que no son JSON
+        return None
+    if not isinstance(data, dict) or "timestamp" not in data:
+        return None
+
+    ts = str(data["timestamp"])
+    success = data.get("success")
+    extra_data = data.get("extra_data")
+    return (
+        ts,
+        ts[:10],
+        data.get("action"),
+        None if data.get("user_id") is None else str(data["user_id"]),
+        data.get("resource"),
+        None if data.get("resource_id") is None else str(data["resource_id"]),
+        data.get("request_id"),
+        None if success is None else int(bool(success)),
+        data.get("ip_address"),
+        data.get("message"),
+        None if extra_data is None else json.dumps(extra_data, ensure_ascii=False, separators=(",", ":"), default=str)
+    )
+
+
+class AuditIndex:
+    """
+    Índice SQLite incremental de user_actions.log y sus segmentos rotados/archivados
+    """
+
+    def __init__(self, index_path: str = AUDIT_INDEX_PATH, log_path: Optional[Path] = None):
+        self.index_path = index_path
+        self.log_path = Path(log_path or logging_config.user_actions_log)
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._initialized = True
+        return connection
+
+    def _log_files(self) -> List[Path]:
+        """Segmentos del log de auditoría, del más viejo al más nuevo, terminando en el archivo activo"""
+        directory = self.log_path.parent
+        name = self.log_path.name
+        stem = self.log_path.stem
+        files = [p for p in directory.glob(name + ".*") if not p.name.endswith(".tmp")]
+        archive = directory / "archive"
+        if archive.is_dir():
+            files.extend(archive.glob(f"{stem}_*.log.gz"))
+        files = sorted((p for p in files if p.is_file()), key=lambda p: p.stat().st_mtime_ns)
+        if self.log_path.exists():
+            files.append(self.log_path)
+        return files
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Indexa las líneas nuevas de todos los segmentos. Devuelve la cantidad de entradas agregadas.
+        Sin force, no hace nada si la última actualización fue hace menos de AUDIT_INDEX_REFRESH_INTERVAL.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < AUDIT_INDEX_REFRESH_INTERVAL:
+                return 0
+            connection = self._connect()
+            try:
+                added = 0
+                seen = set()
+                for path in self._log_files():
+                    seen.add(str(path))
+                    added += self._index_file(connection, path, active=(path == self.log_path))
+                self._forget_missing_files(connection, seen)
+                self._apply_retention(connection)
+                connection.commit()
+            finally:
+                connection.close()
+            self._last_refresh = time.monotonic()
+            return added
+
+    def _index_file(self, connection: sqlite3.Connection, path: Path, active: bool) -> int:
+        stat = path.stat()
+        known = connection.execute(
+            "SELECT size, mtime_ns FROM audit_files WHERE path = ?", (str(path),)
+        ).fetchone()
+        if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return 0
+
+        opener = gzip.open if path.suffix == ".gz" else open
+        added = 0
+        try:
+            with opener(path, "rb") as f:
+                first_line = f.readline()
+                if not first_line.endswith(b"\n"):
+                    return 0
+                key = hashlib.sha1(first_line).hexdigest()
+                segment = connection.execute(
+                    "SELECT offset, complete FROM audit_segments WHERE key = ?", (key,)
+                ).fetchone()
+
+                if segment is None or not segment["complete"]:
+                    offset = segment["offset"] if segment is not None else 0
+                    f.seek(offset)
+                    batch = []
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            # Línea a medio escribir en el archivo activo: se indexa en la próxima pasada
+                            break
+                        offset += len(line)
+                        entry = _entry_from_line(line)
+                        if entry is not None:
+                            batch.append(entry)
+                        if len(batch) >= _INSERT_BATCH:
+                            added += self._insert(connection, batch)
+                            batch = []
+                    added += self._insert(connection, batch)
+                    connection.execute(
+                        "INSERT INTO audit_segments (key, offset, complete) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET offset = excluded.offset, complete = excluded.complete",
+                        (key, offset, 0 if active else 1)
+                    )
+        except (OSError, EOFError) as e:
+            # Segmento comprimiéndose o dañado: se reintenta en la próxima actualización
+            print(f"⚠️ No se pudo indexar {path.name}: {e}")
+            return added
+
+        connection.execute(
+            "INSERT INTO audit_files (path, size, mtime_ns) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns",
+            (str(path), stat.st_size, stat.st_mtime_ns)
+        )
+        connection.commit()
+        return added
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, batch: List[tuple]) -> int:
+        if batch:
+            connection.executemany(
+                "INSERT INTO audit_entries (ts, day, action, user_id, resource, resource_id, request_id, "
+                "success, ip_address, message, extra_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+        return len(batch)
+
+    @staticmethod
+    def _forget_missing_files(connection: sqlite3.Connection, seen: set):
+        for row in connection.execute("SELECT path FROM audit_files").fetchall():
+            if row["path"] not in seen:
+                connection.execute("DELETE FROM audit_files WHERE path = ?", (row["path"],))
+
+    @staticmethod
+    def _apply_retention(connection: sqlite3.Connection):
+        if AUDIT_INDEX_RETENTION_DAYS > 0:
+            limit = (datetime.now() - timedelta(days=AUDIT_INDEX_RETENTION_DAYS)).strftime("%Y-%m-%d")
+            connection.execute("DELETE FROM audit_entries WHERE day < ?", (limit,))
+
+    def search(
+        self,
+        user: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        action: Optional[str] = None,
+        resource: Optional[str] = None,
+        request_id: Optional[str] = None,
+        success: Optional[bool] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 50
+    ) -> Dict:
+        """
+        Busca entradas de auditoría, de la más reciente a la más antigua.
+        date_from / date_to aceptan "YYYY-MM-DD" (día completo) o un timestamp ISO.
+        """
+        self.refresh()
+
+        conditions, params = [], []
+        for column, value in (
+            ("user_id", user),
+            ("resource_id", resource_id),
+            ("action", action),
+            ("resource", resource),
+            ("request_id", request_id)
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if success is not None:
+            conditions.append("success = ?")
+            params.append(int(success))
+        if date_from:
+            conditions.append("day >= ?" if len(date_from) == 10 else "ts >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("day <= ?" if len(date_to) == 10 else "ts <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        page = max(1, page)
+        page_size = max(1, min(page_size, AUDIT_MAX_PAGE_SIZE))
+        connection = self._connect()
+        try:
+            total = connection.execute(f"SELECT COUNT(*) FROM audit_entries {where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT ts, action, user_id, resource, resource_id, request_id, success, ip_address, "
+                f"message, extra_data FROM audit_entries {where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size]
+            ).fetchall()
+        finally:
+            connection.close()
+
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": (total + page_size - 1) // page_size,
+            "items": [
+                {
+                    "timestamp": row["ts"],
+                    "action": row["action"],
+                    "user_id": row["user_id"],
+                    "resource": row["resource"],
+                    "resource_id": row["resource_id"],
+                    "request_id": row["request_id"],
+                    "success": None if row["success"] is None else bool(row["success"]),
+                    "ip_address": row["ip_address"],
+                    "message": row["message"],
+                    "extra_data": json.loads(row["extra_data"]) if row["extra_data"] else None
+                }
+                for row in rows
+            ]
+        }
+
+    def stats(self) -> Dict:
+        """Tamaño del índice y rango de fechas cubierto"""
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT COUNT(*) AS entries, MIN(day) AS first_day, MAX(day) AS last_day FROM audit_entries"
+            ).fetchone()
+            segments = connection.execute("SELECT COUNT(*) FROM audit_segments").fetchone()[0]
+        finally:
+            connection.close()
+        size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        return {
+            "entries": row["entries"],
+            "first_day": row["first_day"],
+            "last_day": row["last_day"],
+            "segments": segments,
+            "index_size_mb": round(size / (1024 * 1024), 2)
+        }
+
+
+# Instancia global
+audit_index = AuditIndex()
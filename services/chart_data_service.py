@@ -0,0 +1,95 @@
+"""
+Servicio de datos para el dashboard de gráficos
+
+Calcula el resumen de /charts/stats/summary (últimos 7 días, últimos 30 días y
+mes actual) a partir de una única lectura de daily_totals que cubre la ventana
+más amplia, y guarda el resultado en memoria durante unos segundos para que
+varias pestañas/usuarios del dashboard no repitan el trabajo.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from services.daily_totals_service import (
+    ensure_recent_data_exists,
+    query_daily_totals,
+    build_monthly_chart,
+    get_month_bounds
+)
+
+# Tiempo de vida del resumen en memoria (segundos)
+SUMMARY_CACHE_TTL = 60
+
+_cache_lock = threading.Lock()
+_summary_cache: Dict[str, tuple] = {}
+
+
+def invalidate_chart_cache():
+    """
+    Descarta los resúmenes en memoria (se llama al guardar nuevos totales diarios)
+    """
+    with _cache_lock:
+        _summary_cache.clear()
+
+
+def _filter_period(totals: List[Dict], start_date: str, end_date: str, plant: Optional[str] = None) -> List[Dict]:
+    return [
+        t for t in totals
+        if start_date <= t["date"] <= end_date and (plant is None or t["plant"] == plant)
+    ]
+
+
+def _compute_summary(now: datetime) -> Dict:
+    end_date = now.strftime("%Y-%m-%d")
+    start_date_7 = (now - timedelta(days=7)).strftime("%Y-%m-%d")
+    start_date_30 = (now - timedelta(days=30)).strftime("%Y-%m-%d")
+    month_start, month_end = get_month_bounds(now.year, now.month)
+
+    # Una sola lectura para la ventana más amplia que necesitan las tres vistas
+    window_start = min(start_date_30, month_start)
+    window_end = max(end_date, month_end)
+
+    # Los días faltantes se completan en segundo plano (no bloquea esta consulta)
+    ensure_recent_data_exists(end_date, window_start)
+    totals = query_daily_totals(window_start, window_end, "total")
+
+    last_7_days = _filter_period(totals, start_date_7, end_date)
+    last_30_days = _filter_period(totals, start_date_30, end_date)
+    current_month = _filter_period(totals, month_start, month_end)
+
+    def calculate_total(period_totals):
+        return sum(t["total_amount"] for t in period_totals)
+
+    return {
+        "last_7_days": {
+            "total": calculate_total(last_7_days),
+            "average": calculate_total(last_7_days) / 7 if last_7_days else 0,
+            "days": len(last_7_days)
+        },
+        "last_30_days": {
+            "total": calculate_total(last_30_days),
+            "average": calculate_total(last_30_days) / 30 if last_30_days else 0,
+            "days": len(last_30_days)
+        },
+        "current_month": build_monthly_chart(current_month, "total")
+    }
+
+
+def get_summary_stats_data(ttl: int = SUMMARY_CACHE_TTL) -> Dict:
+    """
+    Resumen de estadísticas del dashboard, cacheado en memoria durante `ttl` segundos.
+    El cálculo se hace bajo lock para que solicitudes simultáneas compartan una sola lectura.
+    """
+    now = datetime.now()
+    cache_key = now.strftime("%Y-%m-%d")
+
+    with _cache_lock:
+        cached = _summary_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        summary = _compute_summary(now)
+        _summary_cache.clear()
+        _summary_cache[cache_key] = (time.monotonic(), summary)
+        return summary
@@ -0,0 +1,352 @@
+"""
+Backfill de totales diarios (DailyTotal)
+
+Busca los días de un rango que no tienen fila 'total' en daily_totals y los
+completa consultando miniBank con concurrencia acotada y límite de
+solicitudes por segundo. El avance se guarda en un checkpoint JSON para
+poder retomar después de una falla, y el estado del trabajo en curso se
+puede consultar con `get_backfill_status()`.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import SessionLocal
+from models.daily_totals import DailyTotal
+
+# Archivo de checkpoint (se puede cambiar con la variable de entorno)
+CHECKPOINT_FILE = os.getenv(
+    "DAILY_TOTALS_BACKFILL_CHECKPOINT",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "daily_totals_backfill.json")
+)
+
+DEFAULT_MAX_WORKERS = 2          # Consultas simultáneas a miniBank
+DEFAULT_REQUESTS_PER_SECOND = 1.0  # Días iniciados por segundo
+DEFAULT_MAX_RETRIES = 3
+MAX_RANGE_DAYS = 366
+AUTO_SCHEDULE_COOLDOWN_SECONDS = 300  # Espera mínima entre backfills disparados por consultas
+
+_job_lock = threading.Lock()
+_current_job: Optional["DailyTotalsBackfill"] = None
+_last_job: Optional["DailyTotalsBackfill"] = None
+_last_auto_schedule = 0.0
+
+
+def _daterange(start_date: str, end_date: str) -> List[str]:
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    days = []
+    while start <= end:
+        days.append(start.strftime("%Y-%m-%d"))
+        start += timedelta(days=1)
+    return days
+
+
+def find_missing_dates(start_date: str, end_date: str) -> List[str]:
+    """
+    Devuelve los días del rango (sin incluir fechas futuras) que no tienen total general guardado
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    end_date = min(end_date, today)
+    if start_date > end_date:
+        return []
+
+    db = SessionLocal()
+    try:
+        existing = {
+            row.date for row in db.query(DailyTotal.date).filter(
+                DailyTotal.date >= start_date,
+                DailyTotal.date <= end_date,
+                DailyTotal.plant == "total"
+            ).all()
+        }
+    finally:
+        db.close()
+
+    return [d for d in _daterange(start_date, end_date) if d not in existing]
+
+
+class _RateLimiter:
+    """Espacia el inicio de las consultas para no superar N por segundo"""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_allowed = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_allowed - now
+            self._next_allowed = max(now, self._next_allowed) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class DailyTotalsBackfill:
+    """
+    Trabajo de backfill para un rango de fechas
+    """
+
+    def __init__(
+        self,
+        start_date: str,
+        end_date: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        checkpoint_file: str = CHECKPOINT_FILE,
+        resume: bool = True
+    ):
+        if len(_daterange(start_date, end_date)) > MAX_RANGE_DAYS:
+            raise ValueError(f"El rango no puede superar {MAX_RANGE_DAYS} días")
+
+        self.start_date = start_date
+        self.end_date = end_date
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = _RateLimiter(requests_per_second)
+        self.max_retries = max(1, max_retries)
+        self.checkpoint_file = checkpoint_file
+        self.resume = resume
+
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.status = "pending"
+        self.pending: List[str] = []
+        self.completed: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.in_progress: List[str] = []
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+
+    # ---------- Checkpoint ----------
+
+    def _load_checkpoint(self) -> Dict:
+        if not self.resume or not os.path.exists(self.checkpoint_file):
+            return {}
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("start_date") == self.start_date and checkpoint.get("end_date") == self.end_date:
+                return checkpoint
+        except Exception as e:
+            print(f"⚠️ No se pudo leer el checkpoint de backfill: {e}")
+        return {}
+
+    def _save_checkpoint(self):
+        with self._lock:
+            checkpoint = {
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "completed": sorted(self.completed),
+                "failed": dict(self.failed),
+                "updated_at": datetime.now().isoformat()
+            }
+        with self._checkpoint_lock:
+            os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+            tmp_file = f"{self.checkpoint_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, indent=2)
+            os.replace(tmp_file, self.checkpoint_file)
+
+    # ---------- Ejecución ----------
+
+    def _process_date(self, date: str):
+        from services.deposits_service import get_all_totals
+        from services.daily_totals_service import save_daily_totals_from_data
+
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            if self._stop.is_set():
+                raise RuntimeError("Backfill cancelado")
+            self.rate_limiter.wait()
+            try:
+                totals = get_all_totals(date, save=False)
+                result = save_daily_totals_from_data(date, totals)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                if result.get("errors"):
+                    raise RuntimeError("; ".join(result["errors"]))
+                return result
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries:
+                    delay = 2 ** attempt
+                    print(f"⚠️ Backfill {date}: intento {attempt}/{self.max_retries} falló ({e}), reintentando en {delay}s")
+                    time.sleep(delay)
+        raise last_error
+
+    def run(self) -> Dict:
+        """
+        Ejecuta el backfill de forma bloqueante y devuelve el estado final
+        """
+        self.started_at = datetime.now()
+        self.status = "running"
+        try:
+            checkpoint = self._load_checkpoint()
+            already_done = set(checkpoint.get("completed", []))
+
+            missing = find_missing_dates(self.start_date, self.end_date)
+            with self._lock:
+                self.completed = sorted(already_done)
+                self.pending = [d for d in missing if d not in already_done]
+
+            print(f"🔄 Backfill {self.start_date} → {self.end_date}: {len(self.pending)} días faltantes")
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="daily-totals-backfill") as executor:
+                futures = {}
+                for date in list(self.pending):
+                    futures[executor.submit(self._run_one, date)] = date
+                for future in as_completed(futures):
+                    future.result()
+
+            self.status = "cancelled" if self._stop.is_set() else ("completed_with_errors" if self.failed else "completed")
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            print(f"❌ Error en backfill de totales diarios: {e}")
+        finally:
+            self.finished_at = datetime.now()
+            try:
+                self._save_checkpoint()
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar el checkpoint de backfill: {e}")
+
+        print(f"✅ Backfill finalizado ({self.status}): {len(self.completed)} completados, {len(self.failed)} con error")
+        return self.get_status()
+
+    def _run_one(self, date: str):
+        if self._stop.is_set():
+            return
+        with self._lock:
+            self.in_progress.append(date)
+        try:
+            self._process_date(date)
+            with self._lock:
+                self.completed.append(date)
+                self.failed.pop(date, None)
+                self.pending.remove(date)
+            progress = self.progress()
+            print(f"📊 Backfill {date} guardado ({progress['done']}/{progress['total']})")
+        except Exception as e:
+            with self._lock:
+                self.failed[date] = str(e)
+                self.pending.remove(date)
+            print(f"❌ Backfill {date} falló: {e}")
+        finally:
+            with self._lock:
+                self.in_progress.remove(date)
+            self._save_checkpoint()
+
+    def cancel(self):
+        self._stop.set()
+
+    # ---------- Estado ----------
+
+    def progress(self) -> Dict:
+        with self._lock:
+            done = len(self.completed)
+            failed = len(self.failed)
+            total = done + failed + len(self.pending)
+        return {"done": done, "failed": failed, "total": total}
+
+    def get_status(self) -> Dict:
+        progress = self.progress()
+        eta_seconds = None
+        if self.status == "running" and self.started_at and progress["done"]:
+            elapsed = (datetime.now() - self.started_at).total_seconds()
+            remaining = progress["total"] - progress["done"] - progress["failed"]
+            eta_seconds = round(elapsed / progress["done"] * remaining, 1)
+
+        with self._lock:
+            return {
+                "status": self.status,
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "progress": progress,
+                "percent": round(100 * (progress["done"] + progress["failed"]) / progress["total"], 1) if progress["total"] else 100.0,
+                "in_progress": list(self.in_progress),
+                "failed_dates": dict(self.failed),
+                "eta_seconds": eta_seconds,
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "error": self.error
+            }
+
+
+def start_backfill(start_date: str, end_date: str, **kwargs) -> Dict:
+    """
+    Inicia un backfill en segundo plano. Si ya hay uno en curso no inicia otro.
+
+    Returns:
+        {"started": bool, "status": estado del trabajo en curso}
+    """
+    global _current_job, _last_job
+
+    with _job_lock:
+        if _current_job is not None and _current_job.status in ("pending", "running"):
+            return {"started": False, "status": _current_job.get_status()}
+
+        job = DailyTotalsBackfill(start_date, end_date, **kwargs)
+        _current_job = job
+
+    def _run():
+        global _current_job, _last_job
+        try:
+            job.run()
+        finally:
+            with _job_lock:
+                _last_job = job
+                if _current_job is job:
+                    _current_job = None
+
+    threading.Thread(target=_run, name="daily-totals-backfill", daemon=True).start()
+    return {"started": True, "status": job.get_status()}
+
+
+def schedule_missing_dates(start_date: str, end_date: str) -> bool:
+    """
+    Si faltan días en el rango, programa su backfill en segundo plano sin bloquear al llamador.
+    Para no reintentar contra miniBank en cada consulta mientras no responde, entre dos
+    programaciones automáticas se espera AUTO_SCHEDULE_COOLDOWN_SECONDS.
+    """
+    global _last_auto_schedule
+
+    try:
+        if time.monotonic() - _last_auto_schedule < AUTO_SCHEDULE_COOLDOWN_SECONDS and _last_auto_schedule:
+            return False
+        if not find_missing_dates(start_date, end_date):
+            return False
+        started = start_backfill(start_date, end_date)["started"]
+        if started:
+            _last_auto_schedule = time.monotonic()
+        return started
+    except Exception as e:
+        print(f"⚠️ No se pudo programar el backfill de {start_date} a {end_date}: {e}")
+        return False
+
+
+def get_backfill_status() -> Dict:
+    """
+    Estado del backfill en curso (o del último ejecutado)
+    """
+    with _job_lock:
+        job = _current_job or _last_job
+    if job is None:
+        return {"status": "idle"}
+    return job.get_status()
+
+
+def cancel_backfill() -> bool:
+    with _job_lock:
+        job = _current_job
+    if job is None:
+        return False
+    job.cancel()
+    return True
@@ -1,7 +1,8 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from database import get_db
 from models.daily_totals import DailyTotal
-from services.deposits_service import get_all_totals, get_all_deposits
+from services.deposits_service import get_all_totals
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import time
@@ -24,119 +25,46 @@ def execute_with_retry(func, max_retries=2, base_delay=0.05):
             else:
                 raise e
     
+def _insert_daily_total(db: Session, date: str, plant: str, machine: Optional[str]) -> DailyTotal:
+    """
+    Inserta la fila (fecha, planta, máquina) dentro de un savepoint. Si otra transacción
+    la insertó al mismo tiempo (el backfill y una request guardando el mismo día), se
+    devuelve esa fila para actualizarla en lugar de perder todo el lote
+    """
+    row = DailyTotal(date=date, plant=plant, machine=machine)
+    try:
+        with db.begin_nested():
+            db.add(row)
+    except IntegrityError:
+        row = db.query(DailyTotal).filter_by(date=date, plant=plant, machine=machine).one()
+    return row
+
 def save_daily_totals(date: str) -> Dict:
     """
     Guarda los totales del día especificado en la base de datos
     """
-    def _save_operation():
-        db = next(get_db())
-        
-        try:
-            # Obtener los totales del día
-            totals_data = get_all_totals(date)
-            
-            # Limpiar totales existentes para esta fecha
-            db.query(DailyTotal).filter(DailyTotal.date == date).delete()
-            
-            results = {
-                "date": date,
-                "saved_totals": [],
-                "errors": []
-            }
-            
-            # Procesar datos por planta
-            plantas_config = {
-                'jumillano': ['L-EJU-001', 'L-EJU-002'],
-                'plata': ['L-EJU-003'],
-                'nafa': ['L-EJU-004']
-            }
-            
-            total_general = 0.0
-            total_deposits = 0
-            
-            for plant_name, machines in plantas_config.items():
-                plant_total = 0.0
-                plant_deposits = 0
-                
-                # Guardar totales por máquina
-                for machine in machines:
-                    if machine in totals_data and "error" not in totals_data[machine]:
-                        machine_data = totals_data[machine]
-                        amount = float(machine_data.get("total", 0))
-                        count = int(machine_data.get("count", 0))
-                        
-                        # Guardar total por máquina
-                        daily_total = DailyTotal(
-                            date=date,
-                            plant=plant_name,
-                            machine=machine,
-                            total_amount=amount,
-                            deposit_count=count
-                        )
-                        db.add(daily_total)
-                        
-                        plant_total += amount
-                        plant_deposits += count
-                        
-                        results["saved_totals"].append({
-                            "plant": plant_name,
-                            "machine": machine,
-                            "amount": amount,
-                            "count": count
-                        })
-                    else:
-                        results["errors"].append(f"No data for machine {machine}")
-                
-                # Guardar total por planta
-                if plant_total > 0:
-                    plant_daily_total = DailyTotal(
-                        date=date,
-                        plant=plant_name,
-                        machine=None,  # Total por planta
-                        total_amount=plant_total,
-                        deposit_count=plant_deposits
-                    )
-                    db.add(plant_daily_total)
-                    
-                    total_general += plant_total
-                    total_deposits += plant_deposits
-            
-            # Guardar total general
-            general_total = DailyTotal(
-                date=date,
-                plant="total",
-                machine=None,
-                total_amount=total_general,
-                deposit_count=total_deposits
-            )
-            db.add(general_total)
-            
-            db.commit()
-            
-            results["total_amount"] = total_general
-            results["total_deposits"] = total_deposits
-            
-            return results
-            
-        except Exception as e:
-            db.rollback()
-            raise e
-        finally:
-            db.close()
-    
     try:
-        return execute_with_retry(_save_operation)
+        # Una sola consulta a miniBank; el guardado se hace abajo con los datos calculados
+        totals_data = get_all_totals(date, save=False)
     except Exception as e:
         print(f"Error en save_daily_totals: {e}")
         return {"error": str(e), "date": date}
+    
+    return save_daily_totals_from_data(date, totals_data)
 
 def get_daily_totals_by_period(start_date: str, end_date: str, plant: Optional[str] = None) -> List[Dict]:
     """
     Obtiene los totales diarios para un período específico, consultando automáticamente datos faltantes
     """
-    # Asegurar que los datos recientes existan
-    ensure_recent_data_exists(end_date)
+    # Programar el backfill de los días faltantes del período
+    ensure_recent_data_exists(end_date, start_date)
     
+    return query_daily_totals(start_date, end_date, plant)
+
+def query_daily_totals(start_date: str, end_date: str, plant: Optional[str] = None) -> List[Dict]:
+    """
+    Lee de la base los totales por planta/generales del período (sin verificar datos faltantes)
+    """
     db = next(get_db())
     
     try:
@@ -166,42 +94,22 @@ def get_daily_totals_by_period(start_date: str, end_date: str, plant: Optional[s
     finally:
         db.close()
 
-def ensure_recent_data_exists(end_date: str = None) -> None:
+def ensure_recent_data_exists(end_date: str = None, start_date: str = None) -> None:
     """
-    Asegura que existan datos hasta la fecha especificada, consultando automáticamente solo si es necesario
+    Asegura que existan datos para el período solicitado. Los días faltantes se completan
+    con un backfill en segundo plano (ver services/daily_totals_backfill.py), así la
+    consulta no espera a miniBank.
     """
     if not end_date:
         end_date = datetime.now().strftime("%Y-%m-%d")
+    if not start_date:
+        start_date = end_date
     
     try:
-        from services.deposits_service import get_all_totals
+        from services.daily_totals_backfill import schedule_missing_dates
         
-        # Solo verificar la fecha específica solicitada, no un rango
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d")
-        today = datetime.now().date()
-        
-        # No consultar fechas futuras
-        if end_date_obj.date() > today:
-            return
-        
-        db = next(get_db())
-        
-        try:
-            # Solo verificar si ya existe data para la fecha específica
-            existing = db.query(DailyTotal).filter(
-                DailyTotal.date == end_date,
-                DailyTotal.plant == "total"
-            ).first()
-            
-            if not existing:
-                print(f"🔄 Consultando datos faltantes para {end_date}...")
-                try:
-                    # Esto disparará el guardado automático
-                    get_all_totals(end_date)
-                except Exception as e:
-                    print(f"⚠️ Error al consultar {end_date}: {e}")
-        finally:
-            db.close()
+        if schedule_missing_dates(start_date, end_date):
+            print(f"🔄 Backfill programado para días faltantes entre {start_date} y {end_date}")
         
     except Exception as e:
         print(f"⚠️ Error al verificar datos: {e}")
@@ -214,19 +122,29 @@ def get_monthly_chart_data(year: int, month: int, plant: Optional[str] = None) -
     ensure_recent_data_exists()
     
     # Calcular primer y último día del mes
-    start_date = f"{year}-{month:02d}-01"
+    start_date, last_day = get_month_bounds(year, month)
+    
+    totals = get_daily_totals_by_period(start_date, last_day, plant)
     
-    # Último día del mes
+    return build_monthly_chart(totals, plant)
+
+def get_month_bounds(year: int, month: int):
+    """
+    Devuelve (primer_dia, ultimo_dia) del mes en formato YYYY-MM-DD
+    """
+    start_date = f"{year}-{month:02d}-01"
     if month == 12:
         next_month = f"{year + 1}-01-01"
     else:
         next_month = f"{year}-{month + 1:02d}-01"
-    
     next_month_date = datetime.strptime(next_month, "%Y-%m-%d")
     last_day = (next_month_date - timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    totals = get_daily_totals_by_period(start_date, last_day, plant)
-    
+    return start_date, last_day
+
+def build_monthly_chart(totals: List[Dict], plant: Optional[str] = None) -> Dict:
+    """
+    Da formato Chart.js a una lista de totales diarios (ver query_daily_totals)
+    """
     # Organizar datos por fecha
     chart_data = {
         "labels": [],  # Fechas
@@ -301,76 +219,72 @@ def auto_save_today_totals() -> Dict:
 
 def save_daily_totals_from_data(date: str, totals_data: Dict) -> Dict:
     """
-    Guarda los totales del día a partir de datos ya calculados (más eficiente)
+    Guarda los totales del día a partir de datos ya calculados (ver get_all_totals).
+    
+    Escribe una fila por máquina, una por planta y una general con montos y cantidades
+    exactas, actualizando las filas existentes de (fecha, planta, máquina) en lugar de
+    borrarlas y volver a insertarlas. Si una máquina devolvió error se conservan los
+    valores guardados previamente para esa máquina y su planta.
     """
     def _save_operation():
         db = next(get_db())
         
         try:
-            # Limpiar totales existentes para esta fecha
-            db.query(DailyTotal).filter(DailyTotal.date == date).delete()
+            existing_rows = {
+                (row.plant, row.machine): row
+                for row in db.query(DailyTotal).filter(DailyTotal.date == date).all()
+            }
             
             results = {
                 "date": date,
                 "saved_totals": [],
+                "errors": [],
                 "method": "from_calculated_data"
             }
             
-            # Usar los totales ya calculados en lugar de hacer nuevas consultas
-            plantas_totals = {
-                'jumillano': totals_data.get('jumillano_total', 0),
-                'plata': totals_data.get('plata_total', 0),
-                'nafa': totals_data.get('nafa_total', 0)
-            }
+            def upsert(plant, machine, amount, count):
+                row = existing_rows.get((plant, machine))
+                if row is None:
+                    row = existing_rows[(plant, machine)] = _insert_daily_total(db, date, plant, machine)
+                row.total_amount = amount
+                row.deposit_count = count
+                results["saved_totals"].append({
+                    "plant": plant,
+                    "machine": machine,
+                    "amount": amount,
+                    "count": count
+                })
             
-            # Configuración de plantas y máquinas
-            plantas_config = {
-                'jumillano': ['L-EJU-001', 'L-EJU-002'],
-                'plata': ['L-EJU-003'],
-                'nafa': ['L-EJU-004']
-            }
+            # Totales por máquina
+            machines = totals_data.get("machines", {})
+            for machine, machine_data in machines.items():
+                if "error" in machine_data:
+                    results["errors"].append(f"{machine}: {machine_data['error']}")
+                    continue
+                upsert(machine_data["plant"], machine, machine_data["total"], machine_data["count"])
             
-            # Guardar totales por planta (sin desglose por máquina para ser más rápido)
-            total_deposits_global = 0
-            for plant_name, machines in plantas_config.items():
-                plant_total = plantas_totals.get(plant_name, 0)
-                
-                if plant_total > 0:
-                    # Estimamos el número de depósitos basado en el promedio
-                    estimated_deposits = max(1, int(plant_total / 1000))  # Estimación aproximada
-                    
-                    # Guardar total por planta
-                    plant_daily_total = DailyTotal(
-                        date=date,
-                        plant=plant_name,
-                        machine=None,  # Total por planta
-                        total_amount=plant_total,
-                        deposit_count=estimated_deposits
-                    )
-                    db.add(plant_daily_total)
-                    
-                    total_deposits_global += estimated_deposits
-                    
-                    results["saved_totals"].append({
-                        "plant": plant_name,
-                        "amount": plant_total,
-                        "count": estimated_deposits
-                    })
+            # Totales por planta (solo si todas sus máquinas respondieron)
+            plants = totals_data.get("plants", {})
+            complete = True
+            for plant_name, plant_data in plants.items():
+                if not plant_data.get("complete", True):
+                    complete = False
+                    continue
+                upsert(plant_name, None, plant_data["total"], plant_data["count"])
             
-            # Guardar total general
-            general_total = DailyTotal(
-                date=date,
-                plant="total",
-                machine=None,
-                total_amount=totals_data["grand_total"],
-                deposit_count=total_deposits_global
-            )
-            db.add(general_total)
+            # Total general
+            if complete:
+                upsert("total", None, totals_data["grand_total"], totals_data.get("deposit_count", 0))
+            else:
+                results["errors"].append("Total general no actualizado: hay máquinas sin datos")
             
             db.commit()
             
+            from services.chart_data_service import invalidate_chart_cache
+            invalidate_chart_cache()
+            
             results["total_amount"] = totals_data["grand_total"]
-            results["total_deposits"] = total_deposits_global
+            results["total_deposits"] = totals_data.get("deposit_count", 0)
             
             return results
             
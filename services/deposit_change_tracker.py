@@ -0,0 +1,208 @@
+"""
+Seguimiento de cambios sobre depósitos, cheques y retenciones
+
+Cada sesión de SQLAlchemy acumula qué depósitos (y de qué días) fueron
+modificados. Justo antes del commit se ejecutan los manejadores registrados
+con `on_before_commit` (dentro de la misma transacción, para mantener datos
+derivados consistentes) y, una vez confirmado el commit, los registrados con
+`on_after_commit`.
+
+Los cambios hechos con el ORM se detectan solos. Las operaciones masivas con
+SQL Core (insert/update sin objetos) deben avisar con `mark_deposits_changed`.
+"""
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from utils.logging_utils import log_technical_error
+
+_CHANGES_KEY = "deposit_changes"
+_RUNNING_KEY = "deposit_changes_running"
+
+# Tamaño de lote para resolver fechas con IN (...) sin superar límites de parámetros
+_IN_CHUNK_SIZE = 500
+
+_before_commit_handlers: List[Callable] = []
+_after_commit_handlers: List[Callable] = []
+
+
+class DepositChanges:
+    """
+    Cambios acumulados en una sesión hasta el próximo commit
+    """
+
+    def __init__(self):
+        self.deposit_ids: Set[str] = set()
+        self.fechas: Set[date] = set()
+        self.fechas_por_deposito: Dict[str, date] = {}
+        # Depósitos dados de alta en la transacción
+        self.nuevos: Set[str] = set()
+        # Filas borradas con el ORM: (tabla, clave, deposit_id)
+        self.eliminados: List[Tuple[str, str, str]] = []
+        # Datos que los manejadores before_commit dejan para los after_commit
+        self.extras: Dict[str, object] = {}
+
+    def is_empty(self) -> bool:
+        return not self.deposit_ids and not self.fechas
+
+    def add_deposit(self, deposit_id: Optional[str], fecha=None):
+        if deposit_id:
+            self.deposit_ids.add(deposit_id)
+        fecha = _as_date(fecha)
+        if fecha:
+            self.fechas.add(fecha)
+            if deposit_id:
+                self.fechas_por_deposito[deposit_id] = fecha
+
+    def __repr__(self):
+        return f"<DepositChanges(deposits={len(self.deposit_ids)}, fechas={sorted(self.fechas)})>"
+
+
+def _as_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return None
+
+
+def _get_changes(session: Session) -> DepositChanges:
+    changes = session.info.get(_CHANGES_KEY)
+    if changes is None:
+        changes = DepositChanges()
+        session.info[_CHANGES_KEY] = changes
+    return changes
+
+
+def on_before_commit(handler: Callable):
+    """
+    Registra un manejador `handler(session, changes)` que corre antes del commit,
+    dentro de la transacción. Si falla, el commit no se realiza.
+    """
+    _before_commit_handlers.append(handler)
+    return handler
+
+
+def on_after_commit(handler: Callable):
+    """
+    Registra un manejador `handler(session, changes)` que corre después de un commit
+    exitoso. Sus errores se registran pero no afectan a la operación ya confirmada.
+    """
+    _after_commit_handlers.append(handler)
+    return handler
+
+
+def mark_deposits_changed(session: Session, deposit_ids: Iterable[str] = (), fechas: Iterable = ()):
+    """
+    Marca depósitos y/o días como modificados para operaciones que no pasan por el ORM
+    (insert/update masivos con SQL Core). `fechas` acepta date, datetime o 'YYYY-MM-DD'.
+    """
+    changes = _get_changes(session)
+    for deposit_id in deposit_ids:
+        changes.add_deposit(deposit_id)
+    for fecha in fechas:
+        changes.add_deposit(None, fecha)
+
+
+# Cargar el valor anterior al reasignar estos atributos, aunque estuvieran expirados,
+# para poder marcar también el día / depósito de origen
+@event.listens_for(Deposit.date_time, "set", active_history=True)
+@event.listens_for(Cheque.deposit_id, "set", active_history=True)
+@event.listens_for(Retencion.deposit_id, "set", active_history=True)
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def _old_values(obj, attribute: str) -> list:
+    """Valores anteriores de un atributo modificado (si los hay)"""
+    history = inspect(obj).attrs[attribute].history
+    return [value for value in (history.deleted or ()) if value is not None]
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changes(session, flush_context, instances):
+    changes = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, (Deposit, Cheque, Retencion)):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if changes is None:
+            changes = _get_changes(session)
+
+        if isinstance(obj, Deposit):
+            changes.add_deposit(obj.deposit_id, obj.date_time)
+            if obj in session.new and obj.deposit_id:
+                changes.nuevos.add(obj.deposit_id)
+            if obj in session.deleted:
+                changes.eliminados.append((Deposit.__tablename__, obj.deposit_id, obj.deposit_id))
+            for fecha_anterior in _old_values(obj, "date_time"):
+                changes.add_deposit(None, fecha_anterior)
+        else:
+            changes.add_deposit(obj.deposit_id)
+            if obj in session.deleted and obj.id is not None:
+                changes.eliminados.append((obj.__tablename__, str(obj.id), obj.deposit_id))
+            for deposit_id_anterior in _old_values(obj, "deposit_id"):
+                changes.add_deposit(deposit_id_anterior)
+
+
+def _resolve_fechas(session: Session, changes: DepositChanges):
+    """Completa los días afectados de los depósitos cuyo día aún no se conoce"""
+    pendientes = [d for d in changes.deposit_ids if d not in changes.fechas_por_deposito]
+    for i in range(0, len(pendientes), _IN_CHUNK_SIZE):
+        chunk = pendientes[i:i + _IN_CHUNK_SIZE]
+        rows = session.query(Deposit.deposit_id, Deposit.date_time).filter(
+            Deposit.deposit_id.in_(chunk)
+        ).all()
+        for deposit_id, date_time in rows:
+            changes.add_deposit(deposit_id, date_time)
+
+
+@event.listens_for(Session, "before_commit")
+def _run_before_commit(session):
+    if session.info.get(_RUNNING_KEY):
+        return
+    if not _before_commit_handlers and not _after_commit_handlers:
+        return
+
+    # Volcar cambios pendientes para que before_flush los registre
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+
+    changes = session.info.get(_CHANGES_KEY)
+    if changes is None or changes.is_empty():
+        return
+
+    session.info[_RUNNING_KEY] = True
+    try:
+        _resolve_fechas(session, changes)
+        for handler in _before_commit_handlers:
+            handler(session, changes)
+        if session.new or session.dirty or session.deleted:
+            session.flush()
+    finally:
+        session.info.pop(_RUNNING_KEY, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    changes = session.info.pop(_CHANGES_KEY, None)
+    if changes is None or changes.is_empty():
+        return
+    for handler in _after_commit_handlers:
+        try:
+            handler(session, changes)
+        except Exception as e:
+            log_technical_error(e, "deposit_change_tracker_after_commit", extra_data={"changes": repr(changes)})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_CHANGES_KEY, None)
+    session.info.pop(_RUNNING_KEY, None)
@@ -0,0 +1,107 @@
+"""
+Eventos de cambios de depósitos para el feed SSE (/api/events)
+
+Cualquier transacción que toque depósitos, cheques o retenciones (endpoints de
+depósitos, cheques/retenciones, cierre de repartos, sincronizaciones) pasa por
+el seguimiento de cambios. Antes del commit, y ya con el semáforo recalculado,
+se toma una foto de los depósitos afectados; después del commit se publica un
+evento `deposits` por día con esos deltas. Si la transacción no se confirma,
+no se publica nada.
+"""
+import os
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models.deposit import Deposit, calcular_semaforo_docs
+from services.deposits_service import get_planta_from_identifier
+from services.deposit_change_tracker import on_before_commit, on_after_commit
+from services.event_broker import event_broker, EVENT_RESYNC
+# Semáforo y row_version se actualizan en sus propios before_commit: deben registrarse antes que la foto
+import services.semaforo_service  # noqa: F401
+import services.row_version_service  # noqa: F401
+
+EVENT_DEPOSITS = "deposits"
+
+# Por encima de esta cantidad de depósitos en un commit se pide recargar en lugar de enviar deltas
+EVENTS_MAX_DEPOSITS = int(os.getenv("EVENTS_MAX_DEPOSITS", "500"))
+
+_SNAPSHOT_KEY = "deposit_events"
+
+# Tamaño de lote para IN (...) sin superar límites de parámetros
+_IN_CHUNK_SIZE = 500
+
+
+def _deposit_delta(row, nuevos) -> dict:
+    diferencia = row.total_amount - row.deposit_esperado if row.deposit_esperado is not None else 0
+    return {
+        "deposit_id": row.deposit_id,
+        "row_version": row.row_version,
+        "nuevo": row.deposit_id in nuevos,
+        "identifier": row.identifier,
+        "plant": get_planta_from_identifier(row.identifier or ""),
+        "user_name": row.user_name,
+        "idreparto": row.idreparto,
+        "date_time": row.date_time.isoformat() if row.date_time else None,
+        "total_amount": row.total_amount,
+        "deposit_esperado": row.deposit_esperado,
+        "efectivo_esperado": row.efectivo_esperado,
+        "composicion_esperado": row.composicion_esperado,
+        "diferencia": diferencia,
+        "tiene_diferencia": row.deposit_esperado is not None and diferencia != 0,
+        "estado": row.estado.value if row.estado else "PENDIENTE",
+        "fecha_envio": row.fecha_envio.isoformat() if row.fecha_envio else None,
+        "total_cheques": row.cheques_count,
+        "total_retenciones": row.retenciones_count,
+        "semaforo_docs": calcular_semaforo_docs(
+            row.composicion_esperado, row.cheques_count, row.retenciones_count, row.semaforo
+        )
+    }
+
+
+@on_before_commit
+def _snapshot_deposits_on_commit(session: Session, changes):
+    """Foto de los depósitos tocados, agrupada por día, para publicar tras el commit"""
+    if len(changes.deposit_ids) > EVENTS_MAX_DEPOSITS:
+        # Cambio masivo (sincronización, reconstrucción): los clientes recargan el día
+        changes.extras[_SNAPSHOT_KEY] = {
+            fecha.strftime("%Y-%m-%d"): None for fecha in changes.fechas
+        }
+        return
+
+    por_dia = defaultdict(lambda: {"deposits": [], "eliminados": []})
+    encontrados = set()
+    ids = sorted(changes.deposit_ids)
+    for i in range(0, len(ids), _IN_CHUNK_SIZE):
+        chunk = ids[i:i + _IN_CHUNK_SIZE]
+        rows = session.execute(
+            select(
+                Deposit.deposit_id, Deposit.identifier, Deposit.user_name, Deposit.idreparto,
+                Deposit.date_time, Deposit.total_amount, Deposit.deposit_esperado,
+                Deposit.efectivo_esperado, Deposit.composicion_esperado, Deposit.estado,
+                Deposit.fecha_envio, Deposit.cheques_count, Deposit.retenciones_count, Deposit.semaforo,
+                Deposit.row_version
+            ).where(Deposit.deposit_id.in_(chunk))
+        ).all()
+        for row in rows:
+            encontrados.add(row.deposit_id)
+            if row.date_time is not None:
+                por_dia[row.date_time.strftime("%Y-%m-%d")]["deposits"].append(_deposit_delta(row, changes.nuevos))
+
+    for deposit_id in changes.deposit_ids - encontrados:
+        fecha = changes.fechas_por_deposito.get(deposit_id)
+        if fecha is not None:
+            por_dia[fecha.strftime("%Y-%m-%d")]["eliminados"].append(deposit_id)
+
+    changes.extras[_SNAPSHOT_KEY] = dict(por_dia)
+
+
+@on_after_commit
+def _publish_deposits_on_commit(session: Session, changes):
+    por_dia = changes.extras.get(_SNAPSHOT_KEY)
+    if not por_dia:
+        return
+    for fecha, delta in sorted(por_dia.items()):
+        if delta is None:
+            event_broker.publish(EVENT_RESYNC, fecha, {"reason": "bulk", "count": len(changes.deposit_ids)})
+        elif delta["deposits"] or delta["eliminados"]:
+            event_broker.publish(EVENT_DEPOSITS, fecha, delta)
@@ -14,6 +14,22 @@ BASE_URL = "https://pimsapi.minibank.com.ar/"
 USER = "admin"
 PASSWORD = "password123"
 
+# Máquinas asignadas a cada planta
+PLANTAS_MAQUINAS = {
+    "jumillano": ["L-EJU-001", "L-EJU-002"],
+    "plata": ["L-EJU-003"],
+    "nafa": ["L-EJU-004"]
+}
+
+def get_planta_from_identifier(identifier: str) -> str:
+    """
+    Devuelve la planta a la que pertenece una máquina ('desconocida' si no está mapeada)
+    """
+    for planta, maquinas in PLANTAS_MAQUINAS.items():
+        if identifier in maquinas:
+            return planta
+    return "desconocida"
+
 def get_deposits(stIdentifier: str, date: str):
     # Intentar varios formatos de fecha
     formatted_date = None
@@ -75,46 +91,89 @@ def get_deposits_for_machines(identifiers: list[str], date: str):
     return results
 
 def get_jumillano_deposits(date: str):
-    return get_deposits_for_machines(["L-EJU-001", "L-EJU-002"], date)
+    return get_deposits_for_machines(PLANTAS_MAQUINAS["jumillano"], date)
 
 def get_plata_deposits(date: str):
-    return get_deposits_for_machines(["L-EJU-003"], date)
+    return get_deposits_for_machines(PLANTAS_MAQUINAS["plata"], date)
 
 def get_nafa_deposits(date: str):
-    return get_deposits_for_machines(["L-EJU-004"], date)
+    return get_deposits_for_machines(PLANTAS_MAQUINAS["nafa"], date)
 
 def get_all_deposits(date: str):
-    identifiers = ["L-EJU-001", "L-EJU-002", "L-EJU-003", "L-EJU-004"]
+    identifiers = [maquina for maquinas in PLANTAS_MAQUINAS.values() for maquina in maquinas]
     return get_deposits_for_machines(identifiers, date)
 
 
+def _iter_deposit_dtos(contenido):
+    """
+    Devuelve la lista de WSDepositsByDayDTO de la respuesta de una máquina
+    """
+    array_deposits = contenido.get("ArrayOfWSDepositsByDayDTO") or {}
+    deposits = array_deposits.get("WSDepositsByDayDTO") or []
+    if isinstance(deposits, dict):
+        deposits = [deposits]
+    return deposits
+
+
+def build_deposits_totals(deposits_data):
+    """
+    Recorre una única vez la respuesta de miniBank y calcula totales y cantidades
+    exactas por máquina, por planta y generales.
+
+    Retorna:
+        {
+            "machines": {"L-EJU-001": {"plant", "total", "count"} | {"plant", "error"}},
+            "plants": {"jumillano": {"total", "count", "complete"}},
+            "grand_total": float,
+            "deposit_count": int
+        }
+    """
+    machines = {}
+    plants = {
+        planta: {"total": 0.0, "count": 0, "complete": True}
+        for planta in PLANTAS_MAQUINAS
+    }
+
+    for maquina, contenido in deposits_data.items():
+        planta = get_planta_from_identifier(maquina)
+        plant_totals = plants.setdefault(planta, {"total": 0.0, "count": 0, "complete": True})
+
+        if "error" in contenido:
+            machines[maquina] = {"plant": planta, "error": contenido["error"]}
+            plant_totals["complete"] = False
+            continue
+
+        machine_total = 0.0
+        machine_count = 0
+        for deposit in _iter_deposit_dtos(contenido):
+            # El monto está en currencies.WSDepositCurrency.totalAmount
+            currencies = deposit.get("currencies") or {}
+            ws_deposit_currency = currencies.get("WSDepositCurrency") or {}
+            amount_str = ws_deposit_currency.get("totalAmount", "0")
+
+            try:
+                machine_total += float(amount_str)
+                machine_count += 1
+            except (ValueError, TypeError):
+                continue
+
+        machines[maquina] = {"plant": planta, "total": machine_total, "count": machine_count}
+        plant_totals["total"] += machine_total
+        plant_totals["count"] += machine_count
+
+    return {
+        "machines": machines,
+        "plants": plants,
+        "grand_total": sum(p["total"] for p in plants.values()),
+        "deposit_count": sum(p["count"] for p in plants.values())
+    }
+
+
 def calculate_deposits_total(deposits_data):
     """
     Calcula el total de depósitos de un conjunto de máquinas
     """
-    total = 0
-    for maquina in deposits_data:
-        if "error" not in deposits_data[maquina]:
-            # Navegar por la estructura correcta de la respuesta XML convertida
-            array_deposits = deposits_data[maquina].get("ArrayOfWSDepositsByDayDTO", {})
-            deposits = array_deposits.get("WSDepositsByDayDTO", [])
-            
-            if isinstance(deposits, dict):
-                deposits = [deposits]
-            
-            for deposit in deposits:
-                # El monto está en currencies.WSDepositCurrency.totalAmount
-                currencies = deposit.get("currencies", {})
-                ws_deposit_currency = currencies.get("WSDepositCurrency", {})
-                amount_str = ws_deposit_currency.get("totalAmount", "0")
-                
-                try:
-                    amount = float(amount_str)
-                    total += amount
-                except (ValueError, TypeError):
-                    continue
-                    
-    return total
+    return build_deposits_totals(deposits_data)["grand_total"]
 
 def get_jumillano_total(date: str):
     """
@@ -137,29 +196,36 @@ def get_nafa_total(date: str):
     data = get_nafa_deposits(date)
     return calculate_deposits_total(data)
 
-def get_all_totals(date: str):
+def get_all_totals(date: str, deposits_data: dict = None, save: bool = True):
     """
-    Obtiene los totales de todas las máquinas desglosados y los guarda automáticamente en la base de datos
+    Obtiene los totales de todas las máquinas desglosados y los guarda automáticamente en la base de datos.
+    Si se recibe `deposits_data` (respuesta de get_all_deposits) se reutiliza en lugar de volver a consultar miniBank.
     """
-    jumillano_total = get_jumillano_total(date)
-    plata_total = get_plata_total(date)
-    nafa_total = get_nafa_total(date)
+    if deposits_data is None:
+        deposits_data = get_all_deposits(date)
+    
+    totals = build_deposits_totals(deposits_data)
+    plants = totals["plants"]
     
     totals_result = {
         "date": date,
-        "jumillano_total": jumillano_total,
-        "plata_total": plata_total,
-        "nafa_total": nafa_total,
-        "grand_total": jumillano_total + plata_total + nafa_total
+        "jumillano_total": plants["jumillano"]["total"],
+        "plata_total": plants["plata"]["total"],
+        "nafa_total": plants["nafa"]["total"],
+        "grand_total": totals["grand_total"],
+        "deposit_count": totals["deposit_count"],
+        "plants": plants,
+        "machines": totals["machines"]
     }
     
     # Guardar automáticamente en la base de datos
-    try:
-        from services.daily_totals_service import save_daily_totals_from_data
-        save_daily_totals_from_data(date, totals_result)
-        print(f"🔄 Totales guardados automáticamente para {date}")
-    except Exception as e:
-        print(f"⚠️ Error al guardar totales automáticamente: {e}")
+    if save:
+        try:
+            from services.daily_totals_service import save_daily_totals_from_data
+            save_daily_totals_from_data(date, totals_result)
+            print(f"🔄 Totales guardados automáticamente para {date}")
+        except Exception as e:
+            print(f"⚠️ Error al guardar totales automáticamente: {e}")
     
     return totals_result
 
@@ -0,0 +1,188 @@
+"""
+Broker de eventos en proceso (server-sent events)
+
+Los productores publican desde cualquier hilo (endpoints sincrónicos en el
+threadpool, hooks de commit) y cada suscriptor recibe los eventos en una cola
+asyncio propia dentro del event loop que lo atiende. Un suscriptor lento no
+frena a nadie: si su cola se llena se vacía y recibe un evento `resync` para
+que vuelva a pedir el día completo.
+
+Se guarda un historial corto para retomar con el encabezado `Last-Event-ID`
+tras una reconexión. El broker es por proceso: con varios workers, cada uno
+notifica solo los cambios confirmados en él.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterable, Optional
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY_SIZE", "1000"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+EVENT_RESYNC = "resync"
+
+
+class Event:
+    """Evento publicado para un día (date = 'YYYY-MM-DD')"""
+
+    __slots__ = ("id", "seq", "type", "date", "data")
+
+    def __init__(self, id: str, seq: int, type: str, date: Optional[str], data: dict):
+        self.id = id
+        self.seq = seq
+        self.type = type
+        self.date = date
+        self.data = data
+
+    def to_sse(self) -> str:
+        payload = json.dumps({"date": self.date, **self.data}, default=str, separators=(",", ":"))
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """Suscripción de un cliente; se consume con `await get()` desde su event loop"""
+
+    def __init__(self, broker: "EventBroker", loop: asyncio.AbstractEventLoop, dates: Optional[set]):
+        self.broker = broker
+        self.loop = loop
+        self.dates = dates
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.overflows = 0
+
+    def matches(self, event: Event) -> bool:
+        return self.dates is None or event.date is None or event.date in self.dates
+
+    def _push(self, event: Optional[Event]):
+        """Encola un evento; corre en el event loop del suscriptor"""
+        if event is None:
+            # Cierre del broker: descartar lo pendiente para que el stream termine ya
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.broker.make_event(EVENT_RESYNC, None, {"reason": "overflow"}))
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Próximo evento, o None si no llegó ninguno en `timeout` segundos (o el broker cerró)"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """
+    Distribuye eventos a los suscriptores interesados en cada día
+    """
+
+    def __init__(self, history_size: int = EVENTS_HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._history = deque(maxlen=history_size)
+        # Los ids llevan el arranque del proceso para detectar Last-Event-ID de otra ejecución
+        self._epoch = int(time.time())
+        self._seq = itertools.count(1)
+        self._published = 0
+        self._closed = False
+
+    def make_event(self, event_type: str, date: Optional[str], data: dict) -> Event:
+        seq = next(self._seq)
+        return Event(f"{self._epoch}-{seq}", seq, event_type, date, data)
+
+    def subscribe(self, dates: Optional[Iterable[str]] = None, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Crea una suscripción (llamar desde el event loop que la va a consumir).
+        Con `last_event_id` reenvía los eventos posteriores que sigan en el historial,
+        o un `resync` si ya no están.
+        """
+        subscription = Subscription(self, asyncio.get_running_loop(), set(dates) if dates else None)
+        with self._lock:
+            if self._closed:
+                subscription._push(None)
+                return subscription
+            self._subscriptions.add(subscription)
+            if last_event_id:
+                for event in self._replay(last_event_id):
+                    if subscription.matches(event):
+                        subscription._push(event)
+        return subscription
+
+    def _replay(self, last_event_id: str) -> list:
+        try:
+            epoch, seq = (int(part) for part in last_event_id.split("-", 1))
+        except ValueError:
+            epoch, seq = None, None
+        oldest = self._history[0].seq if self._history else None
+        if epoch != self._epoch or seq is None or (oldest is not None and seq < oldest - 1):
+            return [self.make_event(EVENT_RESYNC, None, {"reason": "history"})]
+        return [event for event in self._history if event.seq > seq]
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, date: Optional[str], data: dict) -> Event:
+        """Publica un evento a los suscriptores de `date` (None = todos). Seguro entre hilos."""
+        with self._lock:
+            event = self.make_event(event_type, date, data)
+            self._history.append(event)
+            self._published += 1
+            destinatarios = [s for s in self._subscriptions if s.matches(event)]
+        for subscription in destinatarios:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, event)
+            except RuntimeError:
+                # El event loop del suscriptor ya terminó
+                self.unsubscribe(subscription)
+        return event
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return {
+            "subscribers": len(subscriptions),
+            "published": self._published,
+            "history": len(self._history),
+            "overflows": sum(s.overflows for s in subscriptions),
+            "queued": sum(s.queue.qsize() for s in subscriptions),
+            "checked_at": datetime.now().isoformat()
+        }
+
+    def close(self):
+        """Termina todos los streams abiertos (apagado del servidor)"""
+        with self._lock:
+            self._closed = True
+            subscriptions = list(self._subscriptions)
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, None)
+            except RuntimeError:
+                pass
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+event_broker = EventBroker()
+
+
+def shutdown_event_broker():
+    """Cierra los streams SSE abiertos al apagar la aplicación"""
+    event_broker.close()
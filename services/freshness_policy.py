@@ -0,0 +1,157 @@
+"""
+Política de frescura de las lecturas que sincronizan con sistemas externos
+
+Algunas lecturas (GET) sincronizan como efecto secundario: traen depósitos de
+miniBank y los guardan, o actualizan los valores esperados desde la API de
+repartos (consulta HTTP + UPDATE del día completo). FreshnessPolicy decide
+para cada fuente si hace falta, en este orden:
+
+- `refresh=true` en la request: se sincroniza siempre (sin caché de valores);
+- día cerrado (pasado y todos sus depósitos ENVIADO): nunca;
+- día futuro: nunca (no hay nada que traer);
+- la sincronización de miniBank acaba de traer depósitos: los esperados sí;
+- día pasado: miniBank solo si todavía no hay depósitos en la base (carga inicial);
+- si no, se sincroniza cuando la última sincronización exitosa de esa fuente
+  y fecha es más vieja que `max_staleness` segundos. El valor por defecto
+  depende del endpoint (hoy) o es FRESHNESS_PAST_DAY_MAX_STALENESS (días
+  pasados todavía abiertos), y la request puede fijarlo con `max_staleness`.
+
+Las decisiones se devuelven en el encabezado X-Freshness de cada respuesta,
+también en los 304 y en las copias de la caché de respuestas: el cuerpo puede
+ser el de una request anterior, el encabezado siempre es el de esta. Las
+marcas de última sincronización viven en memoria de cada proceso.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, Optional, Tuple
+from fastapi.responses import Response
+from sqlalchemy import select, func, case
+from database import SessionLocal
+from models.deposit import Deposit, EstadoDeposito
+
+SOURCE_MINIBANK = "minibank"
+SOURCE_EXPECTED = "expected"
+
+# Antigüedad máxima (segundos) de los datos de hoy, por endpoint
+ENDPOINT_MAX_STALENESS = {
+    "db.by-plant": int(os.getenv("FRESHNESS_BY_PLANT_MAX_STALENESS", "30")),
+    "deposits": int(os.getenv("FRESHNESS_DEPOSITS_MAX_STALENESS", "30")),
+}
+FRESHNESS_DEFAULT_MAX_STALENESS = int(os.getenv("FRESHNESS_DEFAULT_MAX_STALENESS", "30"))
+# Días pasados que todavía no se cerraron (mismo orden que la caché de valores de repartos)
+FRESHNESS_PAST_DAY_MAX_STALENESS = int(os.getenv("FRESHNESS_PAST_DAY_MAX_STALENESS", str(6 * 3600)))
+
+_sync_lock = threading.Lock()
+_last_sync: Dict[Tuple[str, str], float] = {}  # (fuente, fecha) -> time.monotonic()
+
+
+def _day_status(fecha: date) -> Tuple[int, int]:
+    """Cantidad de depósitos del día y cuántos están ENVIADO"""
+    inicio = datetime.combine(fecha, dt_time.min)
+    fin = inicio + timedelta(days=1)
+    db = SessionLocal()
+    try:
+        count, enviados = db.execute(
+            select(
+                func.count(Deposit.id),
+                func.sum(case((Deposit.estado == EstadoDeposito.ENVIADO, 1), else_=0))
+            ).where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+        ).one()
+        return int(count or 0), int(enviados or 0)
+    finally:
+        db.close()
+
+
+class FreshnessDecision:
+    """Qué se decidió para una fuente y por qué"""
+
+    __slots__ = ("source", "sync", "reason", "age", "ok")
+
+    def __init__(self, source: str, sync: bool, reason: str, age: Optional[float]):
+        self.source = source
+        self.sync = sync
+        self.reason = reason
+        self.age = age  # Segundos desde la última sincronización exitosa (None si no hubo)
+        self.ok: Optional[bool] = None  # Resultado, si se sincronizó
+
+
+class FreshnessPolicy:
+    """
+    Decisiones de sincronización de una request para un día
+    """
+
+    def __init__(self, endpoint: str, fecha: date, refresh: bool = False, max_staleness: Optional[int] = None):
+        self.endpoint = endpoint
+        self.fecha = fecha
+        self.refresh = refresh
+        self.decisions: Dict[str, FreshnessDecision] = {}
+
+        today = date.today()
+        self.count: Optional[int] = None
+        if fecha > today:
+            self.day = "future"
+        elif fecha == today:
+            self.day = "today"
+        else:
+            self.count, enviados = _day_status(fecha)
+            self.day = "closed" if self.count > 0 and enviados == self.count else "past"
+
+        if max_staleness is not None:
+            self.max_staleness = max_staleness
+        elif self.day == "today":
+            self.max_staleness = ENDPOINT_MAX_STALENESS.get(endpoint, FRESHNESS_DEFAULT_MAX_STALENESS)
+        else:
+            self.max_staleness = FRESHNESS_PAST_DAY_MAX_STALENESS
+
+    def _age(self, source: str) -> Optional[float]:
+        with _sync_lock:
+            last = _last_sync.get((source, self.fecha.isoformat()))
+        return time.monotonic() - last if last is not None else None
+
+    def decide(self, source: str, new_data: bool = False) -> FreshnessDecision:
+        """
+        Decide si sincronizar `source`. `new_data` indica que una sincronización
+        anterior de esta request trajo depósitos que todavía no tienen esos datos
+        """
+        age = self._age(source)
+        if self.refresh:
+            decision = FreshnessDecision(source, True, "refresh", age)
+        elif self.day in ("closed", "future"):
+            decision = FreshnessDecision(source, False, self.day, age)
+        elif new_data:
+            decision = FreshnessDecision(source, True, "new_data", age)
+        elif source == SOURCE_MINIBANK and self.day == "past":
+            # Días pasados: miniBank solo para la carga inicial
+            decision = FreshnessDecision(source, self.count == 0, "empty" if self.count == 0 else "past_day", age)
+        elif age is not None and age < self.max_staleness:
+            decision = FreshnessDecision(source, False, "fresh", age)
+        else:
+            decision = FreshnessDecision(source, True, "stale", age)
+        self.decisions[source] = decision
+        return decision
+
+    def record(self, source: str, ok: bool):
+        """Registra el resultado de la sincronización (solo las exitosas renuevan la marca)"""
+        if ok:
+            with _sync_lock:
+                _last_sync[(source, self.fecha.isoformat())] = time.monotonic()
+        decision = self.decisions.get(source)
+        if decision is not None:
+            decision.ok = ok
+
+    def header(self) -> str:
+        """Resumen para X-Freshness, p. ej. `day=past; max_staleness=21600; expected=skip(fresh)`"""
+        partes = [f"day={self.day}", f"max_staleness={self.max_staleness}"]
+        for source, decision in self.decisions.items():
+            estado = "sync" if decision.sync else "skip"
+            if decision.ok is False:
+                estado = "error"
+            partes.append(f"{source}={estado}({decision.reason})")
+        return "; ".join(partes)
+
+    def apply(self, response: Response) -> Response:
+        """Agrega X-Freshness a la respuesta (nueva, 304 o copia de la caché)"""
+        response.headers["X-Freshness"] = self.header()
+        return response
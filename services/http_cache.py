@@ -0,0 +1,225 @@
+"""
+Validadores HTTP (ETag / Last-Modified) y caché de respuestas de días históricos
+
+Antes de armar la respuesta, /db/deposits/by-plant, /db/deposits/by-machine y
+/charts/daily-totals calculan una versión barata de los datos con una sola
+consulta agregada:
+- día de depósitos: cantidad, mayor row_version, último updated_at y cuántos
+  están ENVIADO (más el último borrado del día, por las lápidas);
+- totales diarios: cantidad y último updated_at de las filas del período.
+
+Esa versión da el ETag (débil, porque el cuerpo puede viajar comprimido) y
+Last-Modified. Si el cliente ya tiene la versión se responde 304 sin leer las
+filas ni serializar nada.
+
+Un día está cerrado cuando ya pasó y todos sus depósitos están ENVIADO (un
+período de totales, cuando termina antes de hoy): el cuerpo serializado se
+guarda en memoria (LRU de HTTP_CACHE_MAX_ENTRIES respuestas) y se sirve
+mientras la versión no cambie. Los commits que tocan depósitos de un día
+descartan sus entradas.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+from models.deposit import Deposit, EstadoDeposito
+from models.daily_totals import DailyTotal
+from models.change_tracking import DeletedRow
+from services.deposit_change_tracker import on_after_commit
+
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "64"))
+
+# El navegador guarda la respuesta pero la revalida siempre (barato gracias al 304)
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Las fechas de la base son UTC sin zona"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class Validator:
+    """
+    Versión de los datos detrás de una respuesta: ETag, Last-Modified y si la
+    respuesta puede guardarse en la caché del servidor
+    """
+
+    def __init__(
+        self,
+        key: str,
+        version: str,
+        last_modified: Optional[datetime],
+        cacheable: bool,
+        fechas: Tuple[date, date]
+    ):
+        self.key = key
+        self.etag = f'W/"{hashlib.sha256(f"{key}|{version}".encode("utf-8")).hexdigest()[:32]}"'
+        # HTTP no tiene fracciones de segundo
+        self.last_modified = _as_utc(last_modified).replace(microsecond=0) if last_modified else None
+        self.cacheable = cacheable
+        self.fechas = fechas
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"ETag": self.etag, "Cache-Control": _CACHE_CONTROL}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def is_fresh(self, request: Request) -> bool:
+        """
+        True si el cliente ya tiene esta versión. If-None-Match manda; If-Modified-Since
+        solo se mira si no vino ETag
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            # Comparación débil: un proxy puede haber quitado o agregado el prefijo W/
+            etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return self.etag.removeprefix("W/") in etags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                desde = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified <= _as_utc(desde)
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+class ResponseCache:
+    """
+    Caché LRU en memoria de cuerpos ya serializados, validada contra el ETag actual
+    """
+
+    def __init__(self, max_entries: int = HTTP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # clave -> (etag, (desde, hasta), cuerpo, media type)
+        self._entries: "OrderedDict[str, Tuple[str, Tuple[date, date], bytes, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, validator: Validator) -> Optional[Response]:
+        with self._lock:
+            entry = self._entries.get(validator.key)
+            if entry is None or entry[0] != validator.etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(validator.key)
+            self.hits += 1
+        _, _, body, media_type = entry
+        return Response(content=body, media_type=media_type, headers={**validator.headers, "X-Response-Cache": "HIT"})
+
+    def put(self, validator: Validator, response: Response):
+        if not validator.cacheable or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[validator.key] = (validator.etag, validator.fechas, response.body, response.media_type)
+            self._entries.move_to_end(validator.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_dates(self, fechas: Iterable[date]):
+        """Descarta las respuestas cuyo período incluye alguna de las fechas"""
+        fechas = list(fechas)
+        with self._lock:
+            for key in [
+                key for key, (_, (desde, hasta), _, _) in self._entries.items()
+                if any(desde <= fecha <= hasta for fecha in fechas)
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+@on_after_commit
+def _invalidate_responses_on_commit(session, changes):
+    if changes.fechas:
+        response_cache.invalidate_dates(changes.fechas)
+
+
+def deposits_day_validator(db: Session, endpoint: str, fecha: date) -> Validator:
+    """Versión de los depósitos de un día (una consulta sobre el índice por date_time)"""
+    inicio = datetime.combine(fecha, time.min)
+    fin = inicio + timedelta(days=1)
+    count, max_version, last_update, enviados = db.execute(
+        select(
+            func.count(Deposit.id),
+            func.max(Deposit.row_version),
+            func.max(Deposit.updated_at),
+            func.sum(case((Deposit.estado == EstadoDeposito.ENVIADO, 1), else_=0))
+        ).where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+    ).one()
+    # Un borrado baja la cantidad pero no mueve updated_at de los que quedan
+    last_delete = db.execute(
+        select(func.max(DeletedRow.deleted_at)).where(DeletedRow.date == fecha.strftime("%Y-%m-%d"))
+    ).scalar()
+
+    enviados = int(enviados or 0)
+    cerrado = count > 0 and enviados == count and fecha < date.today()
+    last_modified = max((value for value in (last_update, last_delete) if value is not None), default=None)
+    return Validator(
+        key=f"{endpoint}:{fecha.isoformat()}",
+        version=f"{count}-{max_version or 0}-{enviados}-{last_update}-{last_delete}",
+        last_modified=last_modified,
+        cacheable=cerrado,
+        fechas=(fecha, fecha)
+    )
+
+
+def daily_totals_validator(db: Session, start_date: date, end_date: date, plant: Optional[str] = None) -> Validator:
+    """Versión de los totales diarios (por planta/generales) de un período"""
+    query = select(func.count(DailyTotal.id), func.max(DailyTotal.updated_at)).where(
+        DailyTotal.date >= start_date.strftime("%Y-%m-%d"),
+        DailyTotal.date <= end_date.strftime("%Y-%m-%d"),
+        DailyTotal.machine.is_(None)
+    )
+    if plant:
+        query = query.where(DailyTotal.plant == plant)
+    count, last_update = db.execute(query).one()
+    return Validator(
+        key=f"daily-totals:{start_date.isoformat()}:{end_date.isoformat()}:{plant or 'all'}",
+        version=f"{count}-{last_update}",
+        last_modified=last_update,
+        cacheable=count > 0 and end_date < date.today(),
+        fechas=(start_date, end_date)
+    )
+
+
+def cached_response(request: Request, validator: Validator) -> Optional[Response]:
+    """304 si el cliente ya tiene la versión, la copia guardada si existe, o None para armar la respuesta"""
+    if validator.is_fresh(request):
+        return validator.not_modified()
+    if validator.cacheable:
+        return response_cache.get(validator)
+    return None
+
+
+def with_validators(validator: Validator, response: Response, store: bool = True) -> Response:
+    """Agrega ETag/Last-Modified a la respuesta recién armada y la guarda si el período está cerrado"""
+    response.headers.update(validator.headers)
+    if store:
+        response_cache.put(validator, response)
+    return response
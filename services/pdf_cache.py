@@ -0,0 +1,181 @@
+"""
+Caché en disco de los PDFs generados
+
+Cada PDF se guarda bajo una clave formada por tipo de reporte, fecha, planta y
+una huella (fingerprint) de los datos con los que se generó: depósitos del día,
+totales y cheques/retenciones por depósito. Si los datos no cambiaron, la huella
+es la misma y se sirve el archivo guardado sin volver a armar el documento con
+reportlab. La huella también se usa como ETag para responder 304 Not Modified.
+
+El tamaño total del directorio se acota con desalojo LRU y, cuando se confirma
+una transacción que modifica depósitos, cheques o retenciones, se borran los
+PDFs de los días afectados.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from services.deposit_change_tracker import on_after_commit
+
+PDF_CACHE_DIR = os.getenv(
+    "PDF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "pdf")
+)
+PDF_CACHE_MAX_BYTES = int(float(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+# Cambiar al modificar el diseño de los PDFs para no servir documentos con el formato anterior
+PDF_LAYOUT_VERSION = "1"
+
+
+def compute_fingerprint(report_type: str, date: str, plant: Optional[str], *data) -> str:
+    """
+    Huella SHA-256 de los datos de un reporte (se usa como clave de caché y ETag)
+    """
+    payload = json.dumps(
+        [PDF_LAYOUT_VERSION, report_type, date, plant or "all", *data],
+        sort_keys=True,
+        default=str,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PDFCache:
+    """
+    Caché LRU de PDFs en disco acotada por tamaño total
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # nombre de archivo -> tamaño
+        self._total_bytes = 0
+        self._loaded = False
+
+    @staticmethod
+    def _filename(report_type: str, date: str, plant: Optional[str], fingerprint: str) -> str:
+        return f"{date}_{report_type}_{plant or 'all'}_{fingerprint[:32]}.pdf"
+
+    def _load_index(self):
+        """Reconstruye el índice LRU desde el disco (orden por último acceso)"""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pdf"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    def _remove(self, name: str):
+        size = self._entries.pop(name, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def get(self, report_type: str, date: str, plant: Optional[str], fingerprint: str) -> Optional[bytes]:
+        name = self._filename(report_type, date, plant, fingerprint)
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._load_index()
+            if name not in self._entries:
+                return None
+            try:
+                with open(path, "rb") as f:
+                    content = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                self._entries.pop(name, None)
+                return None
+            self._entries.move_to_end(name)
+            return content
+
+    def put(self, report_type: str, date: str, plant: Optional[str], fingerprint: str, content: bytes):
+        name = self._filename(report_type, date, plant, fingerprint)
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            self._load_index()
+            path = os.path.join(self.directory, name)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+            self._total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = len(content)
+            self._total_bytes += len(content)
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate_dates(self, fechas: Iterable[str]) -> int:
+        """Borra todos los PDFs de las fechas indicadas (YYYY-MM-DD)"""
+        prefixes = tuple(f"{fecha}_" for fecha in fechas)
+        if not prefixes:
+            return 0
+        with self._lock:
+            self._load_index()
+            names = [name for name in self._entries if name.startswith(prefixes)]
+            for name in names:
+                self._remove(name)
+            return len(names)
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for name in list(self._entries):
+                self._remove(name)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._load_index()
+            return {
+                "directory": self.directory,
+                "files": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+pdf_cache = PDFCache()
+
+
+def get_or_build_pdf(
+    report_type: str,
+    date: str,
+    plant: Optional[str],
+    fingerprint: str,
+    builder: Callable[[], bytes]
+) -> Tuple[bytes, bool]:
+    """
+    Devuelve (contenido, desde_cache). Si el PDF no está en caché se genera con `builder` y se guarda.
+    """
+    content = pdf_cache.get(report_type, date, plant, fingerprint)
+    if content is not None:
+        return content, True
+
+    content = builder()
+    try:
+        pdf_cache.put(report_type, date, plant, fingerprint, content)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el PDF en caché: {e}")
+    return content, False
+
+
+@on_after_commit
+def _invalidate_pdfs_on_commit(session, changes):
+    if changes.fechas:
+        pdf_cache.invalidate_dates(fecha.strftime("%Y-%m-%d") for fecha in changes.fechas)
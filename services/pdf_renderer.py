@@ -0,0 +1,121 @@
+"""
+Renderizado de PDFs fuera del proceso del servidor
+
+reportlab arma el documento en Python puro y retiene el GIL durante todo el
+layout, así que un reporte grande generado en el hilo de la request frena al
+resto de la API del mismo worker. Este módulo ejecuta los generadores de
+services.pdf_service en un pool de procesos (PDF_RENDER_WORKERS, por defecto 2)
+y limita cuántos renders pueden estar en curso a la vez (PDF_RENDER_CONCURRENCY).
+
+Los reportes de un día reciben datos planos (depósitos, totales y
+cheques/retenciones ya resueltos en el proceso del servidor). El reporte por
+rango (generate_range_pdf_from_db) es la excepción: lee los depósitos en lotes
+con report_data_provider.iter_range_deposits dentro del proceso del pool, para
+no cargar ni serializar el rango completo en el servidor.
+
+Los procesos se crean con spawn y no heredan nada del servidor: al importar
+database cada uno arma su propio engine y su pool de conexiones (los valores
+por defecto de SQLAlchemy), que se abre recién con el primer reporte por rango
+y vive mientras viva el proceso. En SQL Server hay que contar hasta
+PDF_RENDER_WORKERS pools más que los de los workers de la API.
+Con PDF_RENDER_WORKERS=0 se renderiza en el threadpool como antes.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Iterator, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from services.pdf_cache import pdf_cache
+from utils.logging_utils import log_technical_error
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_CONCURRENCY = int(os.getenv("PDF_RENDER_CONCURRENCY", str(max(1, PDF_RENDER_WORKERS))))
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: los procesos no heredan conexiones de la base ni locks del servidor;
+            # el que necesita la base abre las suyas (ver docstring del módulo)
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PDF_RENDER_CONCURRENCY)
+    return _semaphore
+
+
+def shutdown_pdf_renderer():
+    """Cierra el pool de procesos (se llama al apagar la aplicación)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def render_pdf(func: Callable[..., bytes], *args, **kwargs) -> bytes:
+    """
+    Ejecuta un generador de PDF en el pool de procesos respetando el límite de concurrencia
+    """
+    async with _get_semaphore():
+        if PDF_RENDER_WORKERS <= 0:
+            return await run_in_threadpool(func, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(_get_executor(), partial(func, *args, **kwargs))
+        except BrokenProcessPool as e:
+            # Un proceso del pool murió: se recrea el pool y este PDF se genera en el threadpool
+            log_technical_error(e, "pdf_renderer", extra_data={"function": func.__name__})
+            shutdown_pdf_renderer()
+            return await run_in_threadpool(func, *args, **kwargs)
+
+
+async def get_or_render_pdf(
+    report_type: str,
+    date: str,
+    plant: Optional[str],
+    fingerprint: str,
+    func: Callable[..., bytes],
+    *args,
+    **kwargs
+) -> Tuple[bytes, bool]:
+    """
+    Versión asíncrona de pdf_cache.get_or_build_pdf: devuelve (contenido, desde_cache)
+    """
+    content = await run_in_threadpool(pdf_cache.get, report_type, date, plant, fingerprint)
+    if content is not None:
+        return content, True
+
+    content = await render_pdf(func, *args, **kwargs)
+    try:
+        await run_in_threadpool(pdf_cache.put, report_type, date, plant, fingerprint, content)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el PDF en caché: {e}")
+    return content, False
+
+
+def iter_pdf_chunks(content: bytes, chunk_size: int = PDF_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Entrega el PDF en bloques para StreamingResponse"""
+    view = memoryview(content)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
@@ -12,7 +12,7 @@ from database import SessionLocal
 from models.deposit import Deposit
 from models.cheque_retencion import Cheque, Retencion
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func
+from sqlalchemy import func, select, literal, union_all
 
 # Configurar el locale para formato de números (opcional)
 try:
@@ -85,46 +85,96 @@ def get_cheques_retenciones_totals(deposit_id: str):
     finally:
         db.close()
 
-def generate_daily_closure_pdf(totals_data, date):
+# Tamaño de lote para IN (...) sin superar el límite de parámetros de SQL Server
+_IN_CHUNK_SIZE = 500
+
+def get_cheques_retenciones_totals_map(deposit_ids):
+    """
+    Obtiene los totales de cheques y retenciones de muchos depósitos con una sola consulta
+    agrupada por deposit_id (por lote de hasta _IN_CHUNK_SIZE ids).
+    
+    Returns:
+        {deposit_id: {'cheques': float, 'retenciones': float}} (solo depósitos con movimientos)
+    """
+    ids = list({deposit_id for deposit_id in deposit_ids if deposit_id})
+    totals = {}
+    if not ids:
+        return totals
+    
+    db = SessionLocal()
+    try:
+        for i in range(0, len(ids), _IN_CHUNK_SIZE):
+            chunk = ids[i:i + _IN_CHUNK_SIZE]
+            stmt = union_all(
+                select(Cheque.deposit_id, literal('cheques').label('tipo'), func.sum(Cheque.importe).label('total'))
+                .where(Cheque.deposit_id.in_(chunk))
+                .group_by(Cheque.deposit_id),
+                select(Retencion.deposit_id, literal('retenciones').label('tipo'), func.sum(Retencion.importe).label('total'))
+                .where(Retencion.deposit_id.in_(chunk))
+                .group_by(Retencion.deposit_id)
+            )
+            for deposit_id, tipo, total in db.execute(stmt):
+                totals.setdefault(deposit_id, {'cheques': 0.0, 'retenciones': 0.0})[tipo] = float(total or 0.0)
+        return totals
+    except Exception as e:
+        print(f"⚠️ Error al consultar cheques/retenciones agrupados: {e}")
+        return {}
+    finally:
+        db.close()
+
+def _deposit_ids_from_data(deposits_data, machines=None):
+    """
+    Lista los depositId de una respuesta de miniBank (opcionalmente solo de ciertas máquinas)
+    """
+    deposit_ids = []
+    for cajero_id, contenido in deposits_data.items():
+        if machines is not None and cajero_id not in machines:
+            continue
+        if not contenido or "error" in contenido:
+            continue
+        array_obj = contenido.get("ArrayOfWSDepositsByDayDTO")
+        if not array_obj:
+            continue
+        dto_raw = array_obj.get("WSDepositsByDayDTO")
+        if not dto_raw:
+            continue
+        dto_list = [dto_raw] if isinstance(dto_raw, dict) else dto_raw
+        deposit_ids.extend(d.get("depositId") for d in dto_list if d.get("depositId"))
+    return deposit_ids
+
+def generate_daily_closure_pdf(totals_data, date, deposits_data=None, cheques_retenciones=None):
     """
-    Genera un PDF con el cierre de caja diario
+    Genera un PDF con el cierre de caja diario.
+    `deposits_data` tiene la forma de la respuesta de miniBank; si no se recibe se lee
+    de la base con el proveedor de datos de reportes. `cheques_retenciones` es el mapa de
+    get_cheques_retenciones_totals_map; si se recibe, el PDF se arma sin acceder a la base.
     """
-    from services.deposits_service import get_jumillano_deposits, get_plata_deposits, get_nafa_deposits
+    from services.deposits_service import PLANTAS_MAQUINAS
+    
+    if deposits_data is None:
+        from services.report_data_provider import load_deposits_data
+        deposits_data = load_deposits_data(date)
+    
+    # Totales de cheques y retenciones de todos los depósitos del día en una sola consulta
+    cr_totals = cheques_retenciones
+    if cr_totals is None:
+        cr_totals = get_cheques_retenciones_totals_map(_deposit_ids_from_data(deposits_data))
     
     # Obtener datos de cheques y retenciones por planta
-    def get_plant_cheques_retenciones(get_deposits_func, date):
-        try:
-            deposits_data = get_deposits_func(date)
-            total_cheques = 0.0
-            total_retenciones = 0.0
-            
-            for cajero_id, contenido in deposits_data.items():
-                array_obj = contenido.get("ArrayOfWSDepositsByDayDTO")
-                if not array_obj:
-                    continue
-                    
-                dto_raw = array_obj.get("WSDepositsByDayDTO")
-                if not dto_raw:
-                    continue
-                    
-                dto_list = [dto_raw] if isinstance(dto_raw, dict) else dto_raw
-                
-                for deposit in dto_list:
-                    deposit_id = deposit.get("depositId")
-                    if deposit_id:
-                        cheques_ret = get_cheques_retenciones_totals(deposit_id)
-                        total_cheques += cheques_ret['cheques']
-                        total_retenciones += cheques_ret['retenciones']
-            
-            return {'cheques': total_cheques, 'retenciones': total_retenciones}
-        except Exception as e:
-            print(f"Error obteniendo cheques/retenciones: {e}")
-            return {'cheques': 0.0, 'retenciones': 0.0}
+    def get_plant_cheques_retenciones(machines):
+        total_cheques = 0.0
+        total_retenciones = 0.0
+        for deposit_id in _deposit_ids_from_data(deposits_data, machines):
+            cheques_ret = cr_totals.get(deposit_id)
+            if cheques_ret:
+                total_cheques += cheques_ret['cheques']
+                total_retenciones += cheques_ret['retenciones']
+        return {'cheques': total_cheques, 'retenciones': total_retenciones}
     
     # Obtener totales de cheques y retenciones por planta
-    jumillano_cr = get_plant_cheques_retenciones(get_jumillano_deposits, date)
-    plata_cr = get_plant_cheques_retenciones(get_plata_deposits, date)
-    nafa_cr = get_plant_cheques_retenciones(get_nafa_deposits, date)
+    jumillano_cr = get_plant_cheques_retenciones(PLANTAS_MAQUINAS["jumillano"])
+    plata_cr = get_plant_cheques_retenciones(PLANTAS_MAQUINAS["plata"])
+    nafa_cr = get_plant_cheques_retenciones(PLANTAS_MAQUINAS["nafa"])
     
     # Calcular totales globales de efectivo, cheques y retenciones
     total_efectivo = totals_data['grand_total']
@@ -322,9 +372,10 @@ def generate_daily_closure_pdf(totals_data, date):
     
     return pdf_content
 
-def generate_detailed_repartos_pdf(repartos_data, date):
+def generate_detailed_repartos_pdf(repartos_data, date, cheques_retenciones=None):
     """
-    Genera un PDF detallado con todos los repartos por planta
+    Genera un PDF detallado con todos los repartos por planta.
+    Si se recibe `cheques_retenciones` (mapa de get_cheques_retenciones_totals_map) no se accede a la base.
     """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, 
@@ -398,6 +449,12 @@ def generate_detailed_repartos_pdf(repartos_data, date):
         'nafa': {'title': 'LOMAS DE ZAMORA (Máquina L-EJU-004)', 'repartos': []}
     }
     
+    # Totales de cheques y retenciones de todos los depósitos en una sola consulta
+    cr_totals = cheques_retenciones
+    if cr_totals is None:
+        cr_totals = get_cheques_retenciones_totals_map(_deposit_ids_from_data(repartos_data))
+    sin_movimientos = {'cheques': 0.0, 'retenciones': 0.0}
+    
     # Organizar repartos por planta
     for machine, data in repartos_data.items():
         if "error" not in data:
@@ -435,7 +492,7 @@ def generate_detailed_repartos_pdf(repartos_data, date):
                     
                     # Calcular totales de cheques y retenciones desde la base de datos
                     deposit_id = deposit.get("depositId", "")
-                    cheques_retenciones = get_cheques_retenciones_totals(deposit_id)
+                    cheques_retenciones = cr_totals.get(deposit_id, sin_movimientos)
                     cheques_total = cheques_retenciones['cheques']
                     retenciones_total = cheques_retenciones['retenciones']
                     
@@ -612,3 +669,227 @@ def generate_detailed_repartos_pdf(repartos_data, date):
     buffer.close()
     
     return pdf_content
+
+
+# Filas por tabla en el reporte por rango: una tabla entra en una página A4
+RANGE_ROWS_PER_TABLE = 40
+
+PLANT_TITLES = {
+    'jumillano': 'CIUDADELA (Máquinas L-EJU-001 y L-EJU-002)',
+    'plata': 'LA PLATA (Máquina L-EJU-003)',
+    'nafa': 'LOMAS DE ZAMORA (Máquina L-EJU-004)'
+}
+
+
+class _StreamedStory(list):
+    """
+    Lista de flowables que se completa desde un generador a medida que reportlab la consume,
+    así nunca hay en memoria más que unas pocas tablas del reporte
+    """
+
+    def __init__(self, flowables, lookahead=10):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def _clean_username(raw_username):
+    """Si el formato es "123, RTO 123", deja solo "RTO 123" """
+    raw_username = raw_username or ""
+    if ", RTO " in raw_username:
+        return "RTO " + raw_username.split(", RTO ")[1]
+    return raw_username
+
+
+def _range_table(rows, total_row=None):
+    """Tabla de depósitos de un día (un bloque de hasta RANGE_ROWS_PER_TABLE filas)"""
+    table_data = [['Hora', 'Usuario', 'Efectivo ($)', 'Cheques ($)', 'Retenciones ($)', 'Máquina', 'ID Depósito']]
+    table_data.extend(rows)
+    style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (2, 1), (4, -1), 'RIGHT'),  # Alinear montos a la derecha
+        ('FONTSIZE', (0, 1), (-1, -1), 8),  # Letra más pequeña para contenido
+    ]
+    if total_row:
+        table_data.append(total_row)
+        style += [
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ]
+    table = Table(table_data, colWidths=[0.8*inch, 1.5*inch, 1.2*inch, 1*inch, 1*inch, 1*inch, 1.3*inch], repeatRows=1)
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def _range_story(deposits, start_date, end_date, plant, styles):
+    """
+    Genera los flowables del reporte por rango: un bloque por día con tablas de a
+    RANGE_ROWS_PER_TABLE filas y, al final, el resumen diario. Solo se acumulan totales por día.
+    """
+    title_style, subtitle_style, normal_style = styles
+
+    story = []
+    add_logo_to_story(story)
+    yield from story
+    yield Paragraph("REPORTE DE REPARTOS POR PERÍODO", title_style)
+    yield Spacer(1, 12)
+    yield Paragraph("EL JUMILLANO - PAC", normal_style)
+    yield Spacer(1, 20)
+    desde = datetime.strptime(start_date, "%Y-%m-%d").strftime("%d/%m/%Y")
+    hasta = datetime.strptime(end_date, "%Y-%m-%d").strftime("%d/%m/%Y")
+    yield Paragraph(f"Período: {desde} al {hasta}", normal_style)
+    yield Paragraph(f"Planta: {PLANT_TITLES[plant] if plant else 'Todas las plantas'}", normal_style)
+    yield Spacer(1, 20)
+
+    resumen = []  # (día, efectivo, cheques, retenciones, cantidad)
+    current_day = None
+    rows = []
+    day_totals = [0.0, 0.0, 0.0, 0]
+
+    def day_total_row():
+        return ['', 'TOTAL DÍA', format_currency(day_totals[0]), format_currency(day_totals[1]),
+                format_currency(day_totals[2]), str(day_totals[3]), '']
+
+    for deposit in deposits:
+        dt = deposit['date_time']
+        day = dt.strftime("%d/%m/%Y") if dt else "Sin fecha"
+
+        if day != current_day:
+            if current_day is not None:
+                yield _range_table(rows, day_total_row())
+                yield Spacer(1, 16)
+                resumen.append((current_day, *day_totals))
+            current_day = day
+            rows = []
+            day_totals = [0.0, 0.0, 0.0, 0]
+            yield Paragraph(f"Día {day}", subtitle_style)
+
+        amount = float(deposit['total_amount'] or 0)
+        cheques = float(deposit['cheques'] or 0)
+        retenciones = float(deposit['retenciones'] or 0)
+        day_totals[0] += amount
+        day_totals[1] += cheques
+        day_totals[2] += retenciones
+        day_totals[3] += 1
+
+        rows.append([
+            dt.strftime("%H:%M") if dt else '',
+            _clean_username(deposit['user_name']),
+            format_currency(amount),
+            format_currency(cheques),
+            format_currency(retenciones),
+            deposit['identifier'] or '',
+            deposit['deposit_id'] or ''
+        ])
+        if len(rows) == RANGE_ROWS_PER_TABLE:
+            yield _range_table(rows)
+            rows = []
+
+    if current_day is not None:
+        yield _range_table(rows, day_total_row())
+        yield Spacer(1, 16)
+        resumen.append((current_day, *day_totals))
+    else:
+        yield Paragraph("No hay depósitos registrados en el período.", normal_style)
+        yield Spacer(1, 20)
+
+    # Resumen por día
+    yield Paragraph("RESUMEN DEL PERÍODO", subtitle_style)
+    resumen_data = [['Día', 'Efectivo ($)', 'Cheques ($)', 'Retenciones ($)', 'Cantidad']]
+    for day, efectivo, cheques, retenciones, cantidad in resumen:
+        resumen_data.append([day, format_currency(efectivo), format_currency(cheques),
+                             format_currency(retenciones), str(cantidad)])
+    resumen_data.append([
+        'TOTAL',
+        format_currency(sum(r[1] for r in resumen)),
+        format_currency(sum(r[2] for r in resumen)),
+        format_currency(sum(r[3] for r in resumen)),
+        str(sum(r[4] for r in resumen))
+    ])
+    resumen_table = Table(resumen_data, colWidths=[1.5*inch, 1.5*inch, 1.2*inch, 1.2*inch, 1*inch], repeatRows=1)
+    resumen_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (1, 1), (3, -1), 'RIGHT'),   # Montos a la derecha
+        ('ALIGN', (4, 1), (4, -1), 'CENTER'),  # Cantidad centrada
+    ]))
+    yield resumen_table
+    yield Spacer(1, 30)
+    yield Paragraph(f"Reporte generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}", normal_style)
+
+
+def generate_range_pdf(deposits, start_date, end_date, plant=None):
+    """
+    Genera un PDF con los repartos de un rango de fechas.
+    `deposits` es un iterable de filas ordenadas por fecha (ver report_data_provider.iter_range_deposits);
+    se consume a medida que reportlab arma las páginas, sin cargar todo el período en memoria.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                          rightMargin=72, leftMargin=72,
+                          topMargin=72, bottomMargin=18)
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=colors.darkblue
+    )
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        alignment=TA_LEFT,
+        textColor=colors.darkblue,
+        keepWithNext=1
+    )
+
+    story = _StreamedStory(_range_story(
+        deposits, start_date, end_date, plant, (title_style, subtitle_style, styles['Normal'])
+    ))
+    doc.build(story)
+
+    pdf_content = buffer.getvalue()
+    buffer.close()
+    return pdf_content
+
+
+def generate_range_pdf_from_db(start_date, end_date, plant=None):
+    """
+    Genera el PDF por rango leyendo los depósitos de la base en lotes (apto para el pool de procesos)
+    """
+    from services.report_data_provider import iter_range_deposits
+    return generate_range_pdf(iter_range_deposits(start_date, end_date, plant), start_date, end_date, plant)
@@ -62,8 +62,9 @@ class RepartoCierreService:
                 # Determinar planta basada en identifier
                 planta = self._get_planta_from_identifier(deposit.identifier)
                 
-                # Extraer idreparto del user_name
-                idreparto = self._extract_idreparto_from_user_name(deposit.user_name)
+                # idreparto precalculado al guardar el depósito (extraído de user_name);
+                # NULL significa que user_name no tiene uno extraíble
+                idreparto = deposit.idreparto
                 if idreparto is None:
                     # Fallback: usar deposit_id si no se puede extraer del user_name
                     idreparto = self._clean_reparto_id(deposit.deposit_id)
@@ -100,53 +101,6 @@ class RepartoCierreService:
         finally:
             db.close()
     
-    def _extract_idreparto_from_user_name(self, user_name: str) -> Optional[int]:
-        """
-        Extrae el idreparto del user_name usando patrones robustos
-        
-        Args:
-            user_name: Nombre de usuario del depósito
-        
-        Returns:
-            El idreparto extraído o None si no se pudo extraer
-        
-        Ejemplos:
-            "42, RTO 042" -> 42
-            "RTO 277, 277" -> 277
-            "1, algo más" -> 1
-            "RTO 123, algo" -> 123
-        """
-        if not user_name:
-            return None
-        
-        try:
-            import re
-            
-            # Buscar el primer número antes de la coma
-            # Esto maneja casos como "42, RTO 042" y "RTO 277, 277"
-            parte_antes_coma = user_name.split(",")[0].strip()
-            
-            # Buscar todos los números en la parte antes de la coma
-            numeros = re.findall(r'\d+', parte_antes_coma)
-            
-            if numeros:
-                # Tomar el primer número encontrado
-                return int(numeros[0])
-            
-            # Si no hay números antes de la coma, buscar después de la coma
-            # Esto maneja casos edge como ", 123"
-            if "," in user_name:
-                parte_despues_coma = user_name.split(",", 1)[1].strip()
-                numeros_despues = re.findall(r'\d+', parte_despues_coma)
-                if numeros_despues:
-                    return int(numeros_despues[0])
-            
-            return None
-            
-        except (ValueError, IndexError) as e:
-            logging.warning(f"⚠️ Error al extraer idreparto de '{user_name}': {e}")
-            return None
-
     def _get_planta_from_identifier(self, identifier: str) -> str:
         """
         Determina la planta basada en el identifier del cajero
@@ -659,8 +613,6 @@ class RepartoCierreService:
         """
         db = SessionLocal()
         try:
-            from services.repartos_api_service import extraer_idreparto_de_user_name
-
             query = db.query(Deposit).filter(Deposit.estado == EstadoDeposito.ENVIADO)
 
             if fecha_especifica:
@@ -668,14 +620,13 @@ class RepartoCierreService:
                 fin = inicio.replace(hour=23, minute=59, second=59, microsecond=999999)
                 query = query.filter(Deposit.date_time >= inicio, Deposit.date_time <= fin)
 
+            if idreparto is not None:
+                query = query.filter(Deposit.idreparto == idreparto)
+
             candidatos = query.all()
 
             actualizados = 0
             for dep in candidatos:
-                if idreparto is not None:
-                    rid = extraer_idreparto_de_user_name(dep.user_name)
-                    if rid != idreparto:
-                        continue
                 dep.estado = EstadoDeposito.LISTO
                 dep.fecha_envio = None
                 actualizados += 1
@@ -701,24 +652,20 @@ class RepartoCierreService:
         """
         from database import SessionLocal
         from models.deposit import Deposit, EstadoDeposito
-        from services.repartos_api_service import extraer_idreparto_de_user_name
         
         db = SessionLocal()
         try:
-            # Buscar todos los depósitos que están en estado LISTO
+            # Depósitos LISTO del reparto (búsqueda por la columna indexada idreparto)
             depositos_listo = db.query(Deposit).filter(
-                Deposit.estado == EstadoDeposito.LISTO
+                Deposit.estado == EstadoDeposito.LISTO,
+                Deposit.idreparto == idreparto
             ).all()
             
             actualizados = 0
             for deposito in depositos_listo:
-                # Usar la función existente para extraer idreparto del user_name
-                idreparto_extraido = extraer_idreparto_de_user_name(deposito.user_name)
-                
-                if idreparto_extraido == idreparto:
-                    deposito.estado = EstadoDeposito.ENVIADO
-                    actualizados += 1
-                    logging.info(f"🔄 Depósito {deposito.deposit_id} (user_name: '{deposito.user_name}') actualizado a ENVIADO")
+                deposito.estado = EstadoDeposito.ENVIADO
+                actualizados += 1
+                logging.info(f"🔄 Depósito {deposito.deposit_id} (user_name: '{deposito.user_name}') actualizado a ENVIADO")
             
             db.commit()
             
@@ -751,16 +698,12 @@ class RepartoCierreService:
             # Formatear fecha para la API externa
             fecha_formatted = deposit.date_time.strftime("%d/%m/%Y") if deposit.date_time else datetime.now().strftime("%d/%m/%Y")
             
-            # URL de la API externa para obtener valores
-            api_url = f"http://192.168.0.8:97/service1.asmx/reparto_get_valores?fecha={fecha_formatted}"
+            # Valores de la fecha (compartidos con el resto de la app a través de la caché)
+            from services.repartos_api_service import get_repartos_valores_todos
             
-            logging.info(f"🔍 Consultando API externa para obtener efectivo del reparto {idreparto}: {api_url}")
-            
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()
+            logging.info(f"🔍 Obteniendo efectivo del reparto {idreparto} para la fecha {fecha_formatted}")
             
-            # Parsear la respuesta JSON
-            valores_data = response.json()
+            valores_data = get_repartos_valores_todos(fecha_formatted)
             
             # Buscar el reparto específico en la respuesta
             for reparto_data in valores_data:
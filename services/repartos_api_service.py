@@ -3,97 +3,173 @@ Servicio para integrar con la API externa de repartos
 """
 import requests
 import logging
-import re
-from typing import List, Dict, Optional
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from utils.idreparto import extraer_idreparto_de_user_name
 
-def get_repartos_valores(fecha: str) -> List[Dict]:
-    """
-    Obtiene los valores esperados de repartos desde la API externa
+REPARTOS_VALORES_URL = "http://192.168.0.8:97/service1.asmx/reparto_get_valores"
+
+# Tiempo de vida en memoria de los valores por fecha: el día de hoy cambia a medida
+# que se cargan repartos, los días pasados prácticamente no
+REPARTOS_VALORES_TTL_HOY = int(os.getenv("REPARTOS_VALORES_TTL_HOY", "60"))
+REPARTOS_VALORES_TTL_PASADO = int(os.getenv("REPARTOS_VALORES_TTL_PASADO", str(6 * 3600)))
+REPARTOS_VALORES_CACHE_MAX = 62
+
+class _ValoresEntry:
+    __slots__ = ("data", "content_hash", "fetched_at", "expires_at")
+
+    def __init__(self, data: List[Dict], content_hash: str, fetched_at: float, expires_at: float):
+        self.data = data
+        self.content_hash = content_hash
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+
+_valores_lock = threading.Lock()
+_valores_cache: "OrderedDict[str, _ValoresEntry]" = OrderedDict()
+_valores_fetch_locks: Dict[str, threading.Lock] = {}
+
+def _valores_ttl(fecha: str) -> int:
+    """TTL según la fecha ("DD/MM/YYYY"): corto para hoy (o fechas futuras), largo para días pasados"""
+    try:
+        dia = datetime.strptime(fecha, "%d/%m/%Y").date()
+    except ValueError:
+        return REPARTOS_VALORES_TTL_HOY
+    return REPARTOS_VALORES_TTL_PASADO if dia < datetime.now().date() else REPARTOS_VALORES_TTL_HOY
+
+def _valores_hash(data: List[Dict]) -> str:
+    """Hash estable del contenido (independiente del orden de claves)"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _fetch_repartos_valores(fecha: str) -> List[Dict]:
+    params = {"idreparto": 0, "fecha": fecha}
     
-    Args:
-        fecha: Fecha en formato "DD/MM/YYYY"
+    logging.debug(f"🌐 Consultando API: {REPARTOS_VALORES_URL}?idreparto=0&fecha={fecha}")
     
-    Returns:
-        Lista de diccionarios con los valores de repartos
+    response = requests.get(REPARTOS_VALORES_URL, params=params, timeout=30)
+    response.raise_for_status()
+    
+    data = response.json()
+    if not isinstance(data, list):
+        raise ValueError(f"Respuesta inesperada de reparto_get_valores: {type(data).__name__}")
+    return data
+
+def _get_valores_entry(fecha: str, force_refresh: bool = False) -> Optional[_ValoresEntry]:
     """
-    try:
-        url = "http://192.168.0.8:97/service1.asmx/reparto_get_valores"
-        params = {"idreparto": 0, "fecha": fecha}
-        
-        logging.debug(f"🌐 Consultando API: {url}?idreparto=0&fecha={fecha}")
+    Devuelve la respuesta de reparto_get_valores para la fecha desde la caché o consultando la API.
+    Una sola consulta por fecha a la vez: las llamadas concurrentes esperan y reutilizan el resultado.
+    Si la API falla se devuelve la última copia conocida (aunque esté vencida) o None.
+    """
+    pedido = time.monotonic()
+    with _valores_lock:
+        entry = _valores_cache.get(fecha)
+        if entry is not None and not force_refresh and entry.expires_at > pedido:
+            _valores_cache.move_to_end(fecha)
+            return entry
+        fetch_lock = _valores_fetch_locks.setdefault(fecha, threading.Lock())
+    
+    with fetch_lock:
+        with _valores_lock:
+            entry = _valores_cache.get(fecha)
+        # Otra llamada ya la consultó mientras esperábamos
+        if entry is not None and entry.fetched_at >= pedido:
+            return entry
+        if entry is not None and not force_refresh and entry.expires_at > time.monotonic():
+            return entry
         
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
+        try:
+            data = _fetch_repartos_valores(fecha)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"❌ Error al consultar API externa: {str(e)}")
+            if entry is not None:
+                logging.warning(f"⚠️ Usando valores en caché de {fecha} (hash {entry.content_hash[:12]})")
+            return entry
         
-        data = response.json()
+        content_hash = _valores_hash(data)
+        if entry is not None and entry.content_hash != content_hash:
+            logging.info(f"🔄 Valores de repartos del {fecha} cambiaron (hash {entry.content_hash[:12]} -> {content_hash[:12]})")
         
-        # Filtrar repartos que tienen valores (efectivo > 0 o retenciones > 0 o cheques > 0)
-        repartos_con_valores = []
-        for r in data:
-            # Buscar tanto mayúsculas como minúsculas
-            efectivo = float(r.get("efectivo", 0) or r.get("Efectivo", 0) or 0)
-            retenciones = float(r.get("Retenciones", 0) or r.get("retenciones", 0) or 0)
-            cheques = float(r.get("Cheques", 0) or r.get("cheques", 0) or 0)
-            
-            if efectivo > 0 or retenciones > 0 or cheques > 0:
-                repartos_con_valores.append(r)
+        fetched_at = time.monotonic()
+        if entry is not None and entry.content_hash == content_hash:
+            # Sin cambios: se conserva la lista ya cacheada y solo se renueva el vencimiento
+            data = entry.data
+        new_entry = _ValoresEntry(data, content_hash, fetched_at, fetched_at + _valores_ttl(fecha))
         
-        logging.info(f"✅ API externa respondió: {len(data)} repartos total, {len(repartos_con_valores)} con valores > 0")
-        
-        return repartos_con_valores
+        with _valores_lock:
+            _valores_cache[fecha] = new_entry
+            _valores_cache.move_to_end(fecha)
+            while len(_valores_cache) > REPARTOS_VALORES_CACHE_MAX:
+                viejo, _ = _valores_cache.popitem(last=False)
+                _valores_fetch_locks.pop(viejo, None)
+        return new_entry
+
+def invalidate_repartos_valores_cache(fecha: Optional[str] = None):
+    """Descarta los valores en memoria de una fecha ("DD/MM/YYYY") o de todas"""
+    with _valores_lock:
+        if fecha is None:
+            _valores_cache.clear()
+        else:
+            _valores_cache.pop(fecha, None)
+
+def get_repartos_valores_todos(fecha: str, force_refresh: bool = False) -> List[Dict]:
+    """
+    Respuesta completa de reparto_get_valores para la fecha ("DD/MM/YYYY"), incluidos
+    los repartos sin valores. Compartida con get_repartos_valores a través de la caché.
+    """
+    entry = _get_valores_entry(fecha, force_refresh)
+    return list(entry.data) if entry is not None else []
+
+def _repartos_con_valores(data: List[Dict]) -> List[Dict]:
+    """Filtra los repartos que tienen valores (efectivo > 0 o retenciones > 0 o cheques > 0)"""
+    repartos_con_valores = []
+    for r in data:
+        # Buscar tanto mayúsculas como minúsculas
+        efectivo = float(r.get("efectivo", 0) or r.get("Efectivo", 0) or 0)
+        retenciones = float(r.get("Retenciones", 0) or r.get("retenciones", 0) or 0)
+        cheques = float(r.get("Cheques", 0) or r.get("cheques", 0) or 0)
         
-    except requests.exceptions.RequestException as e:
-        logging.error(f"❌ Error al consultar API externa: {str(e)}")
-        return []
+        if efectivo > 0 or retenciones > 0 or cheques > 0:
+            repartos_con_valores.append(r)
+    
+    logging.info(f"✅ API externa respondió: {len(data)} repartos total, {len(repartos_con_valores)} con valores > 0")
+    return repartos_con_valores
+
+def get_repartos_valores_con_hash(fecha: str, force_refresh: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Como get_repartos_valores, pero devuelve también el hash de la copia usada
+    (la misma entrada de la caché: no se vuelve a consultar para obtenerlo)
+    """
+    try:
+        entry = _get_valores_entry(fecha, force_refresh)
+        if entry is None:
+            return [], None
+        return _repartos_con_valores(entry.data), entry.content_hash
     except Exception as e:
         logging.error(f"❌ Error procesando respuesta de API externa: {str(e)}")
-        return []
+        return [], None
 
-def extraer_idreparto_de_user_name(user_name: str) -> Optional[int]:
+def get_repartos_valores(fecha: str, force_refresh: bool = False) -> List[Dict]:
     """
-    Extrae el idreparto del user_name usando patrones robustos
+    Obtiene los valores esperados de repartos desde la API externa
+    
+    La respuesta se guarda en memoria por fecha (REPARTOS_VALORES_TTL_HOY para hoy,
+    REPARTOS_VALORES_TTL_PASADO para días anteriores), así el cierre, la sincronización
+    y las consultas de composición no descargan los mismos valores varias veces.
     
     Args:
-        user_name: Nombre de usuario del depósito
+        fecha: Fecha en formato "DD/MM/YYYY"
+        force_refresh: Consultar la API aunque haya una copia vigente
     
     Returns:
-        El idreparto extraído o None si no se pudo extraer
-    
-    Ejemplos:
-        "42, RTO 042" -> 42
-        "RTO 277, 277" -> 277
-        "1, algo más" -> 1
-        "RTO 123, algo" -> 123
+        Lista de diccionarios con los valores de repartos
     """
-    if not user_name:
-        return None
-    
-    try:
-        # Buscar el primer número antes de la coma
-        # Esto maneja casos como "42, RTO 042" y "RTO 277, 277"
-        parte_antes_coma = user_name.split(",")[0].strip()
-        
-        # Buscar todos los números en la parte antes de la coma
-        numeros = re.findall(r'\d+', parte_antes_coma)
-        
-        if numeros:
-            # Tomar el primer número encontrado
-            return int(numeros[0])
-        
-        # Si no hay números antes de la coma, buscar después de la coma
-        # Esto maneja casos edge como ", 123"
-        if "," in user_name:
-            parte_despues_coma = user_name.split(",", 1)[1].strip()
-            numeros_despues = re.findall(r'\d+', parte_despues_coma)
-            if numeros_despues:
-                return int(numeros_despues[0])
-        
-        return None
-        
-    except (ValueError, IndexError) as e:
-        logging.warning(f"⚠️ Error al extraer idreparto de '{user_name}': {e}")
-        return None
+    repartos_con_valores, _ = get_repartos_valores_con_hash(fecha, force_refresh)
+    return repartos_con_valores
 
 def mapear_idreparto_a_user_name(idreparto: int) -> str:
     """
@@ -110,29 +186,29 @@ def mapear_idreparto_a_user_name(idreparto: int) -> str:
     numero_formateado = str(idreparto).zfill(3)  # Rellenar con ceros
     return f"{idreparto}, RTO {numero_formateado}"
 
-def actualizar_depositos_esperados(fecha_str: str) -> Dict:
+def actualizar_depositos_esperados(fecha_str: str, force_refresh: bool = False) -> Dict:
     """
     Actualiza los valores esperados de todos los depósitos para una fecha
     
     Args:
         fecha_str: Fecha en formato "YYYY-MM-DD"
+        force_refresh: Consultar la API aunque haya valores vigentes en memoria
     
     Returns:
         Diccionario con el resultado de la operación
     """
     from database import SessionLocal
     from models.deposit import Deposit
-    from sqlalchemy import and_, func, text
-    from sqlalchemy.types import Date
-    from datetime import datetime as dt
+    from sqlalchemy import and_, func
+    from datetime import datetime as dt, timedelta
     
     try:
         # Convertir fecha de "YYYY-MM-DD" a "DD/MM/YYYY" para la API externa
         fecha_obj = dt.strptime(fecha_str, "%Y-%m-%d")
         fecha_api = fecha_obj.strftime("%d/%m/%Y")
         
-        # Obtener valores de la API externa
-        repartos_valores = get_repartos_valores(fecha_api)
+        # Obtener valores de la API externa (con el hash de esa misma copia para el resultado)
+        repartos_valores, valores_hash = get_repartos_valores_con_hash(fecha_api, force_refresh=force_refresh)
         
         if not repartos_valores:
             return {
@@ -143,19 +219,17 @@ def actualizar_depositos_esperados(fecha_str: str) -> Dict:
         
         db = SessionLocal()
         
-        # Convertir fecha para consultar depósitos
-        query_date = fecha_obj.date()
-        
-        # Obtener depósitos de la fecha especificada
-        # Compatibilidad SQL Server: usar CAST(datetime AS date)
-        deposits = db.query(Deposit).filter(
-            func.cast(Deposit.date_time, Date) == query_date
-        ).all()
+        # Rango del día (usa el índice por idreparto + date_time)
+        inicio_dia = fecha_obj
+        fin_dia = fecha_obj + timedelta(days=1)
+        filtro_dia = and_(Deposit.date_time >= inicio_dia, Deposit.date_time < fin_dia)
         
-        actualizados = 0
-        detalles = []
-        extracciones_exitosas = 0
-        coincidencias_encontradas = 0
+        # idreparto se extrae al guardar (Deposit._set_idreparto) y la migración completó los
+        # anteriores: NULL significa que user_name no tiene un idreparto y no se vuelve a intentar
+        depositos_encontrados = db.query(func.count(Deposit.id)).filter(filtro_dia).scalar()
+        extracciones_exitosas = db.query(func.count(Deposit.id)).filter(
+            filtro_dia, Deposit.idreparto.isnot(None)
+        ).scalar()
         
         # Crear mapas de idreparto -> valores y composiciones para búsqueda rápida
         # Asegurar que los keys sean enteros para comparación correcta
@@ -202,62 +276,32 @@ def actualizar_depositos_esperados(fecha_str: str) -> Dict:
         
         logging.info(f"📊 IDs de reparto disponibles en API: {sorted(valores_map.keys())}")
         
-        for deposit in deposits:
-            # Intentar extraer el idreparto del user_name
-            if deposit.user_name:
-                idreparto = extraer_idreparto_de_user_name(deposit.user_name)
-                
-                if idreparto is not None:
-                    extracciones_exitosas += 1
-                    logging.debug(f"🔍 Extraído idreparto {idreparto} de '{deposit.user_name}'")
-                    
-                    # Buscar el valor esperado en los datos de la API
-                    if idreparto in valores_map:
-                        coincidencias_encontradas += 1
-                        total_esperado = int(valores_map[idreparto])
-                        efectivo_esperado = int(efectivos_map.get(idreparto, 0))
-                        composicion = composiciones_map.get(idreparto, "E")
-                        
-                        logging.debug(f"💰 Depósito {deposit.deposit_id}: actual={deposit.deposit_esperado}, esperado={total_esperado}, efectivo={efectivo_esperado}, composición={composicion}")
-                        
-                        # Actualizar solo si el valor o composición cambió
-                        if deposit.deposit_esperado != total_esperado or deposit.composicion_esperado != composicion:
-                            old_value = deposit.deposit_esperado
-                            old_composicion = deposit.composicion_esperado
-                            
-                            deposit.deposit_esperado = total_esperado
-                            deposit.efectivo_esperado = efectivo_esperado  # Guardar efectivo por separado
-                            deposit.composicion_esperado = composicion
-                            
-                            # Actualizar estado automáticamente
-                            deposit.actualizar_estado()
-                            
-                            actualizados += 1
-                            detalles.append({
-                                "deposit_id": deposit.deposit_id,
-                                "user_name": deposit.user_name,
-                                "idreparto": idreparto,
-                                "old_expected": old_value,
-                                "new_expected": total_esperado,
-                                "old_composicion": old_composicion,
-                                "new_composicion": composicion,
-                                "estado": deposit.estado.value
-                            })
-                            
-                            logging.info(f"💰 Actualizado {deposit.deposit_id}: {old_value} -> {total_esperado}, composición: {old_composicion} -> {composicion} (idreparto: {idreparto})")
-                        else:
-                            logging.debug(f"✓ Depósito {deposit.deposit_id} ya tiene el valor y composición correctos: {total_esperado} ({composicion})")
-                    else:
-                        logging.warning(f"⚠️ No se encontró valor para idreparto {idreparto} en API externa (user_name: '{deposit.user_name}')")
-                else:
-                    logging.warning(f"⚠️ No se pudo extraer idreparto de user_name '{deposit.user_name}'")
+        # Aplicar todos los valores con UPDATE ... FROM por lotes (match por día + idreparto en SQL)
+        filas_api = [
+            {
+                "idreparto": idreparto,
+                "total": int(total),
+                "efectivo": int(efectivos_map.get(idreparto, 0)),
+                "composicion": composiciones_map.get(idreparto, "E")
+            }
+            for idreparto, total in valores_map.items()
+        ]
+        coincidencias_encontradas, detalles = aplicar_valores_esperados(db, inicio_dia, fin_dia, filas_api)
+        actualizados = len(detalles)
+        
+        sin_valor = extracciones_exitosas - coincidencias_encontradas
+        if sin_valor:
+            logging.warning(f"⚠️ {sin_valor} depósitos con idreparto sin valor en la API externa")
+        sin_idreparto = depositos_encontrados - extracciones_exitosas
+        if sin_idreparto:
+            logging.warning(f"⚠️ {sin_idreparto} depósitos sin idreparto extraíble de user_name")
         
         # Guardar cambios
         db.commit()
         db.close()
         
         logging.info(f"📈 Estadísticas de procesamiento:")
-        logging.info(f"  - Depósitos procesados: {len(deposits)}")
+        logging.info(f"  - Depósitos procesados: {depositos_encontrados}")
         logging.info(f"  - Extracciones exitosas: {extracciones_exitosas}")
         logging.info(f"  - Coincidencias encontradas: {coincidencias_encontradas}")
         logging.info(f"  - Actualizaciones realizadas: {actualizados}")
@@ -267,14 +311,17 @@ def actualizar_depositos_esperados(fecha_str: str) -> Dict:
             "message": f"Procesamiento completado para {fecha_str}",
             "fecha": fecha_str,
             "repartos_api": len(repartos_valores),
-            "depositos_encontrados": len(deposits),
+            "depositos_encontrados": depositos_encontrados,
             "extracciones_exitosas": extracciones_exitosas,
             "coincidencias_encontradas": coincidencias_encontradas,
             "actualizados": actualizados,
+            "valores_hash": valores_hash,
             "detalles": detalles
         }
         
         logging.info(f"✅ Actualización completada: {actualizados} depósitos actualizados")
+        for detalle in detalles:
+            logging.debug(f"💰 Actualizado {detalle['deposit_id']}: {detalle['old_expected']} -> {detalle['new_expected']}, composición: {detalle['old_composicion']} -> {detalle['new_composicion']} (idreparto: {detalle['idreparto']})")
         
         return resultado
         
@@ -286,6 +333,108 @@ def actualizar_depositos_esperados(fecha_str: str) -> Dict:
             "actualizados": 0
         }
 
+# Filas de valores por sentencia (4 parámetros por fila: límite de 2100 en SQL Server, 500 SELECT por UNION en SQLite)
+VALORES_POR_LOTE = 400
+
+def aplicar_valores_esperados(db, inicio_dia: datetime, fin_dia: datetime, filas_api: List[Dict]):
+    """
+    Aplica los valores esperados de la API a los depósitos del día con sentencias por lote:
+    un SELECT de los depósitos que cambian (para informar valores anteriores) y un
+    UPDATE ... FROM contra una tabla derivada con (idreparto, total, efectivo, composicion).
+    El estado se recalcula en SQL: PENDIENTE si el depósito tiene cheques o retenciones, LISTO si no.
+    No hace commit.
+    
+    Returns:
+        (coincidencias, detalles) - depósitos del día con valores en la API y detalle de los modificados
+    """
+    from sqlalchemy import Integer, String, and_, case, exists, func, literal, or_, select, union_all, update
+    from models.deposit import Deposit, EstadoDeposito
+    from models.cheque_retencion import Cheque, Retencion
+    from services.deposit_change_tracker import mark_deposits_changed
+    
+    tiene_movimientos = or_(
+        exists().where(Cheque.deposit_id == Deposit.deposit_id),
+        exists().where(Retencion.deposit_id == Deposit.deposit_id)
+    )
+    nuevo_estado = case(
+        (tiene_movimientos, literal(EstadoDeposito.PENDIENTE, Deposit.estado.type)),
+        else_=literal(EstadoDeposito.LISTO, Deposit.estado.type)
+    )
+    
+    coincidencias = 0
+    detalles = []
+    for i in range(0, len(filas_api), VALORES_POR_LOTE):
+        lote = filas_api[i:i + VALORES_POR_LOTE]
+        # SELECT ... UNION ALL en lugar de VALUES: SQLite no admite alias de columnas sobre VALUES
+        valores = union_all(*[
+            select(
+                literal(f["idreparto"], Integer).label("idreparto"),
+                literal(f["total"], Integer).label("total"),
+                literal(f["efectivo"], Integer).label("efectivo"),
+                literal(f["composicion"], String).label("composicion")
+            )
+            for f in lote
+        ]).subquery("valores_api")
+        
+        match = and_(
+            Deposit.idreparto == valores.c.idreparto,
+            Deposit.date_time >= inicio_dia,
+            Deposit.date_time < fin_dia
+        )
+        cambio = or_(
+            Deposit.deposit_esperado.is_(None),
+            Deposit.deposit_esperado != valores.c.total,
+            Deposit.composicion_esperado.is_(None),
+            Deposit.composicion_esperado != valores.c.composicion
+        )
+        
+        coincidencias += db.execute(select(func.count(Deposit.id)).where(match)).scalar()
+        
+        cambiados = db.execute(
+            select(
+                Deposit.deposit_id,
+                Deposit.user_name,
+                Deposit.idreparto,
+                Deposit.deposit_esperado,
+                Deposit.composicion_esperado,
+                valores.c.total,
+                valores.c.composicion,
+                nuevo_estado.label("estado")
+            ).where(match, cambio)
+        ).all()
+        if not cambiados:
+            continue
+        
+        db.execute(
+            update(Deposit)
+            .where(match, cambio)
+            .values(
+                deposit_esperado=valores.c.total,
+                efectivo_esperado=valores.c.efectivo,
+                composicion_esperado=valores.c.composicion,
+                estado=nuevo_estado
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        for row in cambiados:
+            detalles.append({
+                "deposit_id": row.deposit_id,
+                "user_name": row.user_name,
+                "idreparto": row.idreparto,
+                "old_expected": row.deposit_esperado,
+                "new_expected": row.total,
+                "old_composicion": row.composicion_esperado,
+                "new_composicion": row.composicion,
+                "estado": row.estado.value
+            })
+    
+    # UPDATE con SQL Core: avisar al tracker para recalcular agregados del día
+    if detalles:
+        mark_deposits_changed(db, deposit_ids=[d["deposit_id"] for d in detalles], fechas=[inicio_dia])
+    
+    return coincidencias, detalles
+
 def generar_composicion_esperado(reparto_data: Dict) -> str:
     """
     Genera la composición del valor esperado usando E (efectivo), C (cheques), R (retenciones)
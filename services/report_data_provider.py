@@ -0,0 +1,220 @@
+"""
+Proveedor de datos para los reportes PDF
+
+Arma los datos de los PDFs de cierre diario y de repartos a partir de las
+tablas ya sincronizadas (deposits, cheques, retenciones y daily_totals) en
+lugar de volver a consultar miniBank en cada descarga. Con `sync=True` se
+sincronizan primero los depósitos del día y luego se lee de la base igual.
+
+Los depósitos se devuelven con la misma forma que la respuesta de miniBank
+({máquina: {"ArrayOfWSDepositsByDayDTO": {"WSDepositsByDayDTO": [...]}}}),
+así los generadores de PDF reciben datos planos sin importar el origen.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select, func
+
+from database import SessionLocal
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from services.deposits_service import (
+    PLANTAS_MAQUINAS,
+    get_deposits_for_machines,
+    get_all_totals,
+    save_deposits_to_db
+)
+from services.daily_totals_service import query_daily_totals
+
+# Filas que se traen de la base por lote al recorrer un rango de fechas
+RANGE_BATCH_SIZE = 1000
+
+
+def _machines_for_plant(plant: Optional[str] = None) -> List[str]:
+    if plant:
+        return list(PLANTAS_MAQUINAS[plant])
+    return [maquina for maquinas in PLANTAS_MAQUINAS.values() for maquina in maquinas]
+
+
+def _deposit_to_dto(deposit: Deposit) -> Dict:
+    """Convierte un depósito de la base al formato WSDepositsByDayDTO de miniBank"""
+    return {
+        "depositId": deposit.deposit_id,
+        "identifier": deposit.identifier,
+        "userName": deposit.user_name or "",
+        "dateTime": deposit.date_time.isoformat() if deposit.date_time else "",
+        "posName": deposit.pos_name or "",
+        "stName": deposit.st_name or "",
+        "depositType": deposit.deposit_type or "",
+        "currencies": {
+            "WSDepositCurrency": {
+                "currencyCode": deposit.currency_code or "",
+                "totalAmount": str(deposit.total_amount or 0)
+            }
+        }
+    }
+
+
+def sync_deposits(date: str, plant: Optional[str] = None) -> Dict:
+    """
+    Consulta miniBank y guarda los depósitos del día (y los totales diarios si es el día completo)
+    """
+    deposits_data = get_deposits_for_machines(_machines_for_plant(plant), date)
+    save_deposits_to_db(deposits_data)
+    if plant is None:
+        get_all_totals(date, deposits_data=deposits_data)
+    return deposits_data
+
+
+def load_deposits_data(date: str, plant: Optional[str] = None) -> Dict:
+    """
+    Lee de la base los depósitos del día agrupados por máquina con la forma de la respuesta de miniBank
+    """
+    machines = _machines_for_plant(plant)
+    inicio = datetime.strptime(date, "%Y-%m-%d")
+    fin = inicio + timedelta(days=1)
+
+    deposits_data = {
+        machine: {"ArrayOfWSDepositsByDayDTO": {"WSDepositsByDayDTO": []}}
+        for machine in machines
+    }
+
+    db = SessionLocal()
+    try:
+        deposits = db.query(Deposit).filter(
+            Deposit.identifier.in_(machines),
+            Deposit.date_time >= inicio,
+            Deposit.date_time < fin
+        ).order_by(Deposit.date_time).all()
+
+        for deposit in deposits:
+            deposits_data[deposit.identifier]["ArrayOfWSDepositsByDayDTO"]["WSDepositsByDayDTO"].append(
+                _deposit_to_dto(deposit)
+            )
+        return deposits_data
+    finally:
+        db.close()
+
+
+def load_daily_closure_data(date: str, sync: bool = False):
+    """
+    Datos para el PDF de cierre diario: (totals_data, deposits_data)
+
+    Los totales se calculan con los mismos depósitos que se listan en el PDF. Si una planta
+    no tiene depósitos sincronizados pero sí un total guardado en daily_totals (por ejemplo,
+    días completados por el backfill), se usa ese total.
+    """
+    if sync:
+        sync_deposits(date)
+
+    deposits_data = load_deposits_data(date)
+    totals = get_all_totals(date, deposits_data=deposits_data, save=False)
+
+    saved_totals = {t["plant"]: t for t in query_daily_totals(date, date)}
+    for planta, plant_totals in totals["plants"].items():
+        saved = saved_totals.get(planta)
+        if plant_totals["count"] == 0 and saved:
+            plant_totals["total"] = saved["total_amount"]
+            plant_totals["count"] = saved["deposit_count"]
+            totals[f"{planta}_total"] = saved["total_amount"]
+
+    totals["grand_total"] = sum(p["total"] for p in totals["plants"].values())
+    totals["deposit_count"] = sum(p["count"] for p in totals["plants"].values())
+    return totals, deposits_data
+
+
+def load_repartos_data(date: str, plant: Optional[str] = None, sync: bool = False) -> Dict:
+    """
+    Datos para el PDF de repartos detallados (todas las plantas o una sola)
+    """
+    if sync:
+        sync_deposits(date, plant)
+    return load_deposits_data(date, plant)
+
+
+def _documentos_por_deposito(model, inicio: datetime, fin: datetime):
+    """Subconsulta con el total de cheques/retenciones por depósito del rango"""
+    return (
+        select(model.deposit_id.label("deposit_id"), func.sum(model.importe).label("total"))
+        .join(Deposit, Deposit.deposit_id == model.deposit_id)
+        .where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+        .group_by(model.deposit_id)
+        .subquery()
+    )
+
+
+def iter_range_deposits(
+    start_date: str,
+    end_date: str,
+    plant: Optional[str] = None,
+    batch_size: int = RANGE_BATCH_SIZE
+) -> Iterator[Dict]:
+    """
+    Recorre los depósitos de un rango de fechas (inclusive) ordenados por fecha y hora, con sus
+    totales de cheques y retenciones, trayendo `batch_size` filas por vez desde la base.
+    """
+    inicio = datetime.strptime(start_date, "%Y-%m-%d")
+    fin = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+
+    cheques_sq = _documentos_por_deposito(Cheque, inicio, fin)
+    retenciones_sq = _documentos_por_deposito(Retencion, inicio, fin)
+
+    stmt = (
+        select(
+            Deposit.deposit_id,
+            Deposit.identifier,
+            Deposit.user_name,
+            Deposit.date_time,
+            Deposit.total_amount,
+            func.coalesce(cheques_sq.c.total, 0).label("cheques"),
+            func.coalesce(retenciones_sq.c.total, 0).label("retenciones")
+        )
+        .outerjoin(cheques_sq, cheques_sq.c.deposit_id == Deposit.deposit_id)
+        .outerjoin(retenciones_sq, retenciones_sq.c.deposit_id == Deposit.deposit_id)
+        .where(
+            Deposit.identifier.in_(_machines_for_plant(plant)),
+            Deposit.date_time >= inicio,
+            Deposit.date_time < fin
+        )
+        .order_by(Deposit.date_time, Deposit.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    db = SessionLocal()
+    try:
+        for row in db.execute(stmt):
+            yield row._asdict()
+    finally:
+        db.close()
+
+
+def load_cheques_retenciones(deposits_data: Dict) -> Dict:
+    """
+    Totales de cheques y retenciones por depósito para los depósitos del reporte
+    """
+    from services.pdf_service import get_cheques_retenciones_totals_map
+
+    deposit_ids = [
+        dto["depositId"]
+        for contenido in deposits_data.values()
+        for dto in contenido.get("ArrayOfWSDepositsByDayDTO", {}).get("WSDepositsByDayDTO", [])
+    ]
+    return get_cheques_retenciones_totals_map(deposit_ids)
+
+
+def report_fingerprint(
+    report_type: str,
+    date: str,
+    plant: Optional[str],
+    deposits_data: Dict,
+    totals: Optional[Dict] = None,
+    cheques_retenciones: Optional[Dict] = None
+) -> str:
+    """
+    Huella de los datos de un reporte: depósitos, totales y cheques/retenciones por depósito
+    """
+    from services.pdf_cache import compute_fingerprint
+
+    if cheques_retenciones is None:
+        cheques_retenciones = load_cheques_retenciones(deposits_data)
+    return compute_fingerprint(report_type, date, plant, deposits_data, totals, cheques_retenciones)
@@ -0,0 +1,211 @@
+"""
+Versionado de filas para consultas incrementales de depósitos
+
+Cada commit que toca depósitos, cheques o retenciones toma el siguiente valor
+de la secuencia `deposits` (tabla change_sequence) y lo graba como row_version
+en los depósitos afectados y en sus cheques y retenciones. Los borrados
+(hechos con el ORM) dejan una lápida en `deleted_rows` con esa misma versión.
+
+El incremento de la secuencia bloquea su fila hasta el commit, así que las
+versiones quedan en el orden en que se confirman las transacciones: un cliente
+que guardó el cursor N y pide `row_version > N` no puede saltearse cambios.
+"""
+import os
+import time as time_module
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from sqlalchemy import select, update, insert, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from models.deposit import Deposit
+from models.cheque_retencion import Cheque, Retencion
+from models.change_tracking import ChangeSequence, DeletedRow
+from services.deposits_service import get_planta_from_identifier
+from services.deposit_change_tracker import on_before_commit
+
+SEQUENCE_DEPOSITS = "deposits"
+# Mayor row_version de lápidas ya purgadas: cursores anteriores necesitan recarga completa
+SEQUENCE_TOMBSTONES_PURGED = "deleted_rows_purged"
+
+DELETED_ROWS_RETENTION_DAYS = int(os.getenv("DELETED_ROWS_RETENTION_DAYS", "30"))
+DELETED_ROWS_PURGE_INTERVAL = int(os.getenv("DELETED_ROWS_PURGE_INTERVAL", "3600"))
+
+# Tamaño de lote para IN (...) sin superar límites de parámetros
+_IN_CHUNK_SIZE = 500
+
+_last_purge = 0.0
+
+
+def _increment_sequence(db: Session, name: str, value=None) -> None:
+    """Suma 1 a la secuencia (o la lleva a `value`), creándola si todavía no existe"""
+    nuevo_valor = ChangeSequence.value + 1 if value is None else value
+    stmt = update(ChangeSequence).where(ChangeSequence.name == name).values(value=nuevo_valor)
+    if db.execute(stmt).rowcount:
+        return
+    conn = db.connection()
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(ChangeSequence).values(name=name, value=1 if value is None else value))
+    except IntegrityError:
+        # Otra transacción la creó al mismo tiempo
+        db.execute(stmt)
+
+
+def current_row_version(db: Session, name: str = SEQUENCE_DEPOSITS) -> int:
+    """Último valor confirmado de la secuencia (0 si no hubo cambios)"""
+    value = db.execute(select(ChangeSequence.value).where(ChangeSequence.name == name)).scalar()
+    return int(value or 0)
+
+
+def next_row_version(db: Session) -> int:
+    """Toma la próxima versión dentro de la transacción actual de `db`"""
+    _increment_sequence(db, SEQUENCE_DEPOSITS)
+    return current_row_version(db)
+
+
+def purge_deleted_rows(db: Session, retention_days: int = DELETED_ROWS_RETENTION_DAYS) -> int:
+    """
+    Borra las lápidas más viejas que `retention_days` (no hace commit) y guarda hasta
+    qué versión se purgó. Devuelve la cantidad de lápidas borradas.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    max_version = db.execute(
+        select(func.max(DeletedRow.row_version)).where(DeletedRow.deleted_at < cutoff)
+    ).scalar()
+    if max_version is None:
+        return 0
+    borradas = db.execute(delete(DeletedRow).where(DeletedRow.row_version <= max_version)).rowcount or 0
+    if max_version > current_row_version(db, SEQUENCE_TOMBSTONES_PURGED):
+        _increment_sequence(db, SEQUENCE_TOMBSTONES_PURGED, value=max_version)
+    return borradas
+
+
+@on_before_commit
+def _stamp_row_versions_on_commit(session: Session, changes):
+    """Versiona los depósitos tocados (y sus documentos) y registra los borrados"""
+    global _last_purge
+    if not changes.deposit_ids and not changes.eliminados:
+        return
+
+    version = next_row_version(session)
+    now = datetime.utcnow()
+    ids = sorted(changes.deposit_ids)
+    for i in range(0, len(ids), _IN_CHUNK_SIZE):
+        chunk = ids[i:i + _IN_CHUNK_SIZE]
+        session.execute(
+            update(Deposit).where(Deposit.deposit_id.in_(chunk))
+            .values(row_version=version, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        for model in (Cheque, Retencion):
+            session.execute(
+                update(model).where(model.deposit_id.in_(chunk))
+                .values(row_version=version)
+                .execution_options(synchronize_session=False)
+            )
+
+    if changes.eliminados:
+        session.execute(insert(DeletedRow), [
+            {
+                "table_name": tabla,
+                "row_key": clave,
+                "deposit_id": deposit_id,
+                "date": (
+                    changes.fechas_por_deposito[deposit_id].strftime("%Y-%m-%d")
+                    if deposit_id in changes.fechas_por_deposito else None
+                ),
+                "row_version": version,
+                "deleted_at": now
+            }
+            for tabla, clave, deposit_id in changes.eliminados
+        ])
+
+    if time_module.monotonic() - _last_purge > DELETED_ROWS_PURGE_INTERVAL:
+        _last_purge = time_module.monotonic()
+        purge_deleted_rows(session)
+
+
+def _deposit_data(deposit: Deposit) -> dict:
+    """Depósito con la misma forma que en /db/deposits/by-plant, más planta y versión"""
+    return {
+        "deposit_id": deposit.deposit_id,
+        "row_version": deposit.row_version,
+        "plant": get_planta_from_identifier(deposit.identifier or ""),
+        "identifier": deposit.identifier,
+        "user_name": deposit.user_name,
+        "total_amount": deposit.total_amount,
+        "deposit_esperado": deposit.deposit_esperado,
+        "composicion_esperado": deposit.composicion_esperado,
+        "diferencia": deposit.diferencia,
+        "tiene_diferencia": deposit.tiene_diferencia,
+        "estado": deposit.estado.value if deposit.estado else "PENDIENTE",
+        "currency_code": deposit.currency_code,
+        "deposit_type": deposit.deposit_type,
+        "date_time": deposit.date_time.isoformat(),
+        "pos_name": deposit.pos_name,
+        "st_name": deposit.st_name,
+        "cheques": [{
+            "id": cheque.id,
+            "nrocta": cheque.nrocta,
+            "concepto": cheque.concepto,
+            "banco": cheque.banco,
+            "sucursal": cheque.sucursal,
+            "localidad": cheque.localidad,
+            "nro_cheque": cheque.nro_cheque,
+            "nro_cuenta": cheque.nro_cuenta,
+            "titular": cheque.titular,
+            "fecha": cheque.fecha,
+            "importe": float(cheque.importe) if cheque.importe else 0.0
+        } for cheque in deposit.cheques],
+        "retenciones": [{
+            "id": retencion.id,
+            "nrocta": retencion.nrocta,
+            "concepto": retencion.concepto,
+            "nro_retencion": retencion.nro_retencion,
+            "fecha": retencion.fecha,
+            "importe": float(retencion.importe) if retencion.importe else 0.0
+        } for retencion in deposit.retenciones],
+        "total_cheques": deposit.cheques_count,
+        "total_retenciones": deposit.retenciones_count,
+        "semaforo_docs": deposit.semaforo_docs
+    }
+
+
+def get_deposit_changes(db: Session, fecha: date, since: Optional[int] = None) -> dict:
+    """
+    Depósitos del día modificados después del cursor `since` (con sus cheques y
+    retenciones) y lápidas de lo borrado. Sin cursor, con uno anterior a la última
+    purga de lápidas o con uno posterior a la versión actual (base restaurada),
+    devuelve el día completo con `full=True` para que el cliente reemplace todo.
+    """
+    # El cursor se lee antes que las filas: lo que se confirme en el medio vuelve a venir la próxima vez
+    cursor = current_row_version(db)
+    purgado = current_row_version(db, SEQUENCE_TOMBSTONES_PURGED)
+    full = not since or since < purgado or since > cursor
+
+    inicio = datetime.combine(fecha, time.min)
+    fin = inicio + timedelta(days=1)
+    query = db.query(Deposit).options(
+        selectinload(Deposit.cheques), selectinload(Deposit.retenciones)
+    ).filter(Deposit.date_time >= inicio, Deposit.date_time < fin)
+    if not full:
+        query = query.filter(Deposit.row_version > since)
+    deposits = query.order_by(Deposit.row_version, Deposit.id).all()
+
+    eliminados = {"deposits": [], "cheques": [], "retenciones": []}
+    if not full:
+        tombstones = db.query(DeletedRow.table_name, DeletedRow.row_key).filter(
+            DeletedRow.date == fecha.strftime("%Y-%m-%d"),
+            DeletedRow.row_version > since
+        ).order_by(DeletedRow.row_version).all()
+        for table_name, row_key in tombstones:
+            if table_name in eliminados:
+                eliminados[table_name].append(row_key if table_name == Deposit.__tablename__ else int(row_key))
+
+    return {
+        "since": since or 0,
+        "cursor": cursor,
+        "full": full,
+        "deposits": [_deposit_data(d) for d in deposits],
+        "deleted": eliminados
+    }
@@ -0,0 +1,116 @@
+"""
+Servicio del semáforo de documentos por depósito
+
+Cada depósito guarda cuántos cheques y retenciones tiene cargados y el color
+de su semáforo (VERDE / AMARILLO / GRIS) según la composición esperada. Los
+valores se recalculan en SQL justo antes del commit, para los depósitos que
+la transacción tocó (alta/baja de cheques y retenciones, sincronización de
+valores esperados), así los listados y el resumen por planta no necesitan
+cargar los documentos de cada depósito.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+from sqlalchemy import select, update, func, case, and_, or_, literal
+from sqlalchemy.orm import Session
+from models.deposit import Deposit, SEMAFORO_VERDE, SEMAFORO_AMARILLO, SEMAFORO_GRIS
+from models.cheque_retencion import Cheque, Retencion
+from services.deposits_service import PLANTAS_MAQUINAS, get_planta_from_identifier
+from services.deposit_change_tracker import on_before_commit
+
+# Tamaño de lote para IN (...) sin superar límites de parámetros
+_IN_CHUNK_SIZE = 500
+
+SEMAFOROS = (SEMAFORO_VERDE, SEMAFORO_AMARILLO, SEMAFORO_GRIS)
+
+
+def _cantidad_documentos(model):
+    """Subconsulta correlacionada con la cantidad de documentos del depósito"""
+    return (
+        select(func.count(model.id))
+        .where(model.deposit_id == Deposit.deposit_id)
+        .scalar_subquery()
+    )
+
+
+def semaforo_update_statement():
+    """
+    UPDATE que recalcula contadores y semáforo de los depósitos que cumplan el
+    WHERE que agregue quien lo usa. Todo se resuelve en la base de datos.
+    """
+    cheques = _cantidad_documentos(Cheque)
+    retenciones = _cantidad_documentos(Retencion)
+    composicion = func.coalesce(Deposit.composicion_esperado, "")
+    cheques_esperados = composicion.contains("C")
+    retenciones_esperadas = composicion.contains("R")
+
+    semaforo = case(
+        (and_(~cheques_esperados, ~retenciones_esperadas), literal(SEMAFORO_GRIS)),
+        (or_(
+            and_(cheques_esperados, cheques == 0),
+            and_(retenciones_esperadas, retenciones == 0)
+        ), literal(SEMAFORO_AMARILLO)),
+        else_=literal(SEMAFORO_VERDE)
+    )
+
+    return (
+        update(Deposit)
+        .values(cheques_count=cheques, retenciones_count=retenciones, semaforo=semaforo)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_semaforos(db: Session, deposit_ids: Iterable[str]) -> int:
+    """
+    Recalcula contadores y semáforo de los depósitos indicados dentro de la
+    transacción actual de `db` (no hace commit). Devuelve las filas actualizadas.
+    """
+    ids = sorted(set(deposit_ids))
+    stmt = semaforo_update_statement()
+    actualizados = 0
+    for i in range(0, len(ids), _IN_CHUNK_SIZE):
+        chunk = ids[i:i + _IN_CHUNK_SIZE]
+        result = db.execute(stmt.where(Deposit.deposit_id.in_(chunk)))
+        actualizados += result.rowcount or 0
+    return actualizados
+
+
+@on_before_commit
+def _refresh_semaforos_on_commit(session: Session, changes):
+    """Mantiene el semáforo de los depósitos tocados en la misma transacción"""
+    if changes.deposit_ids:
+        refresh_semaforos(session, changes.deposit_ids)
+
+
+def get_semaforos_summary(db: Session, fecha: date) -> dict:
+    """
+    Cantidad de depósitos en verde, amarillo y gris por planta para un día,
+    con una única consulta agrupada sobre el índice (date_time, identifier, semaforo)
+    """
+    inicio = datetime.combine(fecha, time.min)
+    fin = inicio + timedelta(days=1)
+
+    rows = db.execute(
+        select(Deposit.identifier, Deposit.semaforo, func.count(Deposit.id).label("cantidad"))
+        .where(Deposit.date_time >= inicio, Deposit.date_time < fin)
+        .group_by(Deposit.identifier, Deposit.semaforo)
+    ).all()
+
+    plantas = {
+        planta: {"machines": list(maquinas), "total": 0, **{s: 0 for s in SEMAFOROS}}
+        for planta, maquinas in PLANTAS_MAQUINAS.items()
+    }
+    totales = {"total": 0, **{s: 0 for s in SEMAFOROS}}
+
+    for row in rows:
+        planta = get_planta_from_identifier(row.identifier or "")
+        if planta not in plantas:
+            plantas[planta] = {"machines": [], "total": 0, **{s: 0 for s in SEMAFOROS}}
+        if row.identifier and row.identifier not in plantas[planta]["machines"]:
+            plantas[planta]["machines"].append(row.identifier)
+        semaforo = row.semaforo if row.semaforo in SEMAFOROS else SEMAFORO_GRIS
+        plantas[planta][semaforo] += row.cantidad
+        plantas[planta]["total"] += row.cantidad
+        totales[semaforo] += row.cantidad
+        totales["total"] += row.cantidad
+
+    return {"plants": plantas, "totals": totales}
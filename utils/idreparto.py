@@ -0,0 +1,56 @@
+"""
+Extracción del idreparto a partir del user_name de miniBank
+
+Función pura (sin base ni servicios): la usan el modelo Deposit al guardar,
+la migración de la columna idreparto y los servicios que todavía leen
+user_name crudo.
+"""
+import logging
+import re
+from typing import Optional
+
+
+def extraer_idreparto_de_user_name(user_name: str) -> Optional[int]:
+    """
+    Extrae el idreparto del user_name usando patrones robustos
+    
+    Args:
+        user_name: Nombre de usuario del depósito
+    
+    Returns:
+        El idreparto extraído o None si no se pudo extraer
+    
+    Ejemplos:
+        "42, RTO 042" -> 42
+        "RTO 277, 277" -> 277
+        "1, algo más" -> 1
+        "RTO 123, algo" -> 123
+    """
+    if not user_name:
+        return None
+    
+    try:
+        # Buscar el primer número antes de la coma
+        # Esto maneja casos como "42, RTO 042" y "RTO 277, 277"
+        parte_antes_coma = user_name.split(",")[0].strip()
+        
+        # Buscar todos los números en la parte antes de la coma
+        numeros = re.findall(r'\d+', parte_antes_coma)
+        
+        if numeros:
+            # Tomar el primer número encontrado
+            return int(numeros[0])
+        
+        # Si no hay números antes de la coma, buscar después de la coma
+        # Esto maneja casos edge como ", 123"
+        if "," in user_name:
+            parte_despues_coma = user_name.split(",", 1)[1].strip()
+            numeros_despues = re.findall(r'\d+', parte_despues_coma)
+            if numeros_despues:
+                return int(numeros_despues[0])
+        
+        return None
+        
+    except (ValueError, IndexError) as e:
+        logging.warning(f"⚠️ Error al extraer idreparto de '{user_name}': {e}")
+        return None
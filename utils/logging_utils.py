@@ -1,11 +1,23 @@
 """
 Utilidades para logging de acciones de usuario y errores técnicos
+
+Las acciones de usuario solo arman su contexto (IP, user-agent, URL, extra_data)
+cuando el registro realmente se va a escribir. Cada acción puede tener su propio
+nivel y tasa de muestreo (AUDIT_ACTION_POLICY): las lecturas frecuentes (VIEW_*,
+GET_*) se registran por defecto en 1 de cada 10 requests exitosos; las fallas se
+registran siempre. audit_action() / annotate_audit() reemplazan los pares
+ATTEMPT_x / x_SUCCESS / x_FAILED por un único registro con su duración.
 """
 
+import contextvars
+import fnmatch
 import logging
+import os
+import random
+import time
 import traceback
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional, Tuple, Union
 from fastapi import Request
 
 # Loggers especializados
@@ -13,6 +25,42 @@ user_logger = logging.getLogger('user_actions')
 error_logger = logging.getLogger('technical_errors')
 app_logger = logging.getLogger('app')
 
+# Nivel y tasa de muestreo por acción: "PATRON=NIVEL:TASA" separados por coma, por ejemplo
+# AUDIT_ACTION_POLICY="VIEW_*=INFO:0.1,GET_USER_INFO=DEBUG". Gana el primer patrón que coincide.
+DEFAULT_AUDIT_ACTION_POLICY = "VIEW_*=INFO:0.1,GET_*=INFO:0.1"
+
+ExtraData = Union[Dict[str, Any], Callable[[], Dict[str, Any]], None]
+
+
+def _parse_action_policy(spec: str):
+    policies = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        pattern, _, rule = item.partition("=")
+        level_name, _, rate = rule.partition(":")
+        level = logging.getLevelName(level_name.strip().upper()) if level_name.strip() else logging.INFO
+        policies.append((
+            pattern.strip(),
+            level if isinstance(level, int) else logging.INFO,
+            min(1.0, max(0.0, float(rate))) if rate.strip() else 1.0
+        ))
+    return policies
+
+
+_action_policies = _parse_action_policy(os.getenv("AUDIT_ACTION_POLICY", DEFAULT_AUDIT_ACTION_POLICY))
+_policy_cache: Dict[str, Tuple[int, float]] = {}
+
+
+def get_action_policy(action: str) -> Tuple[int, float]:
+    """(nivel, tasa de muestreo) configurados para una acción"""
+    policy = _policy_cache.get(action)
+    if policy is None:
+        policy = next(
+            ((level, rate) for pattern, level, rate in _action_policies if fnmatch.fnmatchcase(action, pattern)),
+            (logging.INFO, 1.0)
+        )
+        _policy_cache[action] = policy
+    return policy
+
 class UserActionLogger:
     """
     Logger especializado para acciones de usuario (audit trail)
@@ -25,8 +73,9 @@ class UserActionLogger:
         resource: Optional[str] = None,
         resource_id: Optional[str] = None,
         request: Optional[Request] = None,
-        extra_data: Optional[Dict[str, Any]] = None,
-        success: bool = True
+        extra_data: ExtraData = None,
+        success: bool = True,
+        duration_ms: Optional[float] = None
     ):
         """
         Registra una acción del usuario
@@ -37,10 +86,22 @@ class UserActionLogger:
             resource: Tipo de recurso afectado (ej: "deposit", "cheque", "retencion")
             resource_id: ID del recurso específico
             request: Objeto Request de FastAPI para obtener IP, user-agent, etc.
-            extra_data: Datos adicionales específicos de la acción
+            extra_data: Datos adicionales específicos de la acción (o una función que los devuelva,
+                        que solo se llama si el registro se escribe)
             success: Si la acción fue exitosa o no
+            duration_ms: Duración de la acción, si se midió
         """
         
+        # Decidir primero si se escribe: nivel de la acción y muestreo (las fallas no se muestrean)
+        level, sample_rate = get_action_policy(action)
+        if not user_logger.isEnabledFor(level):
+            return
+        if success and sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+        
+        if callable(extra_data):
+            extra_data = extra_data()
+        
         # Preparar información de contexto
         context = {
             'action': action,
@@ -67,6 +128,13 @@ class UserActionLogger:
         if extra_data:
             context['extra_data'] = extra_data
         
+        if duration_ms is not None:
+            context['duration_ms'] = round(duration_ms, 1)
+        
+        if success and sample_rate < 1.0:
+            # Cada registro representa ~1/sample_rate acciones
+            context['sample_rate'] = sample_rate
+        
         # Crear mensaje simple y dejar los datos estructurados en extra
         base_msg = f"ACTION={action} STATUS={'OK' if success else 'FAIL'}"
         if resource:
@@ -75,7 +143,7 @@ class UserActionLogger:
             base_msg += f" RESOURCE_ID={resource_id}"
 
         # Usar API estándar de logging para respetar filtros/niveles
-        user_logger.info(base_msg, extra=context)
+        user_logger.log(level, base_msg, extra=context)
 
 class TechnicalErrorLogger:
     """
@@ -144,11 +212,14 @@ class TechnicalErrorLogger:
         context: str,
         user_id: Optional[str] = None,
         request: Optional[Request] = None,
-        extra_data: Optional[Dict[str, Any]] = None
+        extra_data: ExtraData = None
     ):
         """
-        Registra una advertencia técnica
+        Registra una advertencia técnica (extra_data puede ser una función que devuelva los datos)
         """
+        if callable(extra_data):
+            extra_data = extra_data()
+        
         warning_info = {
             'context': context,
             'timestamp': datetime.now().isoformat()
@@ -178,6 +249,113 @@ class TechnicalErrorLogger:
             
         error_logger.handle(record)
 
+# Acción en curso del request (la abre log_endpoint_access o audit_action)
+_current_audit: contextvars.ContextVar = contextvars.ContextVar("current_audit", default=None)
+
+class AuditAction:
+    """
+    Una acción de usuario registrada una sola vez al terminar, con su resultado y duración.
+    
+    Se usa como context manager; el código de la acción puede completar user_id,
+    resource_id y extra_data (directamente o con annotate_audit) antes de que se escriba.
+    """
+    
+    def __init__(
+        self,
+        action: str,
+        user_id: Optional[str] = None,
+        resource: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        request: Optional[Request] = None,
+        extra_data: Optional[Dict[str, Any]] = None
+    ):
+        self.action = action
+        self.user_id = user_id
+        self.resource = resource
+        self.resource_id = resource_id
+        self.request = request
+        self.extra_data: Dict[str, Any] = dict(extra_data or {})
+        # Fallas que el endpoint atrapa y convierte en respuesta (ver fail_audit)
+        self.failed = False
+        self.error: Optional[BaseException] = None
+        self._start = None
+        self._token = None
+    
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current_audit.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        _current_audit.reset(self._token)
+        if exc is None and not self.failed:
+            self.finish(True)
+        else:
+            self.finish(False, exc or self.error)
+        return False
+    
+    def finish(self, success: bool, error: Optional[BaseException] = None):
+        duration_ms = (time.perf_counter() - self._start) * 1000 if self._start is not None else None
+        
+        def build_extra():
+            extra = dict(self.extra_data)
+            if error is not None:
+                status_code = getattr(error, "status_code", None)
+                if status_code is not None:
+                    extra.setdefault("status_code", status_code)
+                extra.setdefault("error_type", type(error).__name__)
+                extra.setdefault("error_message", str(getattr(error, "detail", None) or error))
+            return extra
+        
+        user_id = self.user_id
+        if user_id is None and self.request is not None:
+            user_id = getattr(self.request.state, "username", None)
+        
+        log_user_action(
+            self.action,
+            user_id=user_id,
+            resource=self.resource,
+            resource_id=self.resource_id,
+            request=self.request,
+            extra_data=build_extra,
+            success=success,
+            duration_ms=duration_ms
+        )
+
+def audit_action(action: str, **kwargs) -> AuditAction:
+    """
+    Registra una acción con un único registro al terminar el bloque:
+    
+        with audit_action("LOGIN", resource="authentication", request=request) as audit:
+            ...
+            audit.user_id = username
+    """
+    return AuditAction(action, **kwargs)
+
+def annotate_audit(user_id: Optional[str] = None, resource_id: Optional[str] = None, **extra_data):
+    """Completa la acción en curso (si hay una) con usuario, recurso y datos adicionales"""
+    audit = _current_audit.get()
+    if audit is None:
+        return
+    if user_id is not None:
+        audit.user_id = user_id
+    if resource_id is not None:
+        audit.resource_id = str(resource_id)
+    audit.extra_data.update(extra_data)
+
+def fail_audit(error: Optional[BaseException] = None, **extra_data):
+    """
+    Marca la acción en curso como fallida aunque el endpoint no propague la excepción
+    (p. ej. cuando devuelve un JSONResponse 500). Las fallas nunca se muestrean.
+    """
+    audit = _current_audit.get()
+    if audit is None:
+        return
+    audit.failed = True
+    if error is not None:
+        audit.error = error
+    audit.extra_data.update(extra_data)
+
 # Funciones de conveniencia para usar en toda la aplicación
 def log_user_action(action: str, **kwargs):
     """Función de conveniencia para logging de acciones de usuario.
@@ -192,7 +370,7 @@ def log_user_action(action: str, **kwargs):
         # Log técnico silencioso para no romper flujo
         app_logger.error(f"log_user_action TypeError: {e} | kwargs={list(kwargs.keys())}")
         # Reintento minimal eliminando claves desconocidas comunes
-        safe_keys = {k: v for k, v in kwargs.items() if k in {"user_id","resource","resource_id","request","extra_data","success"}}
+        safe_keys = {k: v for k, v in kwargs.items() if k in {"user_id","resource","resource_id","request","extra_data","success","duration_ms"}}
         try:
             UserActionLogger.log_action(action, **safe_keys)
         except Exception: